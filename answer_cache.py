@@ -0,0 +1,171 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Cosine similarity above which a previous answer is reused for a new question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+def normalize_query(query: str):
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+class AnswerCache:
+    """Two-level LRU/TTL cache of chat answers.
+
+    Lookups first try the normalized query text, then fall back to the
+    nearest cached query embedding within `similarity_threshold`.
+
+    `clear()` starts a new generation; a `put()` tagged with an older one
+    (an answer computed against the index before a reload) is dropped.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.generation = 0
+        self._entries = OrderedDict()  # normalized query -> (value, unit embedding, expires_at), LRU first
+        self._expiry = OrderedDict()  # normalized query -> expires_at, oldest put first
+        # Embeddings of the entries, one row each; rows of removed entries are dead until the next compaction
+        self._matrix = None
+        self._matrix_keys = []
+        self._live = None
+        self._rows = {}  # normalized query -> row in _matrix
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get_exact(self, query: str):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get_similar(self, embedding):
+        """Return the cached value for the closest query embedding, or None (counted as a miss)."""
+        vector = self._unit(embedding)
+        with self._lock:
+            self._expire()
+            if self._rows:
+                rows = len(self._matrix_keys)
+                scores = np.where(self._live[:rows], self._matrix[:rows] @ vector, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def record_miss(self):
+        """Count a lookup that was answered without consulting the semantic level."""
+        with self._lock:
+            self.misses += 1
+
+    def put(self, query: str, embedding, value, generation=None):
+        key = normalize_query(query)
+        vector = self._unit(embedding) if embedding is not None else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl_seconds
+            self._entries[key] = (value, vector, expires_at)
+            self._expiry[key] = expires_at
+            if vector is not None:
+                self._append_row(key, vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._expiry.clear()
+            self._reset_matrix()
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else None,
+        }
+
+    def _remove(self, key):
+        del self._entries[key]
+        del self._expiry[key]
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._live[row] = False
+            self._matrix_keys[row] = None
+            if len(self._matrix_keys) > 2 * len(self._rows):
+                self._compact()
+
+    def _expire(self):
+        # Every entry lives ttl_seconds from its put, so the expired ones are at the head of _expiry
+        now = time.monotonic()
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at >= now:
+                break
+            self._remove(key)
+
+    def _append_row(self, key, vector):
+        rows = len(self._matrix_keys)
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            self._reset_matrix()
+            self._matrix = np.zeros((16, len(vector)), dtype=np.float32)
+            self._live = np.zeros(16, dtype=bool)
+            rows = 0
+        elif rows == len(self._matrix):
+            # Grow geometrically so appends stay amortized O(1)
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+            self._live = np.concatenate([self._live, np.zeros_like(self._live)])
+        self._matrix[rows] = vector
+        self._live[rows] = True
+        self._matrix_keys.append(key)
+        self._rows[key] = rows
+
+    def _compact(self):
+        keys = list(self._rows)
+        if not keys:
+            self._reset_matrix()
+            return
+        self._matrix[:len(keys)] = self._matrix[[self._rows[key] for key in keys]]
+        self._live[:] = False
+        self._live[:len(keys)] = True
+        self._matrix_keys = keys
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+    def _reset_matrix(self):
+        self._matrix = None
+        self._matrix_keys = []
+        self._live = None
+        self._rows = {}
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
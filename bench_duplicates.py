@@ -0,0 +1,115 @@
+"""Latency of the duplicate check create_report runs, against many open reports.
+
+    python bench_duplicates.py                   # 300k open reports
+    python bench_duplicates.py --reports 50000
+
+Reports combine a civic issue, a landmark and one of 2000 localities with Zipf-distributed filler words, so
+many of them share most of their words, and a tenth of them are re-filed copies of another report with small
+edits, as citizens file them. Queries are half edited copies of existing reports (the check should find them)
+and half new reports (it should not).
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import database
+import duplicates
+import models
+
+ISSUES = ["pothole", "streetlight not working", "garbage not collected", "water logging", "sewage overflow",
+          "broken footpath", "stray dogs", "illegal parking", "fallen tree", "open manhole", "signal not working"]
+LANDMARKS = ["bus stop", "market", "school", "railway station", "hospital", "temple", "park", "bridge",
+             "junction", "college", "bank", "post office"]
+KINDS = ["Road", "Nagar", "Chowk", "Peth", "Colony", "Lane", "Society", "Park"]
+SYLLABLES = ["ka", "ri", "to", "na", "me", "lu", "sa", "po", "de", "vi", "ra", "gu", "ne", "sho", "pa", "ti"]
+
+def pseudo_words(count, rng):
+    found = set()
+    while len(found) < count:
+        found.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(found)
+
+_rng = random.Random(1)
+# About 150 reports per locality at 300k reports
+LOCALITIES = [f"{name.capitalize()} {_rng.choice(KINDS)}" for name in pseudo_words(2000, _rng)]
+FILLER = pseudo_words(3000, _rng)
+FILLER_WEIGHTS = [1 / (rank + 1) for rank in range(len(FILLER))]
+
+def new_report(rng):
+    issue, landmark = rng.choice(ISSUES), rng.choice(LANDMARKS)
+    return {
+        "title": f"{issue.capitalize()} near {landmark}",
+        "description": " ".join([issue] + rng.choices(FILLER, FILLER_WEIGHTS, k=8)),
+        "location": f"{rng.choice(LOCALITIES)}, {rng.choice(LOCALITIES).split()[0]}",
+    }
+
+def refiled(report, rng):
+    words = report["description"].split()
+    rng.shuffle(words)
+    return {
+        "title": report["title"].replace("near", rng.choice(["near", "at", "by"])),
+        "description": " ".join(words[:-1]),
+        "location": report["location"].replace(",", ""),
+    }
+
+def seed(engine, count, rng):
+    models.Base.metadata.create_all(bind=engine)
+    reports, created_at = [], datetime.datetime.utcnow()
+    for _ in range(count):
+        reports.append(refiled(rng.choice(reports), rng) if reports and rng.random() < 0.1 else new_report(rng))
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for start in range(0, count, 10000):
+            batch = reports[start:start + 10000]
+            conn.execute(insert(models.Report), [dict(r, id=start + i + 1, status="Pending", votes=0,
+                                                      created_at=created_at) for i, r in enumerate(batch)])
+            conn.execute(insert(duplicates.buckets), [
+                {"bucket": key, "report_id": start + i + 1}
+                for i, r in enumerate(batch)
+                for key in set(duplicates.bucket_keys(r["title"], r["description"], r["location"]))])
+    return reports, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_duplicates_'), 'bench.db')}"
+    engine = database.create_db_engine(url)
+    reports, loaded = seed(engine, args.reports, rng)
+    print(f"Loaded {args.reports} open reports and their buckets in {loaded:.1f} s, "
+          f"database {os.path.getsize(url[len('sqlite:///'):]) / 2**20:.0f} MiB")
+
+    session = sessionmaker(bind=engine)()
+    timings = {"refiled": [], "new": []}
+    found = {"refiled": 0, "new": 0}
+    for n in range(args.queries):
+        kind = "refiled" if n % 2 else "new"
+        report = refiled(rng.choice(reports), rng) if kind == "refiled" else new_report(rng)
+        started = time.perf_counter()
+        found[kind] += bool(duplicates.find_duplicates(session, report["title"], report["description"],
+                                                       report["location"]))
+        timings[kind].append(time.perf_counter() - started)
+        session.rollback()
+
+    hashing = []
+    for report in reports[:args.queries]:
+        started = time.perf_counter()
+        duplicates.bucket_keys(report["title"], report["description"], report["location"])
+        hashing.append(time.perf_counter() - started)
+    for kind, latencies in list(timings.items()) + [("signature only", hashing)]:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        hits = f"  {found[kind] / len(latencies):4.0%} found duplicates" if kind in found else ""
+        print(f"{kind:<15} p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  p99 {p99:6.2f} ms{hits}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Search latency on a synthetic corpus, through the same statements as GET /api/search.
+
+    python bench_search.py                   # 100k reports
+    python bench_search.py --reports 1000000
+
+Reports are written through the sync triggers (so the load time includes indexing). Titles and descriptions
+mix a few dozen civic issue and place words with a Zipf-distributed filler vocabulary, so queries range from
+rare phrases to words that match a large share of the corpus. Each query is timed for the ranked page with
+its snippets.
+
+    python bench_search.py --candidates 0    # rank every match of broad queries (see SEARCH_MAX_CANDIDATES)
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import insert
+
+import database
+import models
+import search
+
+ISSUES = ["pothole", "streetlight", "garbage", "water logging", "sewage overflow", "broken footpath",
+          "stray dogs", "illegal parking", "fallen tree", "open manhole", "traffic signal", "noise"]
+PLACES = ["bus stand", "market", "school", "railway station", "hospital", "temple", "park", "bridge",
+          "junction", "college", "bank", "post office"]
+ADJECTIVES = ["broken", "dangerous", "overflowing", "dark", "blocked", "damaged", "dirty", "new", "old"]
+DISTRICTS = ["Pune", "Mumbai", "Nagpur", "Nashik", "Thane", "Aurangabad"]
+QUERIES = {
+    "rare phrase": "open manhole near hospital",
+    "two terms": "streetlight bus",
+    "common term": "pothole",
+}
+SYLLABLES = ["ka", "ri", "to", "na", "me", "lu", "sa", "po", "de", "vi", "ra", "gu", "ne", "sho", "pa", "ti"]
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def seed(engine, reports, comments_per_report, rng):
+    models.Base.metadata.create_all(bind=engine)
+    words = vocabulary(20000, rng)
+    zipf = np.random.default_rng(0).zipf(1.3, size=reports * 30) % len(words)
+    users = [{"id": i + 1, "full_name": f"User {i}", "district": district} for i, district in enumerate(DISTRICTS)]
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), users)
+    batch, offset = 10000, 0
+    for start in range(0, reports, batch):
+        rows, comments = [], []
+        for report_id in range(start + 1, min(start + batch, reports) + 1):
+            filler = [words[i] for i in zipf[offset:offset + 30]]
+            offset += 30
+            issue, place = rng.choice(ISSUES), rng.choice(PLACES)
+            rows.append({
+                "id": report_id,
+                "title": f"{rng.choice(ADJECTIVES)} {issue} near {place}",
+                "description": " ".join(filler[:20] + [issue] + filler[20:25]),
+                "location": f"{rng.choice(PLACES)} road, {' '.join(filler[25:27])}",
+                "status": "Pending" if rng.random() < 0.7 else "Resolved",
+                "user_id": rng.randint(1, len(users)),
+                "votes": 0,
+            })
+            comments += [{"text": " ".join(filler[27:30]), "report_id": report_id, "user_id": 1}
+                         for _ in range(comments_per_report if rng.random() < 0.3 else 0)]
+        with engine.begin() as conn:
+            conn.execute(insert(models.Report), rows)
+            if comments:
+                conn.execute(insert(models.Comment), comments)
+    loaded = time.perf_counter() - started
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO report_search (report_search) VALUES ('optimize')")
+    return loaded, words
+
+def run(engine, queries, repeats, limit):
+    with engine.connect() as conn:
+        for name, (q, filters) in queries.items():
+            latencies = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                page = conn.execute(search.search_query("sqlite", q, limit=limit, **filters)).all()[:limit]
+                latencies.append(time.perf_counter() - started)
+            total = conn.exec_driver_sql("SELECT COUNT(*) FROM report_search WHERE report_search MATCH ?",
+                                         (search.match_expression("sqlite", search.terms(q),
+                                                                  filters.get("prefix", False)),)).scalar()
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(f"{name:<28} {total:>9} matches  page {len(page):>3}  "
+                  f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=100000)
+    parser.add_argument("--comments", type=int, default=2, help="comments on the 30%% of reports that have any")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=search.SEARCH_PAGE_SIZE)
+    parser.add_argument("--candidates", type=int, default=search.SEARCH_MAX_CANDIDATES,
+                        help="SEARCH_MAX_CANDIDATES to run with")
+    args = parser.parse_args()
+    search.SEARCH_MAX_CANDIDATES = args.candidates
+
+    rng = random.Random(0)
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_search_'), 'bench.db')}"
+    engine = database.create_db_engine(url)
+    loaded, words = seed(engine, args.reports, args.comments, rng)
+    print(f"Loaded {args.reports} reports in {loaded:.1f} s ({args.reports / loaded:.0f}/s, index maintained by "
+          f"triggers), database {os.path.getsize(url[len('sqlite:///'):]) / 2**20:.0f} MiB")
+
+    queries = {name: (q, {}) for name, q in QUERIES.items()}
+    # The most and least frequent words of the filler vocabulary
+    queries["filler word"] = (words[1], {})
+    queries["rare filler word"] = (words[-1], {})
+    queries["common term, district"] = ("pothole", {"district": "Pune", "status": "Pending"})
+    queries["prefix"] = ("sewage overfl", {"prefix": True})
+    queries["prefix of filler word"] = (words[1], {"prefix": True})
+    run(engine, queries, args.repeats, args.limit)
+
+if __name__ == "__main__":
+    main()
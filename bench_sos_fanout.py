@@ -0,0 +1,158 @@
+"""End-to-end SOS fan-out latency: POST /api/sos until every subscribed authority client has the alert.
+
+    python bench_sos_fanout.py                          # 2000 WebSocket subscribers, 30 alerts
+    python bench_sos_fanout.py --subscribers 5000 --alerts 50
+    python bench_sos_fanout.py --in-process             # dispatcher only, no HTTP or sockets
+
+Runs the app under uvicorn on a fresh database in a temporary directory, with all subscribers in the
+alert's district, and connects the clients from this process. The clients share the machine (and, here,
+the interpreter) with the server, so the numbers include receiving as well as sending.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+_BENCH_DIR = tempfile.mkdtemp(prefix="bench_sos_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_BENCH_DIR, 'bench.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_BENCH_DIR, "uploads")
+os.environ["NEWS_FEEDS"] = ""
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+import websockets  # noqa: E402
+
+import database  # noqa: E402
+import migrate  # noqa: E402
+import models  # noqa: E402
+import sos_dispatch  # noqa: E402
+
+def seed(subscribers):
+    migrate.upgrade()
+    with database.SessionLocal() as db:
+        region = {"state": "Maharashtra", "district": "Pune", "sub_district": "Haveli"}
+        db.add_all(models.User(full_name=f"Officer {i}", email=f"officer{i}@example.com", role="authority", **region)
+                   for i in range(subscribers))
+        citizen = models.User(full_name="Asha", email="asha@example.com", role="citizen", **region)
+        db.add(citizen)
+        db.commit()
+        authority_ids = [user_id for (user_id,) in db.query(models.User.id).filter(models.User.role == "authority")]
+        return authority_ids, citizen.id
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return f"{np.percentile(ms, 50):>9.1f}{np.percentile(ms, 95):>9.1f}{np.percentile(ms, 99):>9.1f}{ms.max():>9.1f}"
+
+def report(posts, deliveries, complete):
+    print(f"{'':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    if posts:
+        print(f"{'POST /api/sos':<22}{percentiles(posts)}")
+    print(f"{'each delivery':<22}{percentiles(deliveries)}")
+    print(f"{'all delivered':<22}{percentiles(complete)}")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def websocket_run(args, authority_ids, citizen_id):
+    import main
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    received = {}  # alert id -> receive times
+    connections = []
+    for start in range(0, len(authority_ids), 200):
+        batch = authority_ids[start:start + 200]
+        connections += await asyncio.gather(*(websockets.connect(f"ws://127.0.0.1:{port}/ws/sos?user_id={user_id}",
+                                                                 max_queue=None, ping_interval=None)
+                                              for user_id in batch))
+
+    async def listen(ws):
+        async for message in ws:
+            alert_id = int(message.split('"id": ', 1)[1].split(",", 1)[0])
+            received.setdefault(alert_id, []).append(time.perf_counter())
+
+    listeners = [asyncio.create_task(listen(ws)) for ws in connections]
+    print(f"{len(connections)} WebSocket subscribers, {args.alerts} alerts")
+
+    posts, deliveries, complete = [], [], []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(args.alerts):
+            sent = time.perf_counter()
+            response = await client.post("/api/sos", json={"location": "FC Road", "user_id": citizen_id,
+                                                           "latitude": 18.5204, "longitude": 73.8567})
+            posts.append(time.perf_counter() - sent)
+            alert_id = response.json()["id"]
+            deadline = time.perf_counter() + 30
+            while len(received.get(alert_id, ())) < len(connections) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.001)
+            times = received.get(alert_id, [])
+            deliveries += [t - sent for t in times]
+            complete.append(max(times) - sent if len(times) == len(connections) else float("inf"))
+            await asyncio.sleep(args.gap)
+
+    report(posts, deliveries, complete)
+    for task in listeners:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in connections), return_exceptions=True)
+    server.should_exit = True
+
+async def in_process_run(args, authority_ids):
+    index = sos_dispatch.AuthorityIndex()
+    for user_id in authority_ids:
+        index.add(user_id, "Maharashtra", "Pune", "Haveli")
+    dispatcher = sos_dispatch.Dispatcher(index)
+    received = {}
+
+    async def consume(queue):
+        while True:
+            alert_id = int(await queue.get())
+            received.setdefault(alert_id, []).append(time.perf_counter())
+
+    consumers = [asyncio.create_task(consume(dispatcher.subscribe(user_id))) for user_id in authority_ids]
+    await asyncio.sleep(0)
+    print(f"{len(consumers)} in-process subscribers, {args.alerts} alerts")
+
+    publishes, deliveries, complete = [], [], []
+    for alert_id in range(args.alerts):
+        sent = time.perf_counter()
+        dispatcher.publish(str(alert_id), state="Maharashtra", district="Pune", sub_district="Haveli",
+                           latitude=18.5204, longitude=73.8567)
+        publishes.append(time.perf_counter() - sent)
+        while len(received.get(alert_id, ())) < len(consumers):
+            await asyncio.sleep(0)
+        deliveries += [t - sent for t in received[alert_id]]
+        complete.append(max(received[alert_id]) - sent)
+
+    print(f"{'publish()':<22}{percentiles(publishes)}")
+    report([], deliveries, complete)
+    for task in consumers:
+        task.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--alerts", type=int, default=30)
+    parser.add_argument("--gap", type=float, default=0.05, help="seconds between alerts")
+    parser.add_argument("--in-process", action="store_true")
+    args = parser.parse_args()
+
+    authority_ids, citizen_id = seed(args.subscribers)
+    if args.in_process:
+        asyncio.run(in_process_run(args, authority_ids))
+    else:
+        asyncio.run(websocket_run(args, authority_ids, citizen_id))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Mixed read/write load against SQLite with the driver defaults and with the tuned profile in database.py.
+
+    python bench_sqlite_writes.py                        # 8 writer and 8 reader threads for 5 s per profile
+    python bench_sqlite_writes.py --writers 16 --seconds 10
+
+Writers vote (read then update), comment and raise SOS alerts, like the API's write endpoints; readers
+load feed pages. Each profile runs on a fresh database file in a temporary directory.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import database
+import feed
+import models
+
+def seed(engine, reports):
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    user = models.User(full_name="Bench", email="bench@example.com", district="Pune")
+    session.add(user)
+    session.flush()
+    session.add_all(models.Report(title=f"Report {i}", description="Pothole", location="MG Road",
+                                  status="Pending", votes=0, user_id=user.id) for i in range(reports))
+    user_id = user.id
+    session.commit()
+    session.close()
+    return user_id
+
+def write_once(session, user_id, report_id, rng):
+    action = rng.random()
+    if action < 0.6:
+        report = session.get(models.Report, report_id)
+        report.votes += 1
+    elif action < 0.9:
+        session.add(models.Comment(text="Same here", user_id=user_id, report_id=report_id))
+    else:
+        session.add(models.SOSAlert(location="MG Road", user_id=user_id))
+    session.commit()
+
+def read_once(session):
+    reports = session.scalars(feed.feed_query(limit=20)).all()
+    feed.serialize_reports(session, reports[:20])
+    session.rollback()
+
+def run(name, tuned, args):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_sqlite_'), 'bench.db')}"
+    engine = database.create_db_engine(url, tuned=tuned)
+    user_id = seed(engine, args.reports)
+    read_sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    write_sessions = database.write_sessionmaker(engine) if tuned else read_sessions
+
+    stop = time.perf_counter() + args.seconds
+    results = {"writes": [], "reads": [], "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+
+    def worker(kind, seed_value):
+        rng = random.Random(seed_value)
+        latencies, errors = [], 0
+        while time.perf_counter() < stop:
+            session = write_sessions() if kind == "writes" else read_sessions()
+            start = time.perf_counter()
+            try:
+                if kind == "writes":
+                    # Hot reports: most votes land on a few rows, as on a trending issue
+                    write_once(session, user_id, rng.randint(1, min(args.reports, 20)), rng)
+                else:
+                    read_once(session)
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                errors += 1
+            finally:
+                session.close()
+        with lock:
+            results[kind].extend(latencies)
+            results["write_errors" if kind == "writes" else "read_errors"] += errors
+
+    threads = [threading.Thread(target=worker, args=("writes", i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=("reads", 1000 + i)) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with engine.connect() as conn:
+        votes = conn.execute(select(func.sum(models.Report.votes))).scalar()
+    engine.dispose()
+
+    writes, reads = results["writes"], results["reads"]
+    p95_write = np.percentile(writes, 95) * 1000 if writes else float("nan")
+    p95_read = np.percentile(reads, 95) * 1000 if reads else float("nan")
+    print(f"{name:<8}{len(writes) / args.seconds:>10.0f}{results['write_errors']:>8}{p95_write:>12.1f}"
+          f"{len(reads) / args.seconds:>10.0f}{results['read_errors']:>8}{p95_read:>12.1f}{votes:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--reports", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g} s per profile")
+    print(f"{'profile':<8}{'writes/s':>10}{'errors':>8}{'p95 ms':>12}{'reads/s':>10}{'errors':>8}{'p95 ms':>12}"
+          f"{'votes':>8}")
+    run("default", False, args)
+    run("tuned", True, args)
+
+if __name__ == "__main__":
+    main()
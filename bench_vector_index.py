@@ -0,0 +1,74 @@
+"""Recall@k and query latency of the vector index backends against exact flat search.
+
+    python bench_vector_index.py                      # synthetic clustered embeddings
+    python bench_vector_index.py --store faiss_index.chunks.sqlite   # embeddings from the chunk store
+"""
+import argparse
+import time
+
+import numpy as np
+
+from chunk_store import ChunkStore
+from vector_index import INDEX_KINDS, create_index
+
+def synthetic_embeddings(n, dim, clusters=64, seed=0):
+    # Real text embeddings are clustered by topic, which is what makes IVF/HNSW work; uniform noise would not be
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float32)
+
+def stored_embeddings(path):
+    store = ChunkStore(path)
+    try:
+        return np.array([c["embedding"] for c in store.iter_chunks()], dtype=np.float32)
+    finally:
+        store.close()
+
+def run(vectors, queries, k, kinds):
+    truth_index, _ = create_index("flat", vectors.shape[1])
+    truth_index.add(vectors)
+    _, truth = truth_index.search(queries, k)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={k}")
+    print(f"{'index':<8}{'build s':>10}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}  params")
+    for kind in kinds:
+        start = time.perf_counter()
+        index, params = create_index(kind, vectors.shape[1], training_vectors=vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            _, labels = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found[i] = labels[0]
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{kind:<8}{build_seconds:>10.2f}{recall:>10.3f}{p50:>10.3f}{p95:>10.3f}  {params}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="chunk store to take embeddings from instead of synthetic data")
+    parser.add_argument("-n", type=int, default=50000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="synthetic embedding size (text-embedding-004 is 768)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--kinds", nargs="+", default=list(INDEX_KINDS), choices=INDEX_KINDS)
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = stored_embeddings(args.store)
+    else:
+        vectors = synthetic_embeddings(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, like a question close to a passage
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    run(vectors, queries.astype(np.float32), args.k, args.kinds)
+
+if __name__ == "__main__":
+    main()
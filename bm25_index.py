@@ -0,0 +1,122 @@
+import json
+import math
+import os
+import re
+from collections import defaultdict
+
+BM25_FILE = "bm25.json"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "that", "the", "to", "was", "what", "which", "with", "does", "do", "me", "tell", "about",
+}
+
+ORDINALS = ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth",
+            "eleventh", "twelfth"]
+ROMAN = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "xi", "xii"]
+
+# "21. Protection of life and personal liberty.—", including amended "1[21A. ..." headings
+ARTICLE_HEADING_RE = re.compile(r"(?m)^\s*(?:\d+\[)?(\d{1,3}[A-Z]{0,3})\.\s+[A-Z][^—\n]*(?:\n[^—\n]*)?—")
+# Every page of a schedule carries a running header such as "(Seventh Schedule)"
+SCHEDULE_HEADING_RE = re.compile(r"\((" + "|".join(ORDINALS) + r") Schedule\)", re.IGNORECASE)
+QUERY_ARTICLE_RE = re.compile(r"\b(?:article|art\.?)\s*(\d{1,3}[a-z]{0,3})\b", re.IGNORECASE)
+QUERY_SCHEDULE_RE = re.compile(
+    r"\bschedule\s+(\d{1,2}|[ivx]{1,4})\b|\b(" + "|".join(ORDINALS) + r")\s+schedule\b", re.IGNORECASE
+)
+
+def tokenize(text: str):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def section_keys(text: str):
+    """Articles headed, and schedules covered, by a chunk, as "article:21A" / "schedule:7" keys."""
+    keys = {f"article:{number.upper()}" for number in ARTICLE_HEADING_RE.findall(text)}
+    keys |= {f"schedule:{ORDINALS.index(word.lower()) + 1}" for word in SCHEDULE_HEADING_RE.findall(text)}
+    return keys
+
+def query_sections(query: str):
+    """Section keys a question names explicitly ("Article 370", "Schedule 7", "seventh schedule")."""
+    keys = [f"article:{number.upper()}" for number in QUERY_ARTICLE_RE.findall(query)]
+    for number, word in QUERY_SCHEDULE_RE.findall(query):
+        if word:
+            keys.append(f"schedule:{ORDINALS.index(word.lower()) + 1}")
+        elif number.isdigit():
+            keys.append(f"schedule:{int(number)}")
+        elif number.lower() in ROMAN:
+            keys.append(f"schedule:{ROMAN.index(number.lower()) + 1}")
+    return keys
+
+class BM25Index:
+    """Okapi BM25 over the chunks of an index directory; rows are docstore/vector positions."""
+
+    def __init__(self, postings, doc_lengths, sections, k1=1.5, b=0.75):
+        self.postings = postings  # term -> ([rows], [term frequencies])
+        self.doc_lengths = doc_lengths
+        self.sections = sections  # section key -> [rows]
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts):
+        postings = defaultdict(lambda: ([], []))
+        sections = defaultdict(list)
+        doc_lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, count in counts.items():
+                postings[token][0].append(row)
+                postings[token][1].append(count)
+            for key in section_keys(text):
+                sections[key].append(row)
+        return cls(dict(postings), doc_lengths, dict(sections))
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query: str, k: int, allowed=None):
+        """Return up to k (row, score) pairs, best first, optionally restricted to `allowed` rows."""
+        n = len(self.doc_lengths)
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            rows, freqs = posting
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for row, tf in zip(rows, freqs):
+                if allowed is not None and row not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row] / self.avg_length)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def section_rows(self, keys):
+        rows = []
+        for key in keys:
+            rows.extend(row for row in self.sections.get(key, []) if row not in rows)
+        return rows
+
+    def save(self, path):
+        with open(os.path.join(path, BM25_FILE), "w") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+                "sections": self.sections,
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load the BM25 index saved next to a vector index, or None if there is none."""
+        bm25_path = os.path.join(path, BM25_FILE)
+        if not os.path.exists(bm25_path):
+            return None
+        with open(bm25_path) as f:
+            data = json.load(f)
+        return cls(data["postings"], data["doc_lengths"], data["sections"], data["k1"], data["b"])
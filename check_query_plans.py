@@ -0,0 +1,94 @@
+"""Run EXPLAIN QUERY PLAN on the hot queries and fail if any of them scans a whole table or an index, or
+runs a correlated subquery per row.
+
+    python migrate.py && python check_query_plans.py
+
+SQLite only; on Postgres use EXPLAIN on the same statements by hand.
+"""
+import datetime
+import re
+import sys
+from types import SimpleNamespace
+
+from sqlalchemy import inspect, select
+
+import database
+import duplicates
+import feed
+import models
+import rollups
+import search
+import tags
+
+# "SCAN reports" is a full table scan and "SCAN reports USING INDEX ..." walks a whole index, where
+# "SEARCH reports USING INDEX ... (created_at<?)" only reads a constrained range
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+# Reruns for every row of the outer query
+CORRELATED_RE = re.compile(r"^CORRELATED (?:SCALAR|LIST) SUBQUERY")
+# First pages: walking the index in ORDER BY order stops after LIMIT rows
+LIMITED_WALKS = {"feed recent", "recent SOS alerts"}
+
+def hot_queries():
+    last = SimpleNamespace(id=1000, votes=5, created_at=datetime.datetime(2026, 1, 1))
+    report_ids = [1, 2, 3]
+    return {
+        "feed recent": feed.feed_query("recent"),
+        "feed recent, next page": feed.feed_query("recent", feed.encode_cursor("recent", last)),
+        "feed by votes, next page": feed.feed_query("votes", feed.encode_cursor("votes", last)),
+        "feed by status": feed.feed_query(status="Pending"),
+        "feed by owner": feed.feed_query(owner_id=1),
+        "feed by district": feed.feed_query(district="Pune"),
+        "feed by tag": feed.feed_query(tag="Pothole"),
+        "page comments": feed.comments_query(report_ids),
+        "page top comments": feed.top_comments_query(report_ids, feed.FEED_TOP_COMMENTS),
+        "page comment counts": feed.comment_counts_query(report_ids),
+        "trending tags": tags.trending_tags_query(),
+        "trending tags this week": tags.trending_tags_query(days=7),
+        "recent SOS alerts": select(models.SOSAlert).order_by(models.SOSAlert.timestamp.desc()).limit(50),
+        "user SOS alerts": select(models.SOSAlert).where(models.SOSAlert.user_id == 1)
+                           .order_by(models.SOSAlert.timestamp.desc()).limit(50),
+        "district stats summary": select(rollups.rollups).where(rollups.rollups.c.district == "Pune"),
+        "search": search.search_query("sqlite", "streetlight bus"),
+        "search by district and status": search.search_query("sqlite", "streetlight", status="Pending",
+                                                             district="Pune"),
+        "duplicate candidates": duplicates.candidates_query(list(range(duplicates.DUPLICATE_BANDS)),
+                                                            datetime.datetime(2026, 1, 1)),
+        "stats series": select(rollups.daily).where(rollups.daily.c.day >= datetime.date(2026, 1, 1)),
+    }
+
+def explain(conn, statement):
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+def full_scans(plan, tables, limited_walk=False):
+    """The plan lines that read a whole table or index, or run a correlated subquery."""
+    found = []
+    for line in plan:
+        match = FULL_SCAN_RE.match(line)
+        # Scans of materialized subqueries (anon_1, ...) only read rows an index search already produced
+        if match and match.group(1) in tables and not (limited_walk and "INDEX" in line):
+            found.append(line)
+        elif CORRELATED_RE.match(line):
+            found.append(line)
+    return found
+
+def check(engine=None):
+    """Map each hot query to (plan lines, the lines that scan in full)."""
+    results = {}
+    with (engine or database.engine).connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+        for name, statement in hot_queries().items():
+            plan = explain(conn, statement)
+            results[name] = (plan, full_scans(plan, tables, name in LIMITED_WALKS))
+    return results
+
+if __name__ == "__main__":
+    if database.engine.dialect.name != "sqlite":
+        sys.exit("check_query_plans.py only understands SQLite query plans")
+    failed = False
+    for name, (plan, scans) in check().items():
+        print(f"{'FULL SCAN' if scans else 'ok':<10}{name}")
+        for line in plan:
+            print(f"          {line}")
+        failed = failed or bool(scans)
+    sys.exit(1 if failed else 0)
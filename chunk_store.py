@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+CHUNK_STORE_PATH = "faiss_index.chunks.sqlite"
+
+class ChunkStore:
+    """Local SQLite store of ingested chunks and their embeddings.
+
+    Chunks are keyed by a hash of their source and text; embeddings are keyed
+    by a hash of the text alone, so unchanged text is never embedded twice and
+    the FAISS index can always be rebuilt from here without calling Gemini.
+    """
+
+    def __init__(self, path=CHUNK_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                text_key TEXT NOT NULL,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunks_source ON chunks (source);
+        """)
+
+    def close(self):
+        self._conn.close()
+
+    # Embedding checkpoint interface used by rag_ingest.BatchEmbedder
+    def get_many(self, keys):
+        found = {}
+        keys = list(set(keys))
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                [(key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in items],
+            )
+
+    def embedding_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def sources(self):
+        return [row[0] for row in self._conn.execute("SELECT DISTINCT source FROM chunks")]
+
+    def chunk_ids(self, source=None):
+        if source is None:
+            rows = self._conn.execute("SELECT id FROM chunks")
+        else:
+            rows = self._conn.execute("SELECT id FROM chunks WHERE source = ?", (source,))
+        return {row[0] for row in rows}
+
+    def replace_chunks(self, add, remove_ids):
+        """Insert `add` (dicts with id, text_key, source, text, metadata) and delete `remove_ids` atomically."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in remove_ids])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text_key, source, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(c["id"], c["text_key"], c["source"], c["text"], json.dumps(c["metadata"])) for c in add],
+            )
+
+    def iter_chunks(self, ids=None):
+        """Yield stored chunks (all of them, or just `ids`) with their embeddings."""
+        query = """
+            SELECT c.id, c.text, c.metadata, e.embedding
+            FROM chunks c JOIN embeddings e ON e.key = c.text_key
+        """
+        if ids is None:
+            batches = [self._conn.execute(query + " ORDER BY c.rowid")]
+        else:
+            ids = list(ids)
+            batches = (
+                self._conn.execute(query + f" WHERE c.id IN ({','.join('?' * len(batch))}) ORDER BY c.rowid", batch)
+                for batch in (ids[i:i + 500] for i in range(0, len(ids), 500))
+            )
+        for chunk_id, text, metadata, blob in (row for rows in batches for row in rows):
+            yield {
+                "id": chunk_id,
+                "text": text,
+                "metadata": json.loads(metadata),
+                "embedding": np.frombuffer(blob, dtype=np.float32).tolist(),
+            }
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Keep tests away from the real citizen.db and the Gemini API
+_TEST_DIR = tempfile.mkdtemp(prefix="citizen_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ["UPLOAD_DIR"] = os.path.join(_TEST_DIR, "uploads")
+# No outbound news fetches from the app's background refresher
+os.environ["NEWS_FEEDS"] = ""
+
+
+@pytest.fixture
+def db_session():
+    import database
+    import migrate
+    import models
+
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    migrate.stamp()
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        # Each test runs its own event loop; don't hand the next one pooled async connections
+        asyncio.run(database.async_engine.dispose())
+
+
+@pytest.fixture
+def client(db_session):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_user(db_session):
+    """make_user(name, district) adds and commits a user. The returned User is detached with its columns
+    loaded, so reading user.id doesn't leave a read transaction open on db_session."""
+    import models
+
+    def make(name="Asha", district="Pune", email=None):
+        user = models.User(full_name=name, email=email or f"{name.lower()}@example.com", hashed_password="x",
+                           district=district)
+        db_session.add(user)
+        db_session.commit()
+        db_session.refresh(user)
+        db_session.expunge(user)
+        db_session.rollback()
+        return user
+
+    return make
@@ -1,26 +1,201 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 import os
+import threading
+import time
+from collections import deque
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./citizen.db")
 
-# Handle Postgres/SQLite differences
-connect_args = {}
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    connect_args = {"check_same_thread": False}
+# SQLite production profile; SQLITE_TUNED=0 falls back to the driver defaults
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1") != "0"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+
+# Server databases (Postgres)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+
+# Async drivers used for the same database by the async endpoints
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def sqlite_pragmas():
+    return {
+        # Readers no longer block the writer (or vice versa), and commits only append to the WAL
+        "journal_mode": "WAL",
+        # Durable at checkpoints, not every commit; safe against corruption in WAL mode
+        "synchronous": "NORMAL",
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": SQLITE_MMAP_SIZE,
+        "cache_size": -SQLITE_CACHE_SIZE_KB,  # negative means KiB rather than pages
+        "temp_store": "MEMORY",
+    }
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    # Let SQLAlchemy, not pysqlite, decide when transactions begin (see _begin_sqlite_transaction)
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def _begin_sqlite_transaction(conn):
+    # Write sessions take the database write lock up front. A deferred transaction that reads and then
+    # writes fails with "database is locked" straight away, without waiting out busy_timeout, if
+    # another connection wrote in between.
+    immediate = conn.get_execution_options().get("sqlite_begin_immediate")
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+def pool_options(url):
+    if "sqlite" not in url:
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+            "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    if ":memory:" in url or url.split("?")[0].endswith("://"):
+        return {}
+    # Every request holds a connection for its lifetime; size the pool for the threadpool, not the default 5
+    return {"pool_size": SQLITE_POOL_SIZE, "max_overflow": SQLITE_POOL_SIZE, "pool_timeout": DB_POOL_TIMEOUT_SECONDS}
+
+def async_url(url):
+    """The same database URL with its async driver, e.g. sqlite:// -> sqlite+aiosqlite://."""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+class PoolMetrics:
+    """Pool checkout waits (over a recent window) and occupancy for one engine."""
+
+    def __init__(self, window=1000):
+        self.waits = deque(maxlen=window)
+        self.checkouts = 0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits.append(seconds)
+            self.checkouts += 1
+
+    def stats(self, engine):
+        pool = engine.pool
+        with self._lock:
+            waits = sorted(self.waits)
+        return {
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "in_use": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "idle": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checkouts": self.checkouts,
+            "wait_ms_mean": round(1000 * sum(waits) / len(waits), 3) if waits else None,
+            "wait_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 3) if waits else None,
+            "wait_ms_max": round(1000 * waits[-1], 3) if waits else None,
+        }
+
+def timed_pool(pool_class, metrics):
+    """`pool_class`, recording how long each checkout waits for a connection in `metrics`."""
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.record_wait(time.perf_counter() - start)
+
+    TimedPool.__name__ = pool_class.__name__
+    return TimedPool
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, tuned=SQLITE_TUNED, metrics=None):
+    options = pool_options(url)
+    if options and metrics is not None:
+        options["poolclass"] = timed_pool(QueuePool, metrics)
+    # Handle Postgres/SQLite differences
+    if "sqlite" not in url:
+        return create_engine(url, **options)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **options)
+    if tuned:
+        event.listen(engine, "connect", _configure_sqlite_connection)
+        event.listen(engine, "begin", _begin_sqlite_transaction)
+    return engine
+
+def create_async_db_engine(url=SQLALCHEMY_DATABASE_URL, tuned=SQLITE_TUNED, metrics=None):
+    options = pool_options(url)
+    if options and metrics is not None:
+        options["poolclass"] = timed_pool(AsyncAdaptedQueuePool, metrics)
+    engine = create_async_engine(async_url(url), **options)
+    if "sqlite" in url and tuned:
+        # Pool and transaction events live on the sync engine that the async one wraps
+        event.listen(engine.sync_engine, "connect", _configure_sqlite_connection)
+        event.listen(engine.sync_engine, "begin", _begin_sqlite_transaction)
+    return engine
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+engine = create_db_engine(metrics=pool_metrics)
+async_engine = create_async_db_engine(metrics=async_pool_metrics)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes can't lazy load after commit in async code
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+def write_sessionmaker(engine):
+    """Sessions for write transactions: on SQLite they BEGIN IMMEDIATE, so concurrent writers queue on the
+    database write lock (within busy_timeout) instead of failing when a read turns into a write."""
+    if engine.dialect.name == "sqlite":
+        engine = engine.execution_options(sqlite_begin_immediate=True)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+WriteSessionLocal = write_sessionmaker(engine)
+AsyncWriteSessionLocal = async_sessionmaker(
+    async_engine.execution_options(sqlite_begin_immediate=True) if async_engine.dialect.name == "sqlite"
+    else async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_write_db():
+    """Session for endpoints that write; on SQLite its transactions run one at a time."""
+    db = WriteSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_write_db():
+    async with AsyncWriteSessionLocal() as db:
+        yield db
+
+def pool_stats():
+    return {
+        "sync": pool_metrics.stats(engine),
+        "async": async_pool_metrics.stats(async_engine),
+    }
@@ -0,0 +1,68 @@
+import json
+import mmap
+import os
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_TEXT = "docstore.bin"
+DOCSTORE_OFFSETS = "docstore_offsets.npy"
+DOCSTORE_TABLE = "docstore.json"
+
+def write_docstore(path, docstore, index_to_docstore_id):
+    """Write documents in index order as one UTF-8 blob, an (offset, length) array and a JSON id/metadata table."""
+    ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+    offsets = np.zeros((len(ids), 2), dtype=np.int64)
+    metadata = []
+    position = 0
+    with open(os.path.join(path, DOCSTORE_TEXT), "wb") as f:
+        for row, doc_id in enumerate(ids):
+            doc = docstore.search(doc_id)
+            data = doc.page_content.encode("utf-8")
+            f.write(data)
+            offsets[row] = (position, len(data))
+            position += len(data)
+            metadata.append(doc.metadata)
+    np.save(os.path.join(path, DOCSTORE_OFFSETS), offsets)
+    with open(os.path.join(path, DOCSTORE_TABLE), "w") as f:
+        json.dump({"ids": ids, "metadata": metadata}, f)
+
+class MmapDocstore(Docstore):
+    """Read-only docstore over the files written by write_docstore.
+
+    Texts are decoded from a shared read-only mmap only when a search hit
+    needs them, so every worker process maps the same page-cache pages.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, DOCSTORE_TABLE)) as f:
+            table = json.load(f)
+        self.ids = table["ids"]
+        self._metadata = table["metadata"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._offsets = np.load(os.path.join(path, DOCSTORE_OFFSETS), mmap_mode="r")
+        with open(os.path.join(path, DOCSTORE_TEXT), "rb") as f:
+            # mmap cannot map an empty file
+            size = os.fstat(f.fileno()).st_size
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, search: str):
+        row = self._rows.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.document(row)
+
+    def document(self, row: int):
+        offset, length = self._offsets[row]
+        text = self._text[offset:offset + length].decode("utf-8")
+        return Document(id=self.ids[row], page_content=text, metadata=self._metadata[row])
+
+    def rows_matching(self, predicate):
+        return {row for row, metadata in enumerate(self._metadata) if predicate(metadata)}
+
+    def index_to_docstore_id(self):
+        return dict(enumerate(self.ids))
@@ -0,0 +1,213 @@
+"""Near-duplicate detection for new reports.
+
+A report's title and description, and separately its location, are reduced to sets of character shingles
+with a MinHash signature each. The signatures are split into DUPLICATE_BANDS bands, and each text band is
+hashed together with the matching location band into a bucket key stored in report_lsh_buckets. Reports that
+share a bucket with a new one are the candidates: similar text *at a similar place*, so the same complaint
+filed all over the city doesn't crowd the buckets. Candidates count as duplicates when both similarities
+(exact Jaccard of the shingles) clear their thresholds. Looking up DUPLICATE_BANDS buckets by primary key
+costs the same however many reports there are.
+
+Buckets are written with the report and deleted when it is resolved or, by run_pruner() in the app, once it
+ages out of the window; rebuild() re-indexes the open reports of the last DUPLICATE_WINDOW_DAYS and drops
+everything else.
+
+    python duplicates.py    # rebuild the buckets of DATABASE_URL
+"""
+import asyncio
+import datetime
+import hashlib
+import os
+import re
+import zlib
+
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select
+
+import models
+
+DUPLICATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_WINDOW_DAYS", "30"))
+# Minimum Jaccard similarity of the title and description shingles, and of the location shingles
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.5"))
+DUPLICATE_LOCATION_SIMILARITY = float(os.getenv("DUPLICATE_LOCATION_SIMILARITY", "0.5"))
+DUPLICATE_LIMIT = 5
+# How often the app drops the buckets of reports older than the window
+DUPLICATE_PRUNE_SECONDS = float(os.getenv("DUPLICATE_PRUNE_SECONDS", "3600"))
+# Candidates verified per check, those sharing the most buckets first: bounds the cost when many
+# near-identical reports share buckets
+DUPLICATE_MAX_CANDIDATES = 50
+# Bands of 3 text and 2 location hashes: a report with text similarity 0.5 at a place with location
+# similarity 0.7 shares a bucket with probability 0.72, at 0.7 and 0.7 with 0.97; the same text at an
+# unrelated place (0.2) with 0.1. Changing these (or SHINGLE_SIZE) changes every bucket key; run rebuild().
+DUPLICATE_BANDS = 20
+TEXT_ROWS = 3
+LOCATION_ROWS = 2
+SHINGLE_SIZE = 4
+RESOLVED = "Resolved"
+
+STOP_WORDS = frozenset("""a an and are at by for from has have in is it near of on or the there this to very
+was with""".split())
+_PRIME = 4294967311  # smallest prime above 2**32
+# Fixed seed: bucket keys are stored, so every process must hash alike
+_rng = np.random.default_rng(20261018)
+_A = _rng.integers(1, 2**32, size=DUPLICATE_BANDS * (TEXT_ROWS + LOCATION_ROWS), dtype=np.uint64)
+_B = _rng.integers(0, 2**32, size=DUPLICATE_BANDS * (TEXT_ROWS + LOCATION_ROWS), dtype=np.uint64)
+_TEXT_HASHES = slice(0, DUPLICATE_BANDS * TEXT_ROWS)
+_LOCATION_HASHES = slice(DUPLICATE_BANDS * TEXT_ROWS, None)
+
+buckets = models.ReportLSHBucket.__table__
+
+def words(text):
+    found = [word for word in re.findall(r"[^\W_]+", (text or "").lower()) if word not in STOP_WORDS]
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in found]
+
+def shingles(text):
+    """SHINGLE_SIZE-character pieces of each word (padded, so short words count too). Word order doesn't
+    matter, and typos or split words ("pot hole") only change a few pieces."""
+    pieces = set()
+    for word in words(text):
+        padded = f" {word} "
+        pieces.update(padded[i:i + SHINGLE_SIZE] for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1)))
+    return pieces
+
+def text_shingles(title, description):
+    return shingles(f"{title or ''} {description or ''}")
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def signature(features, hashes):
+    """MinHash of a set of strings: the minimum of each hash function (a * h + b) mod p over it."""
+    values = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint64, count=len(features))
+    if not len(values):
+        return np.zeros(len(_A[hashes]), dtype=np.uint64)
+    # a, b and h are below 2**32, so a * h + b fits in 64 bits
+    return ((_A[hashes, None] * values[None, :] + _B[hashes, None]) % _PRIME).min(axis=1)
+
+def bucket_keys(title, description, location):
+    """The report's LSH bucket keys, one per band."""
+    text = text_shingles(title, description)
+    if not text:
+        return []
+    text_bands = signature(text, _TEXT_HASHES).reshape(DUPLICATE_BANDS, TEXT_ROWS)
+    location_bands = signature(shingles(location), _LOCATION_HASHES).reshape(DUPLICATE_BANDS, LOCATION_ROWS)
+    keys = []
+    for band in range(DUPLICATE_BANDS):
+        digest = hashlib.blake2b(text_bands[band].tobytes() + location_bands[band].tobytes(), digest_size=8,
+                                 person=band.to_bytes(2, "big")).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+def index_report(db, report):
+    """Add a (flushed) report's buckets, in the caller's transaction."""
+    keys = bucket_keys(report.title, report.description, report.location)
+    if keys:
+        db.execute(insert(buckets), [{"bucket": key, "report_id": report.id} for key in set(keys)])
+
+def forget_report(db, report):
+    """Drop a report's buckets, e.g. once it is resolved. Deleting by key uses the primary key."""
+    keys = bucket_keys(report.title, report.description, report.location)
+    if keys:
+        db.execute(delete(buckets).where(buckets.c.bucket.in_(keys), buckets.c.report_id == report.id))
+
+def candidates_query(keys, since):
+    reports = models.Report
+    # The more bands two signatures share, the more similar the reports are likely to be
+    shared = (select(buckets.c.report_id, func.count().label("shared"))
+              .where(buckets.c.bucket.in_(keys))
+              .group_by(buckets.c.report_id)
+              .subquery())
+    return (select(reports.id, reports.title, reports.description, reports.location, reports.status,
+                   reports.votes, reports.created_at)
+            .join(shared, shared.c.report_id == reports.id)
+            .where(reports.created_at >= since, or_(reports.status.is_(None), reports.status != RESOLVED))
+            .order_by(shared.c.shared.desc(), reports.created_at.desc())
+            .limit(DUPLICATE_MAX_CANDIDATES))
+
+def find_duplicates(db, title, description, location, limit=DUPLICATE_LIMIT, now=None):
+    """Open reports from the last DUPLICATE_WINDOW_DAYS that look like the same issue at the same place, most
+    similar first."""
+    keys = bucket_keys(title, description, location)
+    if not keys:
+        return []
+    since = (now or datetime.datetime.utcnow()) - datetime.timedelta(days=DUPLICATE_WINDOW_DAYS)
+    text, place = text_shingles(title, description), shingles(location)
+    found = []
+    for row in db.execute(candidates_query(keys, since)):
+        if jaccard(place, shingles(row.location)) < DUPLICATE_LOCATION_SIMILARITY:
+            continue
+        similarity = jaccard(text, text_shingles(row.title, row.description))
+        if similarity < DUPLICATE_SIMILARITY:
+            continue
+        found.append({
+            "id": row.id,
+            "title": row.title,
+            "location": row.location,
+            "status": row.status,
+            "votes": row.votes or 0,
+            "created_at": row.created_at,
+            "similarity": round(similarity, 3),
+        })
+    found.sort(key=lambda d: (-d["similarity"], -d["votes"]))
+    return found[:limit]
+
+def rebuild(db, now=None):
+    since = (now or datetime.datetime.utcnow()) - datetime.timedelta(days=DUPLICATE_WINDOW_DAYS)
+    db.execute(delete(buckets))
+    reports = models.Report
+    rows = db.execute(select(reports.id, reports.title, reports.description, reports.location)
+                      .where(reports.created_at >= since,
+                             or_(reports.status.is_(None), reports.status != RESOLVED))).all()
+    batch = []
+    for row in rows:
+        batch += [{"bucket": key, "report_id": row.id}
+                  for key in set(bucket_keys(row.title, row.description, row.location))]
+        if len(batch) >= 10000:
+            db.execute(insert(buckets), batch)
+            batch = []
+    if batch:
+        db.execute(insert(buckets), batch)
+    db.commit()
+
+def prune(db, now=None, after=None, batch_size=500):
+    """Drop the buckets of open reports created before the window (and at or after `after`, if given), by
+    primary key like forget_report, committing every `batch_size` reports. Returns the window start: the
+    `after` of the next call."""
+    since = (now or datetime.datetime.utcnow()) - datetime.timedelta(days=DUPLICATE_WINDOW_DAYS)
+    reports = models.Report
+    query = (select(reports.id, reports.title, reports.description, reports.location)
+             .where(reports.created_at < since, or_(reports.status.is_(None), reports.status != RESOLVED)))
+    if after is not None:
+        query = query.where(reports.created_at >= after)
+    rows = db.execute(query).all()
+    # Hash outside the (write) transaction, then delete in short ones
+    db.rollback()
+    expired = [(row.id, bucket_keys(row.title, row.description, row.location)) for row in rows]
+    for start in range(0, len(expired), batch_size):
+        for report_id, keys in expired[start:start + batch_size]:
+            if keys:
+                db.execute(delete(buckets).where(buckets.c.bucket.in_(keys), buckets.c.report_id == report_id))
+        db.commit()
+    return since
+
+async def run_pruner(session_factory, interval=DUPLICATE_PRUNE_SECONDS):
+    """Prune every `interval` seconds with a session from `session_factory` (sync, run in a thread)."""
+    def prune_once(after):
+        with session_factory() as db:
+            return prune(db, after=after)
+
+    after = None
+    while True:
+        try:
+            after = await asyncio.to_thread(prune_once, after)
+        except Exception as e:
+            # Keep pruning; the next run covers this window too
+            print(f"Error pruning duplicate buckets: {e!r}")
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    import database
+
+    with database.WriteSessionLocal() as session:
+        rebuild(session)
+    print("Rebuilt report_lsh_buckets")
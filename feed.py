@@ -0,0 +1,182 @@
+import base64
+import datetime
+import json
+import os
+
+from collections import defaultdict
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+
+import images
+import models
+
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "20"))
+FEED_MAX_PAGE_SIZE = int(os.getenv("FEED_MAX_PAGE_SIZE", "100"))
+FEED_SORTS = ("recent", "votes")
+# "all" embeds every comment, "top" the latest FEED_TOP_COMMENTS, "count" only comment_count
+FEED_COMMENT_MODES = ("all", "top", "count")
+FEED_TOP_COMMENTS = int(os.getenv("FEED_TOP_COMMENTS", "3"))
+# Tags on at least this many reports are dense enough that walking the feed order fills a page sooner
+# than sorting every report that carries them
+FEED_COMMON_TAG_REPORTS = int(os.getenv("FEED_COMMON_TAG_REPORTS", "5000"))
+
+class InvalidCursor(ValueError):
+    pass
+
+def _sort_columns(sort):
+    if sort == "votes":
+        return models.Report.votes, models.Report.id
+    return models.Report.created_at, models.Report.id
+
+def encode_cursor(sort, report):
+    key = report.votes if sort == "votes" else report.created_at.isoformat()
+    raw = json.dumps({"sort": sort, "key": key, "id": report.id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["sort"] != sort:
+            raise InvalidCursor("Cursor was issued for a different sort order")
+        key = data["key"] if sort == "votes" else datetime.datetime.fromisoformat(data["key"])
+        return key, int(data["id"])
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+def feed_query(sort="recent", cursor=None, limit=FEED_PAGE_SIZE, status=None, tag=None, location=None,
+               district=None, owner_id=None, tag_reports=None):
+    """Keyset-paginated report feed, newest (or most voted) first.
+
+    Fetches one row more than `limit` so the caller can tell whether there is a next page. `tag_reports` is
+    the tag's report_count (see tag_count_query), when the caller knows it.
+    """
+    key_column, id_column = _sort_columns(sort)
+    query = select(models.Report)
+    if status:
+        query = query.where(models.Report.status == status)
+    if tag and (tag_reports or 0) >= FEED_COMMON_TAG_REPORTS:
+        query = query.where(models.Report.tags.any(models.Tag.name == tag.strip()))
+    elif tag:
+        # Read the tag's reports off the (tag_id, report_id) index instead of probing report_tags for every
+        # report in feed order, which walks the whole table for a rare tag
+        tag_id = select(models.Tag.id).where(models.Tag.name == tag.strip()).scalar_subquery()
+        tagged = select(models.report_tags.c.report_id).where(models.report_tags.c.tag_id == tag_id)
+        query = query.where(models.Report.id.in_(tagged))
+    if location:
+        query = query.where(models.Report.location.ilike(f"%{location}%"))
+    if district:
+        query = query.join(models.User, models.Report.user_id == models.User.id).where(models.User.district == district)
+    if owner_id is not None:
+        query = query.where(models.Report.user_id == owner_id)
+    if cursor:
+        query = query.where(tuple_(key_column, id_column) < tuple_(*decode_cursor(cursor, sort)))
+    query = query.options(selectinload(models.Report.owner), selectinload(models.Report.tags))
+    return query.order_by(key_column.desc(), id_column.desc()).limit(limit + 1)
+
+def tag_count_query(tag):
+    return select(models.Tag.report_count).where(models.Tag.name == tag.strip())
+
+def reports_query(report_ids):
+    """The given reports, loaded as feed_query loads them (in no particular order)."""
+    return (select(models.Report).where(models.Report.id.in_(report_ids))
+            .options(selectinload(models.Report.owner), selectinload(models.Report.tags)))
+
+def page_size(limit):
+    return max(1, min(limit or FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE))
+
+def comments_query(report_ids):
+    return (select(models.Comment).options(joinedload(models.Comment.owner))
+            .where(models.Comment.report_id.in_(report_ids))
+            .order_by(models.Comment.created_at, models.Comment.id))
+
+def top_comments_query(report_ids, n):
+    """The latest n comments of each report, oldest first."""
+    rank = func.row_number().over(
+        partition_by=models.Comment.report_id,
+        order_by=(models.Comment.created_at.desc(), models.Comment.id.desc()),
+    ).label("rank")
+    ranked = select(models.Comment.id, rank).where(models.Comment.report_id.in_(report_ids)).subquery()
+    return (select(models.Comment).options(joinedload(models.Comment.owner))
+            .join(ranked, ranked.c.id == models.Comment.id)
+            .where(ranked.c.rank <= n)
+            .order_by(models.Comment.created_at, models.Comment.id))
+
+def comment_counts_query(report_ids):
+    return (select(models.Comment.report_id, func.count())
+            .where(models.Comment.report_id.in_(report_ids))
+            .group_by(models.Comment.report_id))
+
+def group_comments(comments):
+    by_report = defaultdict(list)
+    for c in comments:
+        by_report[c.report_id].append(c)
+    return by_report
+
+def serialize_comment(c):
+    return {
+        "id": c.id,
+        "text": c.text,
+        "created_at": c.created_at,
+        "user_name": c.owner.full_name if c.owner else "Anonymous"
+    }
+
+def build_items(reports, by_report, counts):
+    result = []
+    for r in reports:
+        result.append({
+            "id": r.id,
+            "title": r.title,
+            "description": r.description,
+            "location": r.location,
+            "image_path": r.image_path,
+            "image_variants": images.variant_urls(r.image_path),
+            "tags": [t.name for t in r.tags],
+            "status": r.status,
+            "created_at": r.created_at,
+            "owner": r.owner.full_name if r.owner else "Anonymous",
+            "resolution_desc": r.resolution_desc,
+            "resolution_image_path": r.resolution_image_path,
+            "resolution_image_variants": images.variant_urls(r.resolution_image_path),
+            "resolved_at": r.resolved_at,
+            "votes": r.votes,
+            "comments": [serialize_comment(c) for c in by_report.get(r.id, [])],
+            "comment_count": counts.get(r.id, 0),
+        })
+    return result
+
+def serialize_reports(db, reports, comments="all", top_comments=FEED_TOP_COMMENTS):
+    """Build feed items with a fixed number of queries however many reports and comments there are.
+
+    Owners and tags are eager loaded by feed_query; comments (with their authors) or their counts are fetched in
+    one batch for the whole page instead of lazily per report.
+    """
+    report_ids = [r.id for r in reports]
+    if not report_ids:
+        return []
+    if comments == "all":
+        by_report = group_comments(db.scalars(comments_query(report_ids)))
+        counts = {report_id: len(items) for report_id, items in by_report.items()}
+    else:
+        by_report = {}
+        if comments == "top":
+            by_report = group_comments(db.scalars(top_comments_query(report_ids, top_comments)))
+        counts = dict(db.execute(comment_counts_query(report_ids)).all())
+    return build_items(reports, by_report, counts)
+
+async def aserialize_reports(db, reports, comments="all", top_comments=FEED_TOP_COMMENTS):
+    """serialize_reports for an AsyncSession; same queries."""
+    report_ids = [r.id for r in reports]
+    if not report_ids:
+        return []
+    if comments == "all":
+        by_report = group_comments(await db.scalars(comments_query(report_ids)))
+        counts = {report_id: len(items) for report_id, items in by_report.items()}
+    else:
+        by_report = {}
+        if comments == "top":
+            by_report = group_comments(await db.scalars(top_comments_query(report_ids, top_comments)))
+        counts = dict((await db.execute(comment_counts_query(report_ids))).all())
+    return build_items(reports, by_report, counts)
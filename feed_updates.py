@@ -0,0 +1,131 @@
+"""Deltas for the report feed, published as reports are created, voted on, commented on and resolved.
+
+Every event goes to the "reports" topic and to "district:<district>" for the district of the report's owner,
+which is what GET /api/reports?district= filters on. Clients subscribe through /ws/reports.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+import images
+import models
+import pubsub
+
+FEED_TOPIC = "reports"
+# Vote counts of a report are published at most this often; 0 publishes every vote
+FEED_VOTE_UPDATE_SECONDS = float(os.getenv("FEED_VOTE_UPDATE_SECONDS", "0.25"))
+DISTRICT_CACHE_SIZE = 10000
+
+def district_topic(district):
+    return f"district:{district.strip().lower()}"
+
+def topics(district=None):
+    return [FEED_TOPIC, district_topic(district)] if district and district.strip() else [FEED_TOPIC]
+
+class DistrictCache:
+    """Report id -> owner's district, so votes and comments on a hot report don't look it up every time."""
+
+    def __init__(self, size=DISTRICT_CACHE_SIZE):
+        self.size = size
+        self._districts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, report_id):
+        with self._lock:
+            if report_id not in self._districts:
+                return False, None
+            self._districts.move_to_end(report_id)
+            return True, self._districts[report_id]
+
+    def put(self, report_id, district):
+        with self._lock:
+            self._districts[report_id] = district
+            self._districts.move_to_end(report_id)
+            while len(self._districts) > self.size:
+                self._districts.popitem(last=False)
+
+districts = DistrictCache()
+
+def _district_query(report_id):
+    return (select(models.User.district)
+            .join(models.Report, models.Report.user_id == models.User.id)
+            .where(models.Report.id == report_id))
+
+def district_of(db, report_id):
+    found, district = districts.get(report_id)
+    if not found:
+        district = db.execute(_district_query(report_id)).scalar()
+        districts.put(report_id, district)
+    return district
+
+async def adistrict_of(db, report_id):
+    found, district = districts.get(report_id)
+    if not found:
+        district = (await db.execute(_district_query(report_id))).scalar()
+        districts.put(report_id, district)
+    return district
+
+def publish(event, district=None, broker=None):
+    (broker or pubsub.broker).publish(topics(district), event)
+
+# The builders below run before the endpoint commits, so that nothing they read starts another (on SQLite,
+# write-locking) transaction; the endpoint publishes what they return once the commit succeeded.
+
+def report_created(report, owner):
+    """(event, district) for a new report, flushed so it has its id and created_at."""
+    district = owner.district if owner else None
+    districts.put(report.id, district)
+    return {
+        "type": "report.created",
+        "report": {
+            "id": report.id,
+            "title": report.title,
+            "location": report.location,
+            "tags": [t.name for t in report.tags],
+            "status": report.status,
+            "created_at": report.created_at,
+            "owner": owner.full_name if owner else "Anonymous",
+            "image_variants": images.variant_urls(report.image_path),
+            "votes": report.votes or 0,
+        },
+    }, district
+
+def report_resolved(report, district):
+    return {
+        "type": "report.resolved",
+        "id": report.id,
+        "resolution_desc": report.resolution_desc,
+        "resolved_at": report.resolved_at,
+        "resolution_image_variants": images.variant_urls(report.resolution_image_path),
+    }, district
+
+def comment_added(report_id, comment, district):
+    return {"type": "comment.added", "report_id": report_id, "comment": comment}, district
+
+class VoteUpdates:
+    """Latest vote count per report, published once per interval however many votes arrived in it.
+
+    Runs on the event loop (vote_report is async), so needs no lock.
+    """
+
+    def __init__(self, interval=FEED_VOTE_UPDATE_SECONDS):
+        self.interval = interval
+        self._latest = {}  # report id -> (votes, district)
+
+    def update(self, report_id, votes, district):
+        if self.interval <= 0:
+            publish({"type": "report.voted", "id": report_id, "votes": votes}, district)
+            return
+        if not self._latest:
+            asyncio.get_running_loop().call_later(self.interval, self.flush)
+        self._latest[report_id] = (votes, district)
+
+    def flush(self):
+        latest, self._latest = self._latest, {}
+        for report_id, (votes, district) in latest.items():
+            publish({"type": "report.voted", "id": report_id, "votes": votes}, district)
+
+votes = VoteUpdates()
@@ -0,0 +1,120 @@
+"""Resized WebP variants of uploaded images.
+
+Uploads are stored without their metadata (see uploads.py). After the response is sent, process() decodes
+each new upload once, applies its EXIF orientation and writes one WebP file per IMAGE_VARIANTS size under
+uploads/variants/<upload name>/. Until that has happened every variant URL points at the original, so clients
+can always use `*_variants` in API responses.
+
+    python images.py    # strip metadata from and generate variants for uploads saved before either existed
+"""
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+import uploads
+
+# Variant name -> longest side in pixels; images are never enlarged
+IMAGE_VARIANTS = {"thumb": 320, "medium": 1080, "full": 2048}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+# Uploads whose readiness is remembered, so serializing a feed page doesn't stat a file per image; another
+# worker may process an upload, so "not yet" is only trusted for IMAGE_PENDING_RECHECK_SECONDS
+IMAGE_READINESS_CACHE_SIZE = int(os.getenv("IMAGE_READINESS_CACHE_SIZE", "10000"))
+IMAGE_PENDING_RECHECK_SECONDS = float(os.getenv("IMAGE_PENDING_RECHECK_SECONDS", "5"))
+
+VARIANT_DIR = os.path.join(uploads.UPLOAD_DIR, "variants")
+
+_readiness = OrderedDict()  # upload name -> True once processed, else when it was last seen unprocessed
+_readiness_lock = threading.Lock()
+
+def _upload_name(url):
+    """File name of a local upload URL, or None for anything else."""
+    prefix = uploads.upload_url("")
+    if not url or not url.startswith(prefix) or "/" in url[len(prefix):]:
+        return None
+    return url[len(prefix):]
+
+def variant_path(name, variant):
+    return os.path.join(VARIANT_DIR, name, f"{variant}.webp")
+
+def _remember(name, state):
+    with _readiness_lock:
+        _readiness[name] = state
+        _readiness.move_to_end(name)
+        while len(_readiness) > IMAGE_READINESS_CACHE_SIZE:
+            _readiness.popitem(last=False)
+
+def is_processed(name):
+    now = time.monotonic()
+    with _readiness_lock:
+        state = _readiness.get(name)
+        if state is not None:
+            _readiness.move_to_end(name)
+    if state is True or (state is not None and now - state < IMAGE_PENDING_RECHECK_SECONDS):
+        return state is True
+    # The last variant is written last, so its presence means the set is complete
+    ready = os.path.exists(variant_path(name, list(IMAGE_VARIANTS)[-1]))
+    _remember(name, True if ready else now)
+    return ready
+
+def variant_urls(url):
+    """{variant: URL} for an image URL from the API, falling back to the URL itself until variants exist."""
+    if not url:
+        return None
+    name = _upload_name(url)
+    if name is None or not is_processed(name):
+        return {variant: url for variant in IMAGE_VARIANTS}
+    return {variant: uploads.upload_url(f"variants/{name}/{variant}.webp") for variant in IMAGE_VARIANTS}
+
+def _normalize(image):
+    image = ImageOps.exif_transpose(image)
+    # WebP takes RGB or RGBA; palette and greyscale images keep their transparency, if any
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+def process(url):
+    """Write the WebP variants of an uploaded image; a no-op if they already exist (the same content was
+    uploaded before) or the URL isn't a local upload. Failures are logged, never raised: the original stays
+    usable."""
+    name = _upload_name(url)
+    if name is None or is_processed(name):
+        return False
+    source = os.path.join(uploads.UPLOAD_DIR, name)
+    try:
+        with Image.open(source) as original:
+            image = _normalize(original)
+        os.makedirs(os.path.join(VARIANT_DIR, name), exist_ok=True)
+        for variant, size in IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            path = variant_path(name, variant)
+            # No exif= argument, so nothing from the original's metadata is written
+            resized.save(path + ".part", "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+            os.replace(path + ".part", path)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Error processing image {name}: {e}")
+        return False
+    _remember(name, True)
+    return True
+
+def main():
+    names = sorted(entry.name for entry in os.scandir(uploads.UPLOAD_DIR)
+                   if entry.is_file() and not entry.name.startswith("."))
+    stripped = 0
+    for name in names:
+        extension = name.rsplit(".", 1)[-1]
+        if extension not in uploads.PIL_FORMATS:
+            continue
+        try:
+            stripped += uploads.strip_metadata(os.path.join(uploads.UPLOAD_DIR, name), extension)
+        except uploads.UploadError as e:
+            print(f"Error stripping metadata from {name}: {e}")
+    done = sum(process(uploads.upload_url(name)) for name in names)
+    print(f"Stripped metadata from {stripped} and generated variants for {done} of {len(names)} uploads")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import (FastAPI, BackgroundTasks, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile,
+                     WebSocket, WebSocketDisconnect, status)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 import models
 import database
-from pydantic import BaseModel
+import duplicates
+import migrate
+import feed
+import feed_updates
+import pubsub
+import rollups
+import search
+import tags
+import voting
+import news
+import sos_dispatch
+from pydantic import BaseModel, Field, computed_field
 from passlib.context import CryptContext
-import feedparser
-from rag_chat import chat_with_rag
-
-models.Base.metadata.create_all(bind=database.engine)
-
-app = FastAPI(title="Citizen App API")
+import json
+import rag_chat
+from rag_chat import achat_with_rag, stream_chat
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema is migrated by `python migrate.py` before the workers start (see migrate.py)
+    migrate.check_current()
+    with database.SessionLocal() as db:
+        sos_dispatch.authorities.load(db)
+    # Load the FAISS index and Gemini clients once per process
+    rag_chat.engine.load()
+    vote_flusher = None
+    if voting.buffer is not None:
+        vote_flusher = asyncio.create_task(voting.buffer.run(database.AsyncWriteSessionLocal))
+    news_refresher = asyncio.create_task(news.cache.run())
+    duplicate_pruner = asyncio.create_task(duplicates.run_pruner(database.WriteSessionLocal))
+    await pubsub.broker.start()
+    yield
+    await pubsub.broker.stop()
+    for task in (news_refresher, duplicate_pruner):
+        task.cancel()
+    await asyncio.gather(news_refresher, duplicate_pruner, return_exceptions=True)
+    if vote_flusher is not None:
+        # Cancelling runs a final flush
+        vote_flusher.cancel()
+        await asyncio.gather(vote_flusher, return_exceptions=True)
+    await database.async_engine.dispose()
+
+app = FastAPI(title="Citizen App API", lifespan=lifespan)
 
 # CORS Setup
 origins = ["http://localhost:5173", "http://localhost:3000","http://localhost:5174","http://192.168.43.56:5173"]
@@ -21,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Auth Utils
@@ -34,16 +75,39 @@ def get_password_hash(password):
 
 # Pydantic Models
 from fastapi.staticfiles import StaticFiles
-import base64
-import uuid
-import os
-
-# Create uploads directory
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+import images
+import uploads
+
+app.mount("/uploads", StaticFiles(directory=uploads.UPLOAD_DIR), name="uploads")
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Multipart bodies are spooled to disk before the endpoint runs; refuse oversized ones up front. A chunked
+    # body has no length to check, so multipart must declare one (the server holds the body to it).
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        length = request.headers.get("content-length", "")
+        if not length.isdigit():
+            return JSONResponse(status_code=411, content={"detail": "Uploads need a Content-Length"})
+        if int(length) > uploads.UPLOAD_MAX_BYTES + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+def process_image_later(background_tasks: BackgroundTasks, image_path):
+    # Thumbnails and WebP variants are made after the response is sent
+    if image_path:
+        background_tasks.add_task(images.process, image_path)
+    return image_path
+
+def save_upload(upload: Optional[UploadFile], background_tasks: BackgroundTasks):
+    if upload is None or not upload.filename:
+        return None
+    try:
+        return process_image_later(background_tasks, uploads.save_stream(upload.file))
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+def save_base64_image(data: Optional[str], background_tasks: BackgroundTasks):
+    return process_image_later(background_tasks, uploads.try_save_base64(data)) if data else None
 
 # ... (Auth Utils remain same) ...
 
@@ -75,6 +139,11 @@ class UserOut(BaseModel):
     district: Optional[str] = None
     sub_district: Optional[str] = None
 
+    @computed_field
+    @property
+    def profile_image_variants(self) -> Optional[Dict[str, str]]:
+        return images.variant_urls(self.profile_image_path)
+
     class Config:
         from_attributes = True
 
@@ -100,9 +169,16 @@ class ReportResolve(BaseModel):
 class SOSCreate(BaseModel):
     location: str
     user_id: int
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    # Where to route the alert; each defaults to the user's profile
+    state: Optional[str] = None
+    district: Optional[str] = None
+    sub_district: Optional[str] = None
 
 class ChatRequest(BaseModel):
     query: str
+    sources: Optional[List[str]] = None # Limit retrieval to these corpus documents
 
 @app.get("/api/users/{user_id}", response_model=UserOut)
 def get_user(user_id: int, db: Session = Depends(database.get_db)):
@@ -111,76 +187,50 @@ def get_user(user_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
-@app.put("/api/users/{user_id}", response_model=UserOut)
-def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(database.get_db)):
+def apply_user_update(db, user_id, full_name=None, email=None, image_path=None):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user_update.full_name:
-        db_user.full_name = user_update.full_name
-    if user_update.email:
+    if full_name:
+        db_user.full_name = full_name
+    if email:
         # Check if email is taken by another user
-        existing_email = db.query(models.User).filter(models.User.email == user_update.email, models.User.id != user_id).first()
+        existing_email = db.query(models.User).filter(models.User.email == email, models.User.id != user_id).first()
         if existing_email:
             raise HTTPException(status_code=400, detail="Email already in use")
-        db_user.email = user_update.email
-    
-    if user_update.profile_image:
-        try:
-            # Handle image upload similarly to signup
-            data_parts = user_update.profile_image.split(",")
-            if len(data_parts) > 1:
-                image_data = base64.b64decode(data_parts[1])
-            else:
-                image_data = base64.b64decode(data_parts[0])
-            
-            filename = f"{uuid.uuid4()}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            with open(file_path, "wb") as f:
-                f.write(image_data)
-            
-            db_user.profile_image_path = f"/uploads/{filename}"
-        except Exception as e:
-            print(f"Error updating image: {e}")
-            pass
+        db_user.email = email
+    if image_path:
+        db_user.profile_image_path = image_path
 
     db.commit()
     db.refresh(db_user)
     return db_user
 
-
-@app.post("/api/auth/signup", response_model=UserOut)
-def signup(user: UserCreate, db: Session = Depends(database.get_db)):
+@app.put("/api/users/{user_id}", response_model=UserOut)
+def update_user(user_id: int, user_update: UserUpdate, background_tasks: BackgroundTasks,
+                db: Session = Depends(database.get_write_db)):
+    image_path = save_base64_image(user_update.profile_image, background_tasks)
+    return apply_user_update(db, user_id, user_update.full_name, user_update.email, image_path)
+
+@app.put("/api/users/{user_id}/form", response_model=UserOut)
+def update_user_form(
+    user_id: int,
+    background_tasks: BackgroundTasks,
+    full_name: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    profile_image: Optional[UploadFile] = File(None),
+    db: Session = Depends(database.get_write_db),
+):
+    return apply_user_update(db, user_id, full_name, email, save_upload(profile_image, background_tasks))
+
+
+def create_user(db, user: UserCreate, image_path=None):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     hashed_pwd = get_password_hash(user.password)
-    
-    image_path = None
-    if user.profile_image:
-        try:
-            # Simple base64 decode and save
-            # Expecting "data:image/png;base64,....." or just base64
-            data_parts = user.profile_image.split(",")
-            if len(data_parts) > 1:
-                image_data = base64.b64decode(data_parts[1])
-            else:
-                image_data = base64.b64decode(data_parts[0])
-            
-            filename = f"{uuid.uuid4()}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            with open(file_path, "wb") as f:
-                f.write(image_data)
-            
-            image_path = f"/uploads/{filename}"
-        except Exception as e:
-            print(f"Error saving image: {e}")
-            # Non-blocking error for now, just continue without image
-            pass
 
     new_user = models.User(
         email=user.email, 
@@ -196,8 +246,34 @@ def signup(user: UserCreate, db: Session = Depends(database.get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    if new_user.role == "authority":
+        sos_dispatch.authorities.add(new_user.id, new_user.state, new_user.district, new_user.sub_district)
     return new_user
 
+@app.post("/api/auth/signup", response_model=UserOut)
+def signup(user: UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_write_db)):
+    # A bad image doesn't fail signup; continue without it
+    image_path = save_base64_image(user.profile_image, background_tasks)
+    return create_user(db, user, image_path)
+
+@app.post("/api/auth/signup/form", response_model=UserOut)
+def signup_form(
+    background_tasks: BackgroundTasks,
+    full_name: str = Form(...),
+    email: str = Form(...),
+    password: str = Form(...),
+    role: str = Form("citizen"),
+    department: Optional[str] = Form(None),
+    state: Optional[str] = Form(None),
+    district: Optional[str] = Form(None),
+    sub_district: Optional[str] = Form(None),
+    profile_image: Optional[UploadFile] = File(None),
+    db: Session = Depends(database.get_write_db),
+):
+    user = UserCreate(full_name=full_name, email=email, password=password, role=role, department=department,
+                      state=state, district=district, sub_district=sub_district)
+    return create_user(db, user, save_upload(profile_image, background_tasks))
+
 @app.post("/api/auth/login")
 def login(user: UserLogin, db: Session = Depends(database.get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
@@ -216,57 +292,125 @@ def login(user: UserLogin, db: Session = Depends(database.get_db)):
             "state": db_user.state,
             "district": db_user.district,
             "sub_district": db_user.sub_district,
-            "profile_image_path": db_user.profile_image_path
+            "profile_image_path": db_user.profile_image_path,
+            "profile_image_variants": images.variant_urls(db_user.profile_image_path),
         }
     }
 
+async def run_until_disconnected(http_request: Request, coro, poll_interval: float = 0.5):
+    # Stop upstream work as soon as the client goes away
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
+
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
-    response = chat_with_rag(request.query)
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    response = await run_until_disconnected(http_request, achat_with_rag(request.query, request.sources))
     return {"reply": response}
 
-@app.post("/api/reports")
-def create_report(report: ReportCreate, db: Session = Depends(database.get_db)):
-    # Convert tags list to string for storage
-    tags_str = ",".join(report.tags)
-    
-    image_path = None
-    if report.image:
-        try:
-            data_parts = report.image.split(",")
-            if len(data_parts) > 1:
-                image_data = base64.b64decode(data_parts[1])
-            else:
-                image_data = base64.b64decode(data_parts[0])
-            
-            filename = f"report_{uuid.uuid4()}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            with open(file_path, "wb") as f:
-                f.write(image_data)
-            
-            image_path = f"/uploads/{filename}"
-        except Exception as e:
-            print(f"Error saving report image: {e}")
-            pass
+def format_sse(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def chat_event_stream(query: str, sources: Optional[List[str]] = None):
+    async def events():
+        async for event, data in stream_chat(query, sources):
+            yield format_sse(event, data)
 
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    return chat_event_stream(request.query, request.sources)
+
+@app.get("/api/chat/stream")
+async def chat_stream_get(query: str, sources: Optional[List[str]] = Query(None)):
+    # EventSource clients can only issue GET requests
+    return chat_event_stream(query, sources)
+
+@app.get("/api/chat/stats")
+def chat_stats():
+    return rag_chat.engine.stats()
+
+@app.post("/api/chat/reload")
+def reload_chat_index():
+    if not rag_chat.engine.reload():
+        raise HTTPException(status_code=404, detail="Vector store not found")
+    return rag_chat.engine.stats()
+
+def insert_report(db, read_db, report: ReportCreate, image_path=None):
+    # The report is filed either way; the client can offer to vote on a likely duplicate instead. Checked on
+    # the read session so the lookup doesn't hold the write lock; only indexing the new report needs it.
+    found = duplicates.find_duplicates(read_db, report.title, report.description, report.location)
+    read_db.rollback()
     new_report = models.Report(
         title=report.title,
         description=report.description,
         location=report.location,
         image_path=image_path,
-        tags=tags_str,
         user_id=report.user_id
     )
     db.add(new_report)
+    tags.tag_report(db, new_report, report.tags)
+    db.flush()
+    update = feed_updates.report_created(new_report, db.get(models.User, report.user_id))
+    for statement in rollups.report_created(db.bind.dialect.name, new_report, update[1]):
+        db.execute(statement)
+    duplicates.index_report(db, new_report)
     db.commit()
+    feed_updates.publish(*update)
     db.refresh(new_report)
-    return {"status": "Report Created", "id": new_report.id}
+    return {"status": "Report Created", "id": new_report.id, "duplicates": found}
+
+@app.post("/api/reports")
+def create_report(report: ReportCreate, background_tasks: BackgroundTasks,
+                  db: Session = Depends(database.get_write_db), read_db: Session = Depends(database.get_db)):
+    image_path = save_base64_image(report.image, background_tasks)
+    return insert_report(db, read_db, report, image_path)
+
+@app.post("/api/reports/form")
+def create_report_form(
+    background_tasks: BackgroundTasks,
+    title: str = Form(...),
+    description: str = Form(...),
+    location: str = Form(...),
+    user_id: int = Form(...),
+    tags: List[str] = Form([]),
+    image: Optional[UploadFile] = File(None),
+    db: Session = Depends(database.get_write_db),
+    read_db: Session = Depends(database.get_db),
+):
+    report = ReportCreate(title=title, description=description, location=location, tags=tags, user_id=user_id)
+    return insert_report(db, read_db, report, save_upload(image, background_tasks))
+
+class DuplicateCheck(BaseModel):
+    title: str
+    description: str = ""
+    location: str
+
+@app.post("/api/reports/duplicates")
+def check_duplicates(check: DuplicateCheck, db: Session = Depends(database.get_db)):
+    # Likely duplicates of a report about to be filed (create_report returns the same list)
+    return duplicates.find_duplicates(db, check.title, check.description, check.location)
 
 class CommentCreate(BaseModel):
     text: str
     user_id: int
 
+class VoteCreate(BaseModel):
+    user_id: Optional[int] = None
+
 class CommentOut(BaseModel):
     id: int
     text: str
@@ -282,15 +426,18 @@ class ReportOut(BaseModel):
     description: str
     location: str
     image_path: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
     tags: List[str]
     status: str
     created_at: datetime.datetime
     owner: str
     resolution_desc: Optional[str] = None
     resolution_image_path: Optional[str] = None
+    resolution_image_variants: Optional[Dict[str, str]] = None
     resolved_at: Optional[datetime.datetime] = None
     votes: int
     comments: List[CommentOut] = []
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
@@ -298,53 +445,144 @@ class ReportOut(BaseModel):
 # ... (Previous code)
 
 @app.get("/api/reports", response_model=List[ReportOut])
-def get_reports(db: Session = Depends(database.get_db)):
-    reports = db.query(models.Report).all()
-    # Manual mapping to match Pydantic model structure if needed, or rely on ORM
-    # Because we added relationships, we can try to let Pydantic handle it, 
-    # but we need to ensure the data shape matches.
-    # The simplest way to match the previous list-of-dicts approach is to construct it:
-    result = []
-    for r in reports:
-        comments_data = []
-        for c in r.comments:
-            comments_data.append({
-                "id": c.id,
-                "text": c.text,
-                "created_at": c.created_at,
-                "user_name": c.owner.full_name if c.owner else "Anonymous"
-            })
-
-        result.append({
-            "id": r.id,
-            "title": r.title,
-            "description": r.description,
-            "location": r.location,
-            "image_path": r.image_path,
-            "tags": r.tags.split(",") if r.tags else [],
-            "status": r.status,
-            "created_at": r.created_at,
-            "owner": r.owner.full_name if r.owner else "Anonymous",
-            "resolution_desc": r.resolution_desc,
-            "resolution_image_path": r.resolution_image_path,
-            "resolved_at": r.resolved_at,
-            "votes": r.votes,
-            "comments": comments_data
-        })
-    return result
+async def get_reports(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(feed.FEED_PAGE_SIZE, ge=1),
+    sort: str = Query("recent", pattern="^(recent|votes)$"),
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    location: Optional[str] = None,
+    district: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    comments: str = Query("all", pattern="^(all|top|count)$"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    # Keyset pagination: the next page's cursor is returned in the X-Next-Cursor header
+    limit = feed.page_size(limit)
+    tag_reports = await db.scalar(feed.tag_count_query(tag)) if tag else None
+    try:
+        query = feed.feed_query(sort, cursor, limit, status=status, tag=tag, location=location,
+                                district=district, owner_id=owner_id, tag_reports=tag_reports)
+    except feed.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    reports = (await db.scalars(query)).all()
+    if len(reports) > limit:
+        reports = reports[:limit]
+        response.headers["X-Next-Cursor"] = feed.encode_cursor(sort, reports[-1])
+    return await feed.aserialize_reports(db, reports, comments=comments)
+
+class SearchResultOut(ReportOut):
+    snippet: str
+    score: float
+
+@app.get("/api/search", response_model=List[SearchResultOut])
+async def search_reports(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1),
+    status: Optional[str] = None,
+    district: Optional[str] = None,
+    prefix: bool = False,
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    # Best matches first across titles, descriptions, locations and comments (see search.py); the next page's
+    # cursor is returned in the X-Next-Cursor header, as for /api/reports. prefix=true lets the last word be
+    # incomplete, for search as you type
+    limit = search.page_size(limit)
+    try:
+        ranked = (await db.execute(search.search_query(db.bind.dialect.name, q, cursor, limit, status=status,
+                                                       district=district, prefix=prefix))).all()
+    except search.InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        response.headers["X-Next-Cursor"] = search.encode_cursor(ranked[-1].score, ranked[-1].id)
+    if not ranked:
+        return []
+    hits = {row.id: row for row in ranked}
+    reports = {r.id: r for r in await db.scalars(feed.reports_query(list(hits)))}
+    items = await feed.aserialize_reports(db, [reports[i] for i in hits if i in reports], comments="count")
+    for item in items:
+        item["snippet"] = hits[item["id"]].snippet or ""
+        # Scores sort ascending; report relevance the right way up
+        item["score"] = -hits[item["id"]].score
+    return items
+
+@app.websocket("/ws/reports")
+async def reports_websocket(websocket: WebSocket, district: Optional[List[str]] = Query(None)):
+    # Feed deltas (report.created/voted/resolved, comment.added) instead of re-fetching /api/reports; only
+    # the given districts' reports if any. {"type": "resync"} means updates were dropped: reload the feed.
+    await websocket.accept()
+    topics = [feed_updates.district_topic(d) for d in district or [] if d.strip()] or [feed_updates.FEED_TOPIC]
+    subscription = pubsub.broker.subscribe(topics)
+
+    async def forward():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pubsub.broker.unsubscribe(subscription)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+@app.get("/api/feed/stats")
+async def feed_stats():
+    return pubsub.broker.stats()
+
+@app.get("/api/stats/summary")
+def stats_summary(district: Optional[str] = None, db: Session = Depends(database.get_db)):
+    # Pending/resolved counts, votes on open reports and mean time to resolve, per district
+    return rollups.summary(db, district)
+
+@app.get("/api/stats/series")
+def stats_series(district: Optional[str] = None, bucket: str = Query("day", pattern="^(day|week|month)$"),
+                 days: int = Query(30, ge=1, le=3660), db: Session = Depends(database.get_db)):
+    return rollups.series(db, district, bucket, days)
+
+@app.get("/api/stats/top-open", response_model=List[ReportOut])
+async def stats_top_open(district: Optional[str] = None, limit: int = Query(10, ge=1, le=100),
+                         db: AsyncSession = Depends(database.get_async_db)):
+    # Most voted pending reports: the feed's vote ordering, without comments
+    reports = (await db.scalars(feed.feed_query("votes", limit=limit, status="Pending", district=district))).all()
+    return await feed.aserialize_reports(db, reports[:limit], comments="count")
+
+@app.get("/api/db/stats")
+def db_stats():
+    # Connection pool occupancy and checkout waits for the sync and async engines
+    return database.pool_stats()
+
+@app.get("/api/tags/trending")
+def get_trending_tags(limit: int = Query(10, ge=1, le=100), days: Optional[int] = Query(None, ge=1),
+                      db: Session = Depends(database.get_db)):
+    return tags.trending_tags(db, limit=limit, days=days)
 
 @app.post("/api/reports/{report_id}/vote")
-def vote_report(report_id: int, db: Session = Depends(database.get_db)):
-    report = db.query(models.Report).filter(models.Report.id == report_id).first()
-    if not report:
+async def vote_report(report_id: int, vote: Optional[VoteCreate] = None,
+                      db: AsyncSession = Depends(database.get_async_write_db)):
+    # Without a user_id the vote is anonymous, as before, and always counted
+    district = await feed_updates.adistrict_of(db, report_id)
+    try:
+        result = await voting.cast_vote(db, report_id, user_id=vote.user_id if vote else None, buffer=voting.buffer)
+    except voting.UnknownUser as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if result is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    report.votes += 1
-    db.commit()
-    return {"votes": report.votes}
+    votes, counted = result
+    if counted:
+        feed_updates.votes.update(report_id, votes, district)
+    return {"votes": votes, "counted": counted}
 
 @app.post("/api/reports/{report_id}/comments")
-def add_comment(report_id: int, comment: CommentCreate, db: Session = Depends(database.get_db)):
-    report = db.query(models.Report).filter(models.Report.id == report_id).first()
+async def add_comment(report_id: int, comment: CommentCreate, db: AsyncSession = Depends(database.get_async_write_db)):
+    report = await db.get(models.Report, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -354,66 +592,152 @@ def add_comment(report_id: int, comment: CommentCreate, db: Session = Depends(da
         report_id=report_id
     )
     db.add(new_comment)
-    db.commit()
-    db.refresh(new_comment)
+    district = await feed_updates.adistrict_of(db, report_id)
+    await db.commit()
+    # Relationships can't lazy load on an AsyncSession
+    await db.refresh(new_comment, ["owner"])
     
-    return {
+    result = {
         "id": new_comment.id,
         "text": new_comment.text,
         "created_at": new_comment.created_at,
         "user_name": new_comment.owner.full_name if new_comment.owner else "Anonymous"
     }
+    feed_updates.publish(*feed_updates.comment_added(report_id, result, district))
+    return result
 
-@app.put("/api/reports/{report_id}/resolve")
-def resolve_report(report_id: int, resolution: ReportResolve, db: Session = Depends(database.get_db)):
+def get_report_or_404(db, report_id):
     report = db.query(models.Report).filter(models.Report.id == report_id).first()
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
-    
-    report.resolution_desc = resolution.resolution_desc
+    return report
+
+def mark_resolved(db, report, resolution_desc, image_path=None):
+    previous_status = report.status
+    report.resolution_desc = resolution_desc
     report.status = "Resolved"
     report.resolved_at = datetime.datetime.utcnow()
-
-    if resolution.resolution_image:
-        try:
-            data_parts = resolution.resolution_image.split(",")
-            if len(data_parts) > 1:
-                image_data = base64.b64decode(data_parts[1])
-            else:
-                image_data = base64.b64decode(data_parts[0])
-            
-            filename = f"resolved_{uuid.uuid4()}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            
-            with open(file_path, "wb") as f:
-                f.write(image_data)
-            
-            report.resolution_image_path = f"/uploads/{filename}"
-        except Exception as e:
-            print(f"Error saving resolution image: {e}")
-            pass
+    if image_path:
+        report.resolution_image_path = image_path
+    district = feed_updates.district_of(db, report.id)
+    update = feed_updates.report_resolved(report, district)
+    for statement in rollups.report_resolved(db.bind.dialect.name, report, previous_status, district):
+        db.execute(statement)
+    if previous_status != "Resolved":
+        duplicates.forget_report(db, report)
 
     db.commit()
+    feed_updates.publish(*update)
     db.refresh(report)
     return {"status": "Resolved"}
 
+@app.put("/api/reports/{report_id}/resolve")
+def resolve_report(report_id: int, resolution: ReportResolve, background_tasks: BackgroundTasks,
+                   db: Session = Depends(database.get_write_db)):
+    # Saved before the first query, which takes the write lock (see insert_report)
+    image_path = save_base64_image(resolution.resolution_image, background_tasks)
+    report = get_report_or_404(db, report_id)
+    return mark_resolved(db, report, resolution.resolution_desc, image_path)
+
+@app.put("/api/reports/{report_id}/resolve/form")
+def resolve_report_form(
+    report_id: int,
+    background_tasks: BackgroundTasks,
+    resolution_desc: str = Form(...),
+    resolution_image: Optional[UploadFile] = File(None),
+    db: Session = Depends(database.get_write_db),
+):
+    image_path = save_upload(resolution_image, background_tasks)
+    report = get_report_or_404(db, report_id)
+    return mark_resolved(db, report, resolution_desc, image_path)
+
 @app.post("/api/sos")
-def trigger_sos(sos: SOSCreate, db: Session = Depends(database.get_db)):
-    new_sos = models.SOSAlert(location=sos.location, user_id=sos.user_id)
+async def trigger_sos(sos: SOSCreate, db: AsyncSession = Depends(database.get_async_write_db)):
+    user = await db.get(models.User, sos.user_id)
+    region = {
+        "state": sos.state or (user.state if user else None),
+        "district": sos.district or (user.district if user else None),
+        "sub_district": sos.sub_district or (user.sub_district if user else None),
+    }
+    position = {}
+    if sos.latitude is not None and sos.longitude is not None:
+        position = {"latitude": sos.latitude, "longitude": sos.longitude}
+    cell = None
+    if position:
+        cell = sos_dispatch.geohash(sos.latitude, sos.longitude, sos_dispatch.STORED_GEOHASH_PRECISION)
+    new_sos = models.SOSAlert(location=sos.location, user_id=sos.user_id, geohash=cell, **position, **region)
     db.add(new_sos)
-    db.commit()
-    return {"status": "SOS Alert Sent", "location": sos.location}
+    await db.commit()
+    # Pushed to connected authorities as soon as it's stored
+    notified = sos_dispatch.dispatcher.publish(sos_dispatch.alert_message(new_sos, user), **position, **region)
+    return {"status": "SOS Alert Sent", "location": sos.location, "id": new_sos.id, "notified": notified}
+
+@app.websocket("/ws/sos")
+async def sos_websocket(websocket: WebSocket, user_id: int, latitude: Optional[float] = None,
+                        longitude: Optional[float] = None):
+    # Authority clients receive alerts for their region and, if they send a position, around it
+    if user_id not in sos_dispatch.authorities:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    queue = sos_dispatch.dispatcher.subscribe(user_id, latitude, longitude)
+
+    async def forward():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        while True:
+            # Moving clients send {"latitude": ..., "longitude": ...} updates
+            try:
+                position = json.loads(await websocket.receive_text())
+                sos_dispatch.authorities.locate(user_id, float(position["latitude"]), float(position["longitude"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Before awaiting anything: if the connection was cancelled, so is every await in here
+        sos_dispatch.dispatcher.unsubscribe(user_id, queue)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+@app.get("/api/sos/stream")
+async def sos_stream(user_id: int, latitude: Optional[float] = None, longitude: Optional[float] = None):
+    # SSE alternative to /ws/sos for EventSource clients
+    if user_id not in sos_dispatch.authorities:
+        raise HTTPException(status_code=403, detail="Only authority users can subscribe to SOS alerts")
+
+    async def events():
+        queue = sos_dispatch.dispatcher.subscribe(user_id, latitude, longitude)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), sos_dispatch.SOS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: sos\ndata: {message}\n\n"
+        finally:
+            sos_dispatch.dispatcher.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/sos/stats")
+async def sos_stats():
+    # On the event loop, which is what changes the subscriptions
+    return sos_dispatch.dispatcher.stats()
 
 @app.get("/api/news")
 def get_news():
-    rss_url = "https://news.google.com/rss/search?q=India+Civic+Rights&hl=en-IN&gl=IN&ceid=IN:en"
-    feed = feedparser.parse(rss_url)
-    articles = []
-    for entry in feed.entries[:10]:
-        articles.append({
-            "title": entry.title,
-            "link": entry.link,
-            "published": entry.published,
-            "source": entry.source.title if 'source' in entry else "Google News"
-        })
-    return articles
+    # Served from memory; news.cache.run() refreshes it in the background
+    return news.cache.articles()
+
+@app.get("/api/news/stats")
+def news_stats():
+    return news.cache.stats()
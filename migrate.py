@@ -0,0 +1,64 @@
+"""Apply the Alembic migrations in migrations/ to DATABASE_URL.
+
+    python migrate.py            # upgrade to the latest revision
+    python migrate.py 0003       # upgrade to a given revision
+
+Use the alembic command line (`alembic downgrade 0003`, `alembic history`) for anything else.
+
+Run it as a deploy step, before starting the workers: they only check that the database is at the latest
+revision. MIGRATE_ON_STARTUP=1 upgrades from the app's startup instead, for a single process (development);
+several workers would race on the same upgrade.
+"""
+import os
+import sys
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+import database
+import search
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") != "0"
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+def alembic_config(url=None):
+    config = Config(ALEMBIC_INI)
+    # Config values are %-interpolated, and URLs may carry %-escaped passwords
+    config.set_main_option("sqlalchemy.url", (url or database.SQLALCHEMY_DATABASE_URL).replace("%", "%%"))
+    # Keep the app's logging setup when migrating at startup
+    config.attributes["configure_logger"] = False
+    return config
+
+def include_name(name, type_, parent_names):
+    """Leave the full-text index (created by search.py, not the models) out of autogenerate comparisons."""
+    return not (type_ == "table" and search.is_index_table(name))
+
+def current_revision(engine=None):
+    with (engine or database.engine).connect() as conn:
+        return MigrationContext.configure(conn).get_current_revision()
+
+def head_revision():
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def upgrade(revision="head", url=None):
+    command.upgrade(alembic_config(url), revision)
+
+def check_current():
+    """At startup: upgrade with MIGRATE_ON_STARTUP, otherwise refuse to serve an out-of-date schema."""
+    if MIGRATE_ON_STARTUP:
+        upgrade()
+        return
+    current, head = current_revision(), head_revision()
+    if current != head:
+        raise RuntimeError(f"Database is at revision {current}, the code expects {head}; run python migrate.py")
+
+def stamp(revision="head", url=None):
+    """Mark a database created straight from the models as up to date."""
+    command.stamp(alembic_config(url), revision)
+
+if __name__ == "__main__":
+    upgrade(sys.argv[1] if len(sys.argv) > 1 else "head")
+    print(f"Database at revision {current_revision()}")
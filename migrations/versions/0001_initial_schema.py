@@ -0,0 +1,82 @@
+"""Initial schema
+
+Databases created by the old Base.metadata.create_all() already have these
+tables; they are left alone and only missing ones are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String()),
+            sa.Column("full_name", sa.String()),
+            sa.Column("hashed_password", sa.String()),
+            sa.Column("profile_image_path", sa.String(), nullable=True),
+            sa.Column("role", sa.String()),
+            sa.Column("department", sa.String(), nullable=True),
+            sa.Column("state", sa.String(), nullable=True),
+            sa.Column("district", sa.String(), nullable=True),
+            sa.Column("sub_district", sa.String(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "reports" not in existing:
+        op.create_table(
+            "reports",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("description", sa.String()),
+            sa.Column("location", sa.String()),
+            sa.Column("image_path", sa.String(), nullable=True),
+            sa.Column("tags", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("resolution_desc", sa.String(), nullable=True),
+            sa.Column("resolution_image_path", sa.String(), nullable=True),
+            sa.Column("resolved_at", sa.DateTime(), nullable=True),
+            sa.Column("votes", sa.Integer()),
+        )
+        op.create_index("ix_reports_id", "reports", ["id"])
+
+    if "comments" not in existing:
+        op.create_table(
+            "comments",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("text", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id")),
+        )
+        op.create_index("ix_comments_id", "comments", ["id"])
+
+    if "sos_alerts" not in existing:
+        op.create_table(
+            "sos_alerts",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("location", sa.String()),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_sos_alerts_id", "sos_alerts", ["id"])
+
+
+def downgrade():
+    for table in ("sos_alerts", "comments", "reports", "users"):
+        op.drop_table(table)
@@ -0,0 +1,45 @@
+"""Add user role/location columns and report images (was fix_db_schema.py)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+USER_COLUMNS = [
+    ("role", sa.String(), "citizen"),
+    ("department", sa.String(), None),
+    ("state", sa.String(), None),
+    ("district", sa.String(), None),
+    ("sub_district", sa.String(), None),
+]
+REPORT_COLUMNS = [
+    ("image_path", sa.String(), None),
+]
+
+
+def _add_missing(table, columns):
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+    for name, type_, default in columns:
+        if name not in existing:
+            op.add_column(table, sa.Column(name, type_, server_default=default, nullable=True))
+
+
+def upgrade():
+    _add_missing("users", USER_COLUMNS)
+    _add_missing("reports", REPORT_COLUMNS)
+
+
+def downgrade():
+    with op.batch_alter_table("reports") as batch:
+        for name, _, _ in REPORT_COLUMNS:
+            batch.drop_column(name)
+    with op.batch_alter_table("users") as batch:
+        for name, _, _ in USER_COLUMNS:
+            batch.drop_column(name)
@@ -0,0 +1,30 @@
+"""Give users created before the location fields a default location (was backfill_users.py)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Default citizens to: Role=citizen, State=Maharashtra, District=Pune, Sub-District=Haveli. 0002 gives
+    # existing rows role 'citizen'; authority accounts keep their role, department and (missing) location.
+    op.execute("""
+        UPDATE users
+        SET role = coalesce(role, 'citizen'),
+            state = 'Maharashtra',
+            district = 'Pune',
+            sub_district = 'Haveli'
+        WHERE (state IS NULL OR state = '') AND (role IS NULL OR role = 'citizen')
+    """)
+
+
+def downgrade():
+    # Backfilled rows can't be told apart from users who really are in Haveli
+    pass
@@ -0,0 +1,81 @@
+"""Move comma separated report tags into tags/report_tags (was migrate_tags.py)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+
+    if "tags" not in existing:
+        op.create_table(
+            "tags",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("report_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+        op.create_index("ix_tags_id", "tags", ["id"])
+        op.create_index("ix_tags_name", "tags", ["name"], unique=True)
+        op.create_index("ix_tags_report_count", "tags", ["report_count"])
+    if "report_tags" not in existing:
+        op.create_table(
+            "report_tags",
+            sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("tag_id", sa.Integer(), sa.ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+        )
+        op.create_index("ix_report_tags_tag_id_report_id", "report_tags", ["tag_id", "report_id"])
+
+    if "tags" not in {c["name"] for c in inspector.get_columns("reports")}:
+        return
+
+    tags = sa.table("tags", sa.column("id"), sa.column("name"), sa.column("report_count"))
+    report_tags = sa.table("report_tags", sa.column("report_id"), sa.column("tag_id"))
+    tag_ids = dict(bind.execute(sa.select(tags.c.name, tags.c.id)).all())
+    linked = set(bind.execute(sa.select(report_tags.c.report_id, report_tags.c.tag_id)).all())
+    rows = bind.execute(sa.text("SELECT id, tags FROM reports WHERE tags IS NOT NULL AND tags != ''")).all()
+    for report_id, tags_str in rows:
+        names = []
+        for name in tags_str.split(","):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+        for name in names:
+            if name not in tag_ids:
+                bind.execute(tags.insert().values(name=name, report_count=0))
+                tag_ids[name] = bind.execute(sa.select(tags.c.id).where(tags.c.name == name)).scalar_one()
+            if (report_id, tag_ids[name]) not in linked:
+                bind.execute(report_tags.insert().values(report_id=report_id, tag_id=tag_ids[name]))
+                linked.add((report_id, tag_ids[name]))
+
+    op.execute("""
+        UPDATE tags
+        SET report_count = (SELECT COUNT(*) FROM report_tags WHERE report_tags.tag_id = tags.id)
+    """)
+    with op.batch_alter_table("reports") as batch:
+        batch.drop_column("tags")
+
+
+def downgrade():
+    op.add_column("reports", sa.Column("tags", sa.String()))
+    concat = "string_agg" if op.get_bind().dialect.name == "postgresql" else "group_concat"
+    op.execute(f"""
+        UPDATE reports
+        SET tags = (
+            SELECT {concat}(tags.name, ',')
+            FROM report_tags JOIN tags ON tags.id = report_tags.tag_id
+            WHERE report_tags.report_id = reports.id
+        )
+    """)
+    op.drop_table("report_tags")
+    op.drop_table("tags")
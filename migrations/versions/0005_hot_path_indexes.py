@@ -0,0 +1,36 @@
+"""Indexes for the report feed, comment loading and SOS lookups
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_users_district", "users", ["district"]),
+    ("ix_reports_created_at_id", "reports", ["created_at", "id"]),
+    ("ix_reports_votes_id", "reports", ["votes", "id"]),
+    ("ix_reports_status_created_at", "reports", ["status", "created_at"]),
+    ("ix_reports_user_id_created_at", "reports", ["user_id", "created_at"]),
+    ("ix_comments_report_id_created_at", "comments", ["report_id", "created_at", "id"]),
+    ("ix_sos_alerts_timestamp", "sos_alerts", ["timestamp"]),
+    ("ix_sos_alerts_user_id_timestamp", "sos_alerts", ["user_id", "timestamp"]),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,28 @@
+"""Per-user report votes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "report_votes" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "report_votes",
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("report_votes")
@@ -0,0 +1,39 @@
+"""Structured location on SOS alerts
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+SOS_COLUMNS = [
+    ("latitude", sa.Float()),
+    ("longitude", sa.Float()),
+    ("geohash", sa.String()),
+    ("state", sa.String()),
+    ("district", sa.String()),
+    ("sub_district", sa.String()),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {c["name"] for c in inspector.get_columns("sos_alerts")}
+    for name, type_ in SOS_COLUMNS:
+        if name not in existing:
+            op.add_column("sos_alerts", sa.Column(name, type_, nullable=True))
+    if "ix_sos_alerts_geohash_timestamp" not in {index["name"] for index in inspector.get_indexes("sos_alerts")}:
+        op.create_index("ix_sos_alerts_geohash_timestamp", "sos_alerts", ["geohash", "timestamp"])
+
+
+def downgrade():
+    op.drop_index("ix_sos_alerts_geohash_timestamp", table_name="sos_alerts")
+    with op.batch_alter_table("sos_alerts") as batch:
+        for name, _ in reversed(SOS_COLUMNS):
+            batch.drop_column(name)
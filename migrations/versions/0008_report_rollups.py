@@ -0,0 +1,87 @@
+"""Dashboard rollup tables, backfilled from existing reports
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def _backfill(bind):
+    reports = sa.table("reports", sa.column("status"), sa.column("votes"), sa.column("user_id"),
+                       sa.column("created_at", sa.DateTime()), sa.column("resolved_at", sa.DateTime()),
+                       sa.column("id"))
+    users = sa.table("users", sa.column("id"), sa.column("district"))
+    report_votes = sa.table("report_votes", sa.column("report_id"), sa.column("created_at", sa.DateTime()))
+    source = reports.outerjoin(users, users.c.id == reports.c.user_id)
+
+    by_status = defaultdict(lambda: [0, 0, 0.0])
+    by_day = defaultdict(lambda: [0, 0, 0.0, 0])
+    for status, votes, created_at, resolved_at, district in bind.execute(sa.select(
+            reports.c.status, reports.c.votes, reports.c.created_at, reports.c.resolved_at, users.c.district
+    ).select_from(source)):
+        district, status = district or "", status or "Pending"
+        seconds = 0.0
+        if status == "Resolved" and created_at and resolved_at:
+            seconds = max((resolved_at - created_at).total_seconds(), 0.0)
+            by_day[(resolved_at.date(), district)][1] += 1
+            by_day[(resolved_at.date(), district)][2] += seconds
+        by_status[(district, status)][0] += 1
+        by_status[(district, status)][1] += votes or 0
+        by_status[(district, status)][2] += seconds
+        if created_at:
+            by_day[(created_at.date(), district)][0] += 1
+    for created_at, district in bind.execute(sa.select(report_votes.c.created_at, users.c.district).select_from(
+            report_votes.join(reports, reports.c.id == report_votes.c.report_id)
+            .outerjoin(users, users.c.id == reports.c.user_id))):
+        if created_at:
+            by_day[(created_at.date(), district or "")][3] += 1
+
+    if by_status:
+        op.bulk_insert(sa.table("report_rollups", sa.column("district"), sa.column("status"), sa.column("reports"),
+                                sa.column("votes"), sa.column("resolve_seconds")), [
+            {"district": district, "status": status, "reports": count, "votes": votes, "resolve_seconds": seconds}
+            for (district, status), (count, votes, seconds) in by_status.items()])
+    if by_day:
+        op.bulk_insert(sa.table("report_daily_rollups", sa.column("day", sa.Date()), sa.column("district"),
+                                sa.column("created"), sa.column("resolved"), sa.column("resolve_seconds"),
+                                sa.column("votes")), [
+            {"day": day, "district": district, "created": created, "resolved": resolved,
+             "resolve_seconds": seconds, "votes": votes}
+            for (day, district), (created, resolved, seconds, votes) in by_day.items()])
+
+
+def upgrade():
+    if "report_rollups" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "report_rollups",
+        sa.Column("district", sa.String(), primary_key=True),
+        sa.Column("status", sa.String(), primary_key=True),
+        sa.Column("reports", sa.Integer(), nullable=False),
+        sa.Column("votes", sa.Integer(), nullable=False),
+        sa.Column("resolve_seconds", sa.Float(), nullable=False),
+    )
+    op.create_table(
+        "report_daily_rollups",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("district", sa.String(), primary_key=True),
+        sa.Column("created", sa.Integer(), nullable=False),
+        sa.Column("resolved", sa.Integer(), nullable=False),
+        sa.Column("resolve_seconds", sa.Float(), nullable=False),
+        sa.Column("votes", sa.Integer(), nullable=False),
+    )
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    op.drop_table("report_daily_rollups")
+    op.drop_table("report_rollups")
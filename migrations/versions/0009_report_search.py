@@ -0,0 +1,144 @@
+"""Full-text search index over reports and comments, kept in sync by triggers
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+# search.py's statements as of this revision, frozen so later edits there don't change this migration
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS report_search USING fts5("
+    "title, description, location, comments, tokenize = 'porter unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_insert AFTER INSERT ON reports BEGIN
+        INSERT INTO report_search (rowid, title, description, location, comments)
+        VALUES (new.id, new.title, new.description, new.location, '');
+    END""",
+    # Vote and status updates don't name these columns, so they don't rewrite the index
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_update AFTER UPDATE OF title, description, location
+    ON reports BEGIN
+        UPDATE report_search SET title = new.title, description = new.description, location = new.location
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_delete AFTER DELETE ON reports BEGIN
+        DELETE FROM report_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_insert AFTER INSERT ON comments BEGIN
+        UPDATE report_search SET comments = ltrim(comments || ' ' || coalesce(new.text, ''))
+        WHERE rowid = new.report_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_update AFTER UPDATE OF text, report_id ON comments BEGIN
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = old.report_id), '')
+        WHERE rowid = old.report_id;
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = new.report_id), '')
+        WHERE rowid = new.report_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_delete AFTER DELETE ON comments BEGIN
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = old.report_id), '')
+        WHERE rowid = old.report_id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM report_search",
+    """INSERT INTO report_search (rowid, title, description, location, comments)
+    SELECT r.id, r.title, r.description, r.location,
+           coalesce((SELECT group_concat(c.text, ' ') FROM comments c WHERE c.report_id = r.id), '')
+    FROM reports r""",
+    "INSERT INTO report_search (report_search) VALUES ('optimize')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS report_search_report_insert",
+    "DROP TRIGGER IF EXISTS report_search_report_update",
+    "DROP TRIGGER IF EXISTS report_search_report_delete",
+    "DROP TRIGGER IF EXISTS report_search_comment_insert",
+    "DROP TRIGGER IF EXISTS report_search_comment_update",
+    "DROP TRIGGER IF EXISTS report_search_comment_delete",
+    "DROP TABLE IF EXISTS report_search",
+]
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS report_search (
+        report_id INTEGER PRIMARY KEY REFERENCES reports (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_report_search_document ON report_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION report_search_refresh(target INTEGER) RETURNS void AS $$
+    BEGIN
+        INSERT INTO report_search (report_id, document)
+        SELECT r.id,
+               setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+               setweight(to_tsvector('english', coalesce(r.location, '')), 'B') ||
+               setweight(to_tsvector('english', coalesce(r.description, '')), 'C') ||
+               setweight(to_tsvector('english', coalesce(
+                   (SELECT string_agg(c.text, ' ') FROM comments c WHERE c.report_id = r.id), '')), 'D')
+        FROM reports r WHERE r.id = target
+        ON CONFLICT (report_id) DO UPDATE SET document = excluded.document;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION report_search_report_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM report_search_refresh(NEW.id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION report_search_comment_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM report_search_refresh(OLD.report_id);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM report_search_refresh(NEW.report_id);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS report_search_report ON reports",
+    """CREATE TRIGGER report_search_report AFTER INSERT OR UPDATE OF title, description, location ON reports
+    FOR EACH ROW EXECUTE FUNCTION report_search_report_changed()""",
+    "DROP TRIGGER IF EXISTS report_search_comment ON comments",
+    """CREATE TRIGGER report_search_comment AFTER INSERT OR DELETE OR UPDATE OF text, report_id ON comments
+    FOR EACH ROW EXECUTE FUNCTION report_search_comment_changed()""",
+]
+
+POSTGRES_REBUILD = [
+    "TRUNCATE report_search",
+    "SELECT report_search_refresh(id) FROM reports",
+]
+
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS report_search_comment ON comments",
+    "DROP TRIGGER IF EXISTS report_search_report ON reports",
+    "DROP FUNCTION IF EXISTS report_search_comment_changed()",
+    "DROP FUNCTION IF EXISTS report_search_report_changed()",
+    "DROP FUNCTION IF EXISTS report_search_refresh(INTEGER)",
+    "DROP TABLE IF EXISTS report_search",
+]
+
+
+def _run(statements):
+    # Raw driver SQL, as search.py runs it: the trigger bodies aren't bind-parameter text
+    bind = op.get_bind()
+    for statement in statements:
+        bind.exec_driver_sql(statement)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if "report_search" in sa.inspect(bind).get_table_names():
+        return
+    postgres = bind.dialect.name == "postgresql"
+    _run(POSTGRES_DDL if postgres else SQLITE_DDL)
+    # The triggers only see rows written from now on; index what is already there
+    _run(POSTGRES_REBUILD if postgres else SQLITE_REBUILD)
+
+
+def downgrade():
+    _run(POSTGRES_DROP if op.get_bind().dialect.name == "postgresql" else SQLITE_DROP)
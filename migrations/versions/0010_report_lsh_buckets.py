@@ -0,0 +1,101 @@
+"""LSH buckets for near-duplicate report detection, filled for recent open reports
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+import datetime
+import hashlib
+import re
+import zlib
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+# duplicates.py's bucket keys as of this revision, frozen so later edits there don't change this migration.
+# If they change there, the module's rebuild() re-indexes; this backfill stays as it was.
+WINDOW_DAYS = 30
+BANDS = 20
+TEXT_ROWS = 3
+LOCATION_ROWS = 2
+SHINGLE_SIZE = 4
+RESOLVED = "Resolved"
+STOP_WORDS = frozenset("""a an and are at by for from has have in is it near of on or the there this to very
+was with""".split())
+_PRIME = 4294967311
+_rng = np.random.default_rng(20261018)
+_A = _rng.integers(1, 2**32, size=BANDS * (TEXT_ROWS + LOCATION_ROWS), dtype=np.uint64)
+_B = _rng.integers(0, 2**32, size=BANDS * (TEXT_ROWS + LOCATION_ROWS), dtype=np.uint64)
+_TEXT_HASHES = slice(0, BANDS * TEXT_ROWS)
+_LOCATION_HASHES = slice(BANDS * TEXT_ROWS, None)
+
+
+def _shingles(text):
+    found = [word for word in re.findall(r"[^\W_]+", (text or "").lower()) if word not in STOP_WORDS]
+    pieces = set()
+    for word in (word[:-1] if len(word) > 3 and word.endswith("s") else word for word in found):
+        padded = f" {word} "
+        pieces.update(padded[i:i + SHINGLE_SIZE] for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1)))
+    return pieces
+
+
+def _signature(features, hashes):
+    values = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint64, count=len(features))
+    if not len(values):
+        return np.zeros(len(_A[hashes]), dtype=np.uint64)
+    return ((_A[hashes, None] * values[None, :] + _B[hashes, None]) % _PRIME).min(axis=1)
+
+
+def _bucket_keys(title, description, location):
+    text = _shingles(f"{title or ''} {description or ''}")
+    if not text:
+        return []
+    text_bands = _signature(text, _TEXT_HASHES).reshape(BANDS, TEXT_ROWS)
+    location_bands = _signature(_shingles(location), _LOCATION_HASHES).reshape(BANDS, LOCATION_ROWS)
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(text_bands[band].tobytes() + location_bands[band].tobytes(), digest_size=8,
+                                 person=band.to_bytes(2, "big")).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def _backfill(bind):
+    reports = sa.table("reports", sa.column("id"), sa.column("title"), sa.column("description"),
+                       sa.column("location"), sa.column("status"), sa.column("created_at", sa.DateTime()))
+    buckets = sa.table("report_lsh_buckets", sa.column("bucket"), sa.column("report_id"))
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=WINDOW_DAYS)
+    rows = bind.execute(sa.select(reports.c.id, reports.c.title, reports.c.description, reports.c.location)
+                        .where(reports.c.created_at >= since,
+                               sa.or_(reports.c.status.is_(None), reports.c.status != RESOLVED))).all()
+    batch = []
+    for row in rows:
+        batch += [{"bucket": key, "report_id": row.id}
+                  for key in set(_bucket_keys(row.title, row.description, row.location))]
+        if len(batch) >= 10000:
+            bind.execute(sa.insert(buckets), batch)
+            batch = []
+    if batch:
+        bind.execute(sa.insert(buckets), batch)
+
+
+def upgrade():
+    if "report_lsh_buckets" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "report_lsh_buckets",
+        sa.Column("bucket", sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column("report_id", sa.Integer(), sa.ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True),
+    )
+    # In Alembic's transaction: committed with the revision, not before it
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    op.drop_table("report_lsh_buckets")
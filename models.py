@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import event, BigInteger, Column, Integer, Float, String, ForeignKey, Date, DateTime, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
+import search
 import datetime
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_district", "district"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
@@ -22,15 +26,39 @@ class User(Base):
     reports = relationship("Report", back_populates="owner")
     sos_alerts = relationship("SOSAlert", back_populates="owner")
 
+report_tags = Table(
+    "report_tags",
+    Base.metadata,
+    Column("report_id", Integer, ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # The primary key serves report -> tags; this one serves "reports tagged X"
+    Index("ix_report_tags_tag_id_report_id", "tag_id", "report_id"),
+)
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    report_count = Column(Integer, default=0, nullable=False, index=True)
+
+    reports = relationship("Report", secondary=report_tags, back_populates="tags")
+
 class Report(Base):
     __tablename__ = "reports"
+    # Match the feed's keyset orderings and filters (see feed.feed_query)
+    __table_args__ = (
+        Index("ix_reports_created_at_id", "created_at", "id"),
+        Index("ix_reports_votes_id", "votes", "id"),
+        Index("ix_reports_status_created_at", "status", "created_at"),
+        Index("ix_reports_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     description = Column(String)
     location = Column(String)
     image_path = Column(String, nullable=True)
-    tags = Column(String) # Comma separated tags
     status = Column(String, default="Pending")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -44,9 +72,13 @@ class Report(Base):
 
     owner = relationship("User", back_populates="reports")
     comments = relationship("Comment", back_populates="report")
+    tags = relationship("Tag", secondary=report_tags, back_populates="reports", order_by="Tag.id")
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_report_id_created_at", "report_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String)
@@ -57,12 +89,69 @@ class Comment(Base):
     owner = relationship("User")
     report = relationship("Report", back_populates="comments")
 
+class ReportVote(Base):
+    """One row per user per report voted on; the primary key is what rejects a second vote."""
+    __tablename__ = "report_votes"
+
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class SOSAlert(Base):
     __tablename__ = "sos_alerts"
+    __table_args__ = (
+        Index("ix_sos_alerts_timestamp", "timestamp"),
+        Index("ix_sos_alerts_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_sos_alerts_geohash_timestamp", "geohash", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     location = Column(String)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
 
+    # Where the alert was raised, as used to route it (see sos_dispatch.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True)
+    state = Column(String, nullable=True)
+    district = Column(String, nullable=True)
+    sub_district = Column(String, nullable=True)
+
     owner = relationship("User", back_populates="sos_alerts")
+
+# Dashboard rollups, kept up to date by rollups.py in the same transactions that create, resolve and vote on
+# reports. district is the report owner's district, "" when they have none.
+
+class ReportRollup(Base):
+    """Reports and their votes per district and status."""
+    __tablename__ = "report_rollups"
+
+    district = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    reports = Column(Integer, default=0, nullable=False)
+    votes = Column(Integer, default=0, nullable=False)
+    # Sum of resolved_at - created_at over the reports counted here, for mean time to resolve
+    resolve_seconds = Column(Float, default=0, nullable=False)
+
+class DailyReportRollup(Base):
+    """Reports created and resolved, and votes cast, per UTC day and district."""
+    __tablename__ = "report_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    district = Column(String, primary_key=True)
+    created = Column(Integer, default=0, nullable=False)
+    resolved = Column(Integer, default=0, nullable=False)
+    resolve_seconds = Column(Float, default=0, nullable=False)
+    votes = Column(Integer, default=0, nullable=False)
+
+class ReportLSHBucket(Base):
+    """LSH buckets of the MinHash signatures of recent open reports, for duplicate detection (see duplicates.py)."""
+    __tablename__ = "report_lsh_buckets"
+
+    bucket = Column(BigInteger, primary_key=True, autoincrement=False)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True)
+
+# The full-text index isn't mapped (an FTS5 virtual table on SQLite); build it with the rest of the schema
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: search.create(connection))
+event.listen(Base.metadata, "before_drop", lambda target, connection, **kw: search.drop(connection))
@@ -0,0 +1,126 @@
+import asyncio
+import calendar
+import os
+import time
+
+import feedparser
+import httpx
+
+DEFAULT_NEWS_FEED = "https://news.google.com/rss/search?q=India+Civic+Rights&hl=en-IN&gl=IN&ceid=IN:en"
+# Whitespace-separated RSS/Atom URLs, merged newest first; empty disables the news feed
+NEWS_FEEDS = os.getenv("NEWS_FEEDS", DEFAULT_NEWS_FEED).split()
+NEWS_REFRESH_SECONDS = float(os.getenv("NEWS_REFRESH_SECONDS", "600"))
+NEWS_FETCH_TIMEOUT_SECONDS = float(os.getenv("NEWS_FETCH_TIMEOUT_SECONDS", "10"))
+NEWS_LIMIT = int(os.getenv("NEWS_LIMIT", "10"))
+
+def serialize_entry(entry):
+    return {
+        "title": entry.get("title"),
+        "link": entry.get("link"),
+        "published": entry.get("published"),
+        "source": entry.source.title if "source" in entry and "title" in entry.source else "Google News",
+    }
+
+def _published_at(entry):
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(parsed) if parsed else 0
+
+def parse_articles(content):
+    """(published timestamp, article) pairs from RSS/Atom bytes."""
+    return [(_published_at(entry), serialize_entry(entry)) for entry in feedparser.parse(content).entries]
+
+class FeedState:
+    """What we last got from one feed, and the validators to ask whether it has changed since."""
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.articles = []
+        self.fetched_at = None  # last 200 or 304
+        self.not_modified = 0
+        self.error = None
+
+class NewsCache:
+    """News articles held in memory and refreshed in the background.
+
+    Requests only read the merged list; run() re-fetches every feed each `refresh_seconds` with
+    If-None-Match/If-Modified-Since, so an unchanged feed costs a 304 and no parsing. A feed that fails
+    keeps serving its last good articles (stale-while-revalidate) until a later refresh succeeds.
+    """
+
+    def __init__(self, feeds=None, refresh_seconds=NEWS_REFRESH_SECONDS, limit=NEWS_LIMIT,
+                 timeout=NEWS_FETCH_TIMEOUT_SECONDS, transport=None):
+        self.feeds = [FeedState(url) for url in (NEWS_FEEDS if feeds is None else feeds)]
+        self.refresh_seconds = refresh_seconds
+        self.limit = limit
+        self.timeout = timeout
+        self.transport = transport
+        self.refreshes = 0
+        self._articles = []
+
+    def articles(self):
+        return self._articles
+
+    async def _fetch(self, client, feed):
+        headers = {}
+        if feed.etag:
+            headers["If-None-Match"] = feed.etag
+        if feed.last_modified:
+            headers["If-Modified-Since"] = feed.last_modified
+        try:
+            response = await client.get(feed.url, headers=headers)
+            if response.status_code == 304:
+                feed.not_modified += 1
+            else:
+                response.raise_for_status()
+                # feedparser is pure Python; keep parsing off the event loop
+                feed.articles = await asyncio.to_thread(parse_articles, response.content)
+                feed.etag = response.headers.get("etag")
+                feed.last_modified = response.headers.get("last-modified")
+            feed.fetched_at = time.time()
+            feed.error = None
+        except Exception as e:
+            # Anything (a bad URL, a parser bug) only costs this feed this refresh
+            feed.error = str(e) or type(e).__name__
+            print(f"Error refreshing news feed {feed.url}: {feed.error}")
+
+    async def refresh(self):
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, transport=self.transport) as client:
+            await asyncio.gather(*(self._fetch(client, feed) for feed in self.feeds))
+        merged, seen = [], set()
+        for published, article in sorted((pair for feed in self.feeds for pair in feed.articles),
+                                         key=lambda pair: pair[0], reverse=True):
+            if article["link"] not in seen:
+                seen.add(article["link"])
+                merged.append(article)
+        # Swapped in whole, so readers never see a half-built list
+        self._articles = merged[:self.limit]
+        self.refreshes += 1
+
+    async def run(self):
+        if not self.feeds:
+            return
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep refreshing; the last good articles are served meanwhile
+                print(f"Error refreshing news: {e!r}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def stats(self):
+        return {
+            "articles": len(self._articles),
+            "refreshes": self.refreshes,
+            "refresh_seconds": self.refresh_seconds,
+            "feeds": [{
+                "url": feed.url,
+                "articles": len(feed.articles),
+                "fetched_at": feed.fetched_at,
+                "not_modified": feed.not_modified,
+                "error": feed.error,
+            } for feed in self.feeds],
+        }
+
+cache = NewsCache()
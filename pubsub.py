@@ -0,0 +1,187 @@
+"""Topic publish/subscribe for pushing updates to connected clients.
+
+Broker fans messages out to the subscriptions in this process. With PUBSUB_URL pointing at a Redis (or
+Redis-compatible) server, RedisBroker sends every message through one Redis channel instead and each worker
+delivers what it receives to its own subscribers, so a client sees updates made through any worker. That
+needs the optional `redis` package: pip install -r requirements-redis.txt
+
+Each subscription has a bounded queue. A client that falls PUBSUB_QUEUE_SIZE messages behind has its backlog
+dropped and gets a single {"type": "resync"} message in its place: it should reload what it shows rather
+than apply a partial stream of deltas.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", "")
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "256"))
+PUBSUB_CHANNEL = os.getenv("PUBSUB_CHANNEL", "citizen:updates")
+
+RESYNC = json.dumps({"type": "resync"})
+
+class Subscription:
+    def __init__(self, topics, queue_size=PUBSUB_QUEUE_SIZE):
+        self.topics = frozenset(topics)
+        self.queue = asyncio.Queue(queue_size)
+        self.overflows = 0
+
+    def offer(self, message):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.overflows += 1
+            return False
+        self.queue.put_nowait(message)
+        return True
+
+    async def get(self):
+        return await self.queue.get()
+
+class Broker:
+    """In-process broker. Subscriptions belong to the event loop; publish() may be called from any thread."""
+
+    def __init__(self, queue_size=PUBSUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.loop = None
+        self._topics = defaultdict(set)  # topic -> subscriptions
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self.loop = None
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics, self.queue_size)
+        for topic in subscription.topics:
+            self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def subscriptions(self):
+        return len(set().union(*self._topics.values())) if self._topics else 0
+
+    def publish(self, topics, event):
+        """Send `event` (JSON-serializable) to every subscriber of any of `topics`."""
+        self.published += 1
+        self._call(self._send, list(topics), json.dumps(event, default=str))
+
+    def _call(self, fn, *args):
+        # Sync endpoints publish from the threadpool; subscriptions are only touched on the loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is None or running is self.loop:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _send(self, topics, message):
+        self._deliver(topics, message)
+
+    def _deliver(self, topics, message):
+        # Serialized once; a subscriber to several of the topics gets it once
+        subscribers = set().union(*(self._topics.get(topic, ()) for topic in topics))
+        for subscription in subscribers:
+            if not subscription.offer(message):
+                self.overflows += 1
+        self.delivered += len(subscribers)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "topics": len(self._topics),
+            "subscriptions": self.subscriptions(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+class RedisBroker(Broker):
+    """Broker whose messages go through a Redis channel, so every worker's subscribers get them.
+
+    Needs the optional `redis` package. Publishing never waits on Redis: messages go to an outbox drained by
+    one task, which drops new messages (counted in stats) if Redis falls behind by a whole queue.
+    """
+
+    def __init__(self, url, queue_size=PUBSUB_QUEUE_SIZE, channel=PUBSUB_CHANNEL):
+        super().__init__(queue_size)
+        self.url = url
+        self.channel = channel
+        self.dropped = 0
+        self._redis = None
+        self._pubsub = None
+        self._outbox = None
+        self._tasks = []
+
+    async def start(self):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("PUBSUB_URL is set but the redis package isn't installed; "
+                               "pip install -r requirements-redis.txt") from e
+
+        await super().start()
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._outbox = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._forward()), asyncio.create_task(self._receive())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+        await super().stop()
+
+    def _send(self, topics, message):
+        if self._outbox is None:
+            return
+        # "topic\ttopic\n" + message; topics are plain names without tabs or newlines
+        payload = "\t".join(topics) + "\n" + message
+        if self._outbox.full():
+            self.dropped += 1
+            return
+        self._outbox.put_nowait(payload)
+
+    async def _forward(self):
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await self._redis.publish(self.channel, payload)
+            except Exception as e:
+                print(f"Error publishing to {self.channel}: {e}")
+
+    async def _receive(self):
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    header, message = item["data"].decode().split("\n", 1)
+                    self._deliver(header.split("\t"), message)
+            except Exception as e:
+                print(f"Error receiving from {self.channel}: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self):
+        return dict(super().stats(), backend="redis", dropped=self.dropped)
+
+def create_broker(url=PUBSUB_URL):
+    return RedisBroker(url) if url else Broker()
+
+broker = create_broker()
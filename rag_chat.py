@@ -1,15 +1,29 @@
+import asyncio
 import os
+import threading
+import time
+import weakref
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
 import google.generativeai as genai
 from typing import List
 from langchain.embeddings import Embeddings
+from answer_cache import AnswerCache
+from bm25_index import BM25Index, query_sections
+from vector_index import LegacyIndexError, load_vectorstore
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 genai.configure(api_key=GOOGLE_API_KEY)
 
+INDEX_PATH = "faiss_index"
+CHAT_MODEL = "gemini-2.5-flash"
+# Upper bound on concurrent upstream Gemini calls per worker, and per-request deadline
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "30"))
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
 class GeminiEmbeddings(Embeddings):
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embeddings = []
@@ -30,34 +44,351 @@ class GeminiEmbeddings(Embeddings):
         )
         return result['embedding']
 
-def get_answer(query: str):
-    if not os.path.exists("faiss_index"):
-        return "System not initialized. Please run ingestion first."
-    
-    embeddings = GeminiEmbeddings()
-    vectorstore = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-    
-    # Retrieve relevant docs
-    docs = vectorstore.similarity_search(query, k=3)
-    context = "\n\n".join([doc.page_content for doc in docs])
-    
-    # Generate answer using Gemini
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    prompt = f"""You are a helpful Civic Assistant. Use the following context from the Indian Constitution to answer the user's question.
-    
+    async def aembed_query(self, text: str) -> List[float]:
+        result = await genai.embed_content_async(
+            model="models/text-embedding-004",
+            content=text,
+            task_type="retrieval_query",
+        )
+        return result['embedding']
+
+def source_filter(sources):
+    """FAISS metadata filter limiting retrieval to the given documents (by source path or file name)."""
+    if not sources:
+        return None
+    sources = set(sources)
+    return lambda metadata: metadata.get("source") in sources or metadata.get("document") in sources
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(doc.id, doc)
+    return [docs[doc_id] for doc_id in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+class RAGEngine:
+    """Keeps the vector store and Gemini clients in memory for the life of the process.
+
+    The index is loaded once (at app startup) and can be swapped for a freshly
+    ingested one with `reload()`; in-flight queries keep using the store they
+    started with.
+    """
+
+    def __init__(self, index_path=INDEX_PATH, embeddings=None, model=None, max_concurrency=CHAT_MAX_CONCURRENCY,
+                 cache=None):
+        self.index_path = index_path
+        self.max_concurrency = max_concurrency
+        self.embeddings = embeddings or GeminiEmbeddings()
+        self.model = model or genai.GenerativeModel(CHAT_MODEL)
+        self.cache = cache if cache is not None else AnswerCache()
+        self._snapshot = (None, None)  # (vectorstore, BM25 index), swapped together
+        self.index_kind = None
+        self._lock = threading.Lock()
+        self._limiters = weakref.WeakKeyDictionary()
+        self.load_seconds = None
+        self.loaded_at = None
+        self.queries = 0
+        self.total_query_seconds = 0.0
+        self.last_query_seconds = None
+        self.fast_path_queries = 0
+
+    @property
+    def vectorstore(self):
+        return self._snapshot[0]
+
+    @property
+    def ready(self):
+        return self.vectorstore is not None
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            print(f"Vector store '{self.index_path}' not found. Run ingestion first.")
+            if self.ready:
+                # Ingestion removed the index (nothing left to search); stop serving the old one
+                with self._lock:
+                    self._snapshot = (None, None)
+                    self.index_kind = None
+                self.cache.clear()
+            return False
+
+        start = time.perf_counter()
+        try:
+            vectorstore, kind, _ = load_vectorstore(self.index_path, self.embeddings)
+            lexical = BM25Index.load(self.index_path)
+        except LegacyIndexError as e:
+            print(e)
+            return False
+        elapsed = time.perf_counter() - start
+
+        # Swap only once the new store is fully loaded
+        with self._lock:
+            self._snapshot = (vectorstore, lexical)
+            self.index_kind = kind
+            self.load_seconds = elapsed
+            self.loaded_at = time.time()
+        # Answers from the previous index may no longer be grounded in the corpus
+        self.cache.clear()
+        print(f"Loaded vector store '{self.index_path}' ({vectorstore.index.ntotal} vectors) in {elapsed:.2f}s")
+        return True
+
+    def reload(self):
+        return self.load()
+
+    def _section_docs(self, snapshot, query: str, k: int, sources=None):
+        """Article/schedule fast path: chunks headed by a section the query names, found without embedding."""
+        vectorstore, lexical = snapshot
+        if lexical is None:
+            return None
+        rows = lexical.section_rows(query_sections(query))
+        if sources:
+            allowed = vectorstore.docstore.rows_matching(source_filter(sources))
+            rows = [row for row in rows if row in allowed]
+        if not rows:
+            return None
+        ranked = [row for row, _ in lexical.search(query, k, allowed=set(rows))]
+        ranked += [row for row in rows if row not in ranked]
+        return [vectorstore.docstore.document(row) for row in ranked[:k]]
+
+    def _hybrid_docs(self, snapshot, query: str, embedding, k: int, sources=None):
+        """Vector search fused with BM25 by reciprocal rank; CPU bound."""
+        vectorstore, lexical = snapshot
+        if lexical is None:
+            return vectorstore.similarity_search_by_vector(embedding, k, filter=source_filter(sources))
+        fetch_k = max(4 * k, 10)
+        vector_docs = vectorstore.similarity_search_by_vector(embedding, fetch_k, filter=source_filter(sources))
+        allowed = vectorstore.docstore.rows_matching(source_filter(sources)) if sources else None
+        lexical_docs = [vectorstore.docstore.document(row) for row, _ in lexical.search(query, fetch_k, allowed)]
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k)
+
+    def retrieve(self, query: str, k: int = 3, sources=None):
+        snapshot = self._snapshot
+        docs = self._section_docs(snapshot, query, k, sources)
+        if docs is None:
+            docs = self._hybrid_docs(snapshot, query, self.embeddings.embed_query(query), k, sources)
+        return docs
+
+    def _prepare(self, query: str, k: int = 3, sources=None):
+        """Return (cached value, docs, query embedding) for a question.
+
+        Exact cache hits and article/schedule lookups never embed the query.
+        Filtered questions bypass the cache, which is keyed on the whole corpus.
+        """
+        snapshot = self._snapshot
+        cached = self.cache.get_exact(query) if not sources else None
+        if cached is not None:
+            return cached, None, None
+        docs = self._section_docs(snapshot, query, k, sources)
+        if docs is not None:
+            self._record_fast_path(sources)
+            return None, docs, None
+        embedding = self.embeddings.embed_query(query)
+        cached = self.cache.get_similar(embedding) if not sources else None
+        if cached is not None:
+            return cached, None, embedding
+        return None, self._hybrid_docs(snapshot, query, embedding, k, sources), embedding
+
+    def build_prompt(self, query: str, docs):
+        context = "\n\n".join([doc.page_content for doc in docs])
+        return f"""You are a helpful Civic Assistant. Use the following context from the Indian Constitution to answer the user's question.
+
 Context:
 {context}
 
 Question: {query}
 
 Answer:"""
-    
-    response = model.generate_content(prompt)
-    return response.text
 
-def chat_with_rag(query: str):
+    def answer(self, query: str, sources=None):
+        if not self.ready and not self.load():
+            return "System not initialized. Please run ingestion first."
+
+        start = time.perf_counter()
+        # Read before the snapshot: an answer from an index that reload() replaced is not cached
+        generation = self.cache.generation
+        cached, docs, embedding = self._prepare(query, sources=sources)
+        if cached is not None:
+            return cached["answer"]
+
+        response = self.model.generate_content(self.build_prompt(query, docs))
+        self._record_query(time.perf_counter() - start)
+        if not sources:
+            self._cache_answer(query, embedding, docs, response.text, generation)
+        return response.text
+
+    def _cache_answer(self, query, embedding, docs, answer, generation):
+        self.cache.put(query, embedding, {"answer": answer, "sources": [self._source(doc) for doc in docs]},
+                       generation)
+
+    def _limiter(self):
+        # asyncio primitives belong to one event loop, so keep a semaphore per loop
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = self._limiters[loop] = asyncio.Semaphore(self.max_concurrency)
+        return limiter
+
+    async def _agenerate(self, prompt: str):
+        async with self._limiter():
+            if hasattr(self.model, "generate_content_async"):
+                return await self.model.generate_content_async(prompt)
+            return await asyncio.to_thread(self.model.generate_content, prompt)
+
+    async def _aembed_query(self, query: str):
+        async with self._limiter():
+            return await self.embeddings.aembed_query(query)
+
+    async def aretrieve(self, query: str, k: int = 3, sources=None):
+        snapshot = self._snapshot
+        docs = self._section_docs(snapshot, query, k, sources)
+        if docs is None:
+            embedding = await self._aembed_query(query)
+            # FAISS search is CPU bound; keep it off the event loop
+            docs = await asyncio.to_thread(self._hybrid_docs, snapshot, query, embedding, k, sources)
+        return docs
+
+    async def _aprepare(self, query: str, k: int = 3, sources=None):
+        """Async counterpart of _prepare."""
+        snapshot = self._snapshot
+        cached = self.cache.get_exact(query) if not sources else None
+        if cached is not None:
+            return cached, None, None
+        docs = self._section_docs(snapshot, query, k, sources)
+        if docs is not None:
+            self._record_fast_path(sources)
+            return None, docs, None
+        embedding = await self._aembed_query(query)
+        cached = self.cache.get_similar(embedding) if not sources else None
+        if cached is not None:
+            return cached, None, embedding
+        docs = await asyncio.to_thread(self._hybrid_docs, snapshot, query, embedding, k, sources)
+        return None, docs, embedding
+
+    async def aanswer(self, query: str, sources=None):
+        if not self.ready and not await asyncio.to_thread(self.load):
+            return "System not initialized. Please run ingestion first."
+
+        start = time.perf_counter()
+        generation = self.cache.generation
+        cached, docs, embedding = await self._aprepare(query, sources=sources)
+        if cached is not None:
+            return cached["answer"]
+
+        response = await self._agenerate(self.build_prompt(query, docs))
+        self._record_query(time.perf_counter() - start)
+        if not sources:
+            self._cache_answer(query, embedding, docs, response.text, generation)
+        return response.text
+
+    async def astream(self, query: str, k: int = 3, sources=None):
+        """Yield (event, data) pairs: the retrieved context first, then answer tokens."""
+        if not self.ready and not await asyncio.to_thread(self.load):
+            yield "error", {"message": "System not initialized. Please run ingestion first."}
+            return
+
+        start = time.perf_counter()
+        generation = self.cache.generation
+        cached, docs, embedding = await self._aprepare(query, k, sources)
+        if cached is not None:
+            yield "context", {"sources": cached["sources"], "cached": True}
+            yield "token", {"text": cached["answer"]}
+            yield "done", {}
+            return
+
+        yield "context", {"sources": [self._source(doc) for doc in docs]}
+
+        prompt = self.build_prompt(query, docs)
+        parts = []
+        async with self._limiter():
+            if hasattr(self.model, "generate_content_async"):
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    text = self._chunk_text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield "token", {"text": text}
+            else:
+                response = await asyncio.to_thread(self.model.generate_content, prompt)
+                parts.append(response.text)
+                yield "token", {"text": response.text}
+        self._record_query(time.perf_counter() - start)
+        if not sources:
+            self._cache_answer(query, embedding, docs, "".join(parts), generation)
+        yield "done", {}
+
+    @staticmethod
+    def _source(doc):
+        return {"content": doc.page_content[:300], "metadata": doc.metadata}
+
+    @staticmethod
+    def _chunk_text(chunk):
+        # Chunks without text parts (e.g. a trailing safety verdict) raise on .text
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    def _record_fast_path(self, sources):
+        with self._lock:
+            self.fast_path_queries += 1
+        if not sources:
+            self.cache.record_miss()
+
+    def _record_query(self, elapsed):
+        with self._lock:
+            self.queries += 1
+            self.total_query_seconds += elapsed
+            self.last_query_seconds = elapsed
+
+    def stats(self):
+        vectorstore, lexical = self._snapshot
+        return {
+            "ready": vectorstore is not None,
+            "index_path": self.index_path,
+            "index_kind": self.index_kind,
+            "index_size": vectorstore.index.ntotal if vectorstore is not None else 0,
+            "hybrid": lexical is not None,
+            "fast_path_queries": self.fast_path_queries,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "queries": self.queries,
+            "avg_query_seconds": self.total_query_seconds / self.queries if self.queries else None,
+            "last_query_seconds": self.last_query_seconds,
+            "cache": self.cache.stats(),
+        }
+
+engine = RAGEngine()
+
+def get_answer(query: str, sources=None):
+    return engine.answer(query, sources)
+
+def chat_with_rag(query: str, sources=None):
     try:
-        return get_answer(query)
+        return get_answer(query, sources)
     except Exception as e:
         return f"Error: {str(e)}"
+
+async def achat_with_rag(query: str, sources=None, timeout: float = CHAT_TIMEOUT_SECONDS):
+    try:
+        return await asyncio.wait_for(engine.aanswer(query, sources), timeout)
+    except asyncio.TimeoutError:
+        return "Error: The assistant took too long to respond. Please try again."
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+async def stream_chat(query: str, sources=None, timeout: float = CHAT_TIMEOUT_SECONDS):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    events = engine.astream(query, sources=sources)
+    try:
+        while True:
+            yield await asyncio.wait_for(events.__anext__(), max(deadline - loop.time(), 0))
+    except StopAsyncIteration:
+        pass
+    except asyncio.TimeoutError:
+        yield "error", {"message": "The assistant took too long to respond. Please try again."}
+    except Exception as e:
+        yield "error", {"message": str(e)}
+    finally:
+        await events.aclose()
@@ -1,11 +1,29 @@
+import hashlib
 import os
+import random
+import shutil
+import threading
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from google.api_core import exceptions as google_exceptions
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 import google.generativeai as genai
 from typing import List
 from langchain.embeddings import Embeddings
+from bm25_index import BM25Index
+from chunk_store import CHUNK_STORE_PATH, ChunkStore
+from vector_index import (
+    REMOVABLE_KINDS,
+    VECTOR_INDEX_KIND,
+    LegacyIndexError,
+    build_vectorstore,
+    load_vectorstore,
+    save_vectorstore,
+)
 
 load_dotenv()
 
@@ -16,50 +34,354 @@ if not GOOGLE_API_KEY:
 
 genai.configure(api_key=GOOGLE_API_KEY)
 
+EMBEDDING_MODEL = "models/text-embedding-004"
+# The embedding endpoint accepts at most 100 texts per request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# PDF pages are parsed in a process pool, PAGES_PER_TASK pages per task
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = 8
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+
+def gemini_embed_batch(texts: List[str]) -> List[List[float]]:
+    result = genai.embed_content(
+        model=EMBEDDING_MODEL,
+        content=texts,
+        task_type="retrieval_document",
+    )
+    return result['embedding']
+
+def content_key(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class BatchEmbedder:
+    """Embeds texts in batches on a small thread pool, with backoff on rate limits.
+
+    All workers pause together after a rate-limit error instead of each one
+    hammering the API with its own retries.
+    """
+
+    def __init__(self, embed_fn=gemini_embed_batch, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY,
+                 max_retries=EMBED_MAX_RETRIES, backoff_seconds=1.0, checkpoint=None):
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.checkpoint = checkpoint
+        self._pause_until = 0.0
+        self._pause_lock = threading.Lock()
+        self.stats = {}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        keys = [content_key(text) for text in texts]
+        done = self.checkpoint.get_many(keys) if self.checkpoint is not None else {}
+        resumed = len(done)
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in done:
+                pending.setdefault(key, text)
+        pending_items = list(pending.items())
+        batches = [pending_items[i:i + self.batch_size] for i in range(0, len(pending_items), self.batch_size)]
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(self._embed_batch, batch) for batch in batches]
+                for i, future in enumerate(as_completed(futures), 1):
+                    results = future.result()
+                    if self.checkpoint is not None:
+                        self.checkpoint.put_many(results)
+                    done.update(results)
+                    print(f"Embedded batch {i}/{len(batches)}")
+
+        elapsed = time.perf_counter() - start
+        embedded = len(pending_items)
+        self.stats = {
+            "chunks": len(texts),
+            "embedded": embedded,
+            "resumed": resumed,
+            "batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_sec": embedded / elapsed if elapsed > 0 else None,
+        }
+        return [done[key] for key in keys]
+
+    def _embed_batch(self, batch):
+        texts = [text for _, text in batch]
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            try:
+                embeddings = self.embed_fn(texts)
+                return [(key, list(embedding)) for (key, _), embedding in zip(batch, embeddings)]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                print(f"Embedding request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                if isinstance(e, RATE_LIMIT_ERRORS):
+                    self._pause(delay)
+                else:
+                    time.sleep(delay)
+
+    def _pause(self, delay):
+        with self._pause_lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+
+    def _wait_for_pause(self):
+        remaining = self._pause_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
 class GeminiEmbeddings(Embeddings):
+    def __init__(self, embedder=None):
+        self.embedder = embedder or BatchEmbedder()
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        # Batch embedding not always supported directly or requires loop for large lists
-        embeddings = []
-        for text in texts:
-            # Model name for embeddings
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_document",
-            )
-            embeddings.append(result['embedding'])
-        return embeddings
+        return self.embedder.embed(texts)
 
     def embed_query(self, text: str) -> List[float]:
         result = genai.embed_content(
-            model="models/text-embedding-004",
+            model=EMBEDDING_MODEL,
             content=text,
             task_type="retrieval_query",
         )
         return result['embedding']
 
-def ingest_data(pdf_path="constitution.pdf"):
-    if not os.path.exists(pdf_path):
-        print(f"File {pdf_path} not found.")
+INDEX_PATH = "faiss_index"
+
+def save_index(vectorstore, index_path=INDEX_PATH, kind=VECTOR_INDEX_KIND, params=None):
+    # Write next to the live index and swap it in, so readers never see a half-written directory
+    tmp_path = f"{index_path}.tmp"
+    old_path = f"{index_path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    save_vectorstore(vectorstore, tmp_path, kind, params or {})
+    # Keyword index over the same rows, for hybrid retrieval and the article fast path
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))]
+    BM25Index.build(vectorstore.docstore.search(doc_id).page_content for doc_id in ids).save(tmp_path)
+    if os.path.exists(index_path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(index_path, old_path)
+    os.rename(tmp_path, index_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def remove_index(index_path=INDEX_PATH):
+    # Vectors, docstore and BM25 files all live in the index directory; move it aside before deleting
+    old_path = f"{index_path}.old"
+    if os.path.exists(index_path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(index_path, old_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+def find_documents(path):
+    if os.path.isdir(path):
+        found = []
+        for root, _, files in os.walk(path):
+            found.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        return sorted(found)
+    return [path] if os.path.exists(path) else []
+
+def source_name(path):
+    name = os.path.relpath(path)
+    if name.startswith(".."):
+        name = os.path.abspath(path)
+    return name.replace(os.sep, "/")
+
+def extract_pages(pdf_path, start, end):
+    """Process-pool worker: return [(page_number, text)] for pages [start, end)."""
+    reader = PdfReader(pdf_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def iter_pages(paths, workers=INGEST_WORKERS):
+    """Yield (path, pages) batches as soon as any worker finishes parsing them."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for path in paths:
+            page_count = len(PdfReader(path).pages)
+            for start in range(0, page_count, PAGES_PER_TASK):
+                future = executor.submit(extract_pages, path, start, min(start + PAGES_PER_TASK, page_count))
+                futures[future] = path
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def split_pages(source, pages, text_splitter):
+    chunks = []
+    for page, text in pages:
+        for chunk_text in text_splitter.split_text(text):
+            chunks.append({
+                "id": content_key(f"{source}\n{chunk_text}"),
+                "text_key": content_key(chunk_text),
+                "source": source,
+                "text": chunk_text,
+                "metadata": {"source": source, "document": os.path.basename(source), "page": page},
+            })
+    return chunks
+
+def build_index_from_store(store, embeddings, kind=VECTOR_INDEX_KIND, params=None):
+    """Build a new index of `kind` from every stored chunk; returns (vectorstore, params)."""
+    chunks = list(store.iter_chunks())
+    if not chunks:
+        return None, params
+    return build_vectorstore(
+        embeddings,
+        [c["embedding"] for c in chunks],
+        [c["text"] for c in chunks],
+        [c["metadata"] for c in chunks],
+        [c["id"] for c in chunks],
+        kind,
+        params,
+    )
+
+def update_index(index_path, store, embeddings, added_ids, removed_ids, previous_ids, kind=VECTOR_INDEX_KIND,
+                 params=None):
+    """Apply chunk additions/removals to the saved index, rebuilding it from the store when needed.
+
+    Returns (vectorstore, params, changed).
+    """
+    vectorstore = None
+    try:
+        loaded = load_vectorstore(index_path, embeddings, writable=True) if os.path.exists(index_path) else None
+    except LegacyIndexError:
+        print("Replacing the old pickled vector store, rebuilding from stored embeddings...")
+        loaded = None
+    if loaded is not None:
+        vectorstore, saved_kind, saved_params = loaded
+        if set(vectorstore.index_to_docstore_id.values()) != previous_ids:
+            print("Vector store is out of sync with the chunk store, rebuilding from stored embeddings...")
+            vectorstore = None
+        elif saved_kind != kind or (params and params != saved_params):
+            print(f"Switching vector index from {saved_kind} to {kind}, rebuilding from stored embeddings...")
+            vectorstore = None
+        elif not added_ids and not removed_ids:
+            return vectorstore, saved_params, False
+        elif removed_ids and kind not in REMOVABLE_KINDS:
+            print(f"{kind} indexes do not support removal, rebuilding from stored embeddings...")
+            vectorstore = None
+        else:
+            params = saved_params
+            if removed_ids:
+                vectorstore.delete(list(removed_ids))
+            if added_ids:
+                chunks = list(store.iter_chunks(added_ids))
+                vectorstore.add_embeddings(
+                    [(c["text"], c["embedding"]) for c in chunks],
+                    metadatas=[c["metadata"] for c in chunks],
+                    ids=[c["id"] for c in chunks],
+                )
+            if not vectorstore.index_to_docstore_id:
+                return None, params, True
+    if vectorstore is None:
+        vectorstore, params = build_index_from_store(store, embeddings, kind, params)
+    return vectorstore, params, True
+
+def ingest_data(path="constitution.pdf", index_path=INDEX_PATH, engine=None, embed_fn=gemini_embed_batch,
+                store_path=CHUNK_STORE_PATH, workers=INGEST_WORKERS, index_kind=VECTOR_INDEX_KIND, index_params=None):
+    """Ingest a PDF or a directory of PDFs into the chunk store and FAISS index."""
+    paths = find_documents(path)
+    # An emptied corpus directory still has to drop its documents from the index
+    if not paths and not os.path.isdir(path):
+        print(f"No PDF documents found at {path}.")
         return
 
-    print("Loading PDF...")
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
+    sources = [source_name(p) for p in paths]
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    embedder = BatchEmbedder(embed_fn=embed_fn)
+    timings = defaultdict(float)
+    stats = defaultdict(int)
+
+    store = ChunkStore(store_path)
+    embedder.checkpoint = store
+    try:
+        previous_ids = store.chunk_ids()
+        existing = {source: store.chunk_ids(source) for source in sources}
+        current = {source: set() for source in sources}
+        if os.path.isdir(path):
+            # Documents deleted from the corpus directory drop out of the index too
+            prefix = source_name(path).rstrip("/") + "/"
+            for source in store.sources():
+                if source.startswith(prefix) and source not in existing:
+                    existing[source] = store.chunk_ids(source)
+                    current[source] = set()
+
+        added_ids = []
+        pending = []
+
+        def embed_pending():
+            # Embeddings and chunks land in the store per batch, so a failed run resumes where it stopped
+            start = time.perf_counter()
+            embedder.embed([c["text"] for c in pending])
+            store.replace_chunks(pending, [])
+            added_ids.extend(c["id"] for c in pending)
+            for key in ("embedded", "resumed", "batches"):
+                stats[key] += embedder.stats[key]
+            pending.clear()
+            timings["embed"] += time.perf_counter() - start
+
+        print(f"Parsing {len(paths)} document(s) with {workers} worker(s)...")
+        waited = time.perf_counter()
+        for doc_path, pages in iter_pages(paths, workers):
+            timings["load"] += time.perf_counter() - waited
+            start = time.perf_counter()
+            source = source_name(doc_path)
+            stats["pages"] += len(pages)
+            for chunk in split_pages(source, pages, text_splitter):
+                if chunk["id"] in current[source]:
+                    continue
+                current[source].add(chunk["id"])
+                stats["chunks"] += 1
+                if chunk["id"] not in existing[source]:
+                    pending.append(chunk)
+            timings["split"] += time.perf_counter() - start
+            if len(pending) >= embedder.batch_size * embedder.concurrency:
+                embed_pending()
+            waited = time.perf_counter()
+        if pending:
+            embed_pending()
+
+        removed_ids = set()
+        for source, ids in existing.items():
+            removed_ids |= ids - current[source]
+        store.replace_chunks([], removed_ids)
+        stats.update(added=len(added_ids), removed=len(removed_ids))
+        print(f"{len(added_ids)} new chunks, {len(removed_ids)} removed, "
+              f"{stats['chunks'] - len(added_ids)} unchanged")
 
-    print("Splitting text...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_documents(documents)
+        print("Updating vector store...")
+        start = time.perf_counter()
+        vectorstore, index_params, changed = update_index(index_path, store, GeminiEmbeddings(embedder), added_ids,
+                                                          removed_ids, previous_ids, index_kind, index_params)
+        if not changed:
+            print("Vector store is already up to date.")
+            return dict(stats, timings=dict(timings))
+        if vectorstore is None:
+            print("No chunks left to index, removing the vector store.")
+            remove_index(index_path)
+        else:
+            save_index(vectorstore, index_path, index_kind, index_params)
+        timings["index"] = time.perf_counter() - start
+    finally:
+        store.close()
 
-    print("Creating embeddings (using Gemini SDK)...")
-    embeddings = GeminiEmbeddings()
+    stats["chunks_per_sec"] = stats["embedded"] / timings["embed"] if timings["embed"] else None
+    if vectorstore is not None:
+        print(f"Ingestion complete. Vector store saved to '{index_path}'.")
+    print("Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
 
-    print("Building vector store...")
-    # Passing the custom embeddings class
-    vectorstore = FAISS.from_documents(texts, embeddings)
-    
-    vectorstore.save_local("faiss_index")
-    print("Ingestion complete. Vector store saved to 'faiss_index'.")
+    if engine is not None:
+        engine.reload()
+    return dict(stats, timings=dict(timings))
 
 if __name__ == "__main__":
-    ingest_data("constitution.pdf")
+    ingest_data(sys.argv[1] if len(sys.argv) > 1 else "constitution.pdf")
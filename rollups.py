@@ -0,0 +1,213 @@
+"""Authority dashboard statistics from the report_rollups and report_daily_rollups tables.
+
+The write paths add their changes to the rollups in the same transaction (report_created, report_resolved,
+votes_added return the statements), so dashboard queries read one row per district and status, or per day and
+district, however many reports there are. rebuild() recomputes both tables from scratch.
+
+    python rollups.py    # rebuild the rollups of DATABASE_URL
+"""
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import Date, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+import models
+
+RESOLVED = "Resolved"
+DEFAULT_STATUS = "Pending"
+STATS_BUCKETS = ("day", "week", "month")
+
+rollups = models.ReportRollup.__table__
+daily = models.DailyReportRollup.__table__
+reports = models.Report.__table__
+users = models.User.__table__
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+
+def _upsert(statement, table, keys, increments):
+    return statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: table.c[column] + statement.excluded[column] for column in increments},
+    )
+
+def bump(dialect_name, table, keys, **increments):
+    """Add `increments` to the counters of the rollup row with primary key `keys`, creating it if needed."""
+    counters = [column.name for column in table.c if not column.primary_key]
+    values = dict(keys, **{column: increments.get(column, 0) for column in counters})
+    return _upsert(_insert(dialect_name)(table).values(**values), table, list(keys), increments)
+
+def _status(status):
+    return status or DEFAULT_STATUS
+
+def _resolve_seconds(report):
+    if not report.created_at or not report.resolved_at:
+        return 0.0
+    return max((report.resolved_at - report.created_at).total_seconds(), 0.0)
+
+def report_created(dialect_name, report, district):
+    """Statements counting a new (flushed) report."""
+    district = district or ""
+    return [
+        bump(dialect_name, rollups, {"district": district, "status": _status(report.status)},
+             reports=1, votes=report.votes or 0),
+        bump(dialect_name, daily, {"day": report.created_at.date(), "district": district}, created=1),
+    ]
+
+def report_resolved(dialect_name, report, previous_status, district):
+    """Statements moving a just-resolved report out of `previous_status`; none if it was already resolved."""
+    if _status(previous_status) == RESOLVED:
+        return []
+    district = district or ""
+    seconds = _resolve_seconds(report)
+    votes = report.votes or 0
+    return [
+        bump(dialect_name, rollups, {"district": district, "status": _status(previous_status)},
+             reports=-1, votes=-votes),
+        bump(dialect_name, rollups, {"district": district, "status": RESOLVED},
+             reports=1, votes=votes, resolve_seconds=seconds),
+        bump(dialect_name, daily, {"day": report.resolved_at.date(), "district": district},
+             resolved=1, resolve_seconds=seconds),
+    ]
+
+def votes_added(dialect_name, report_id, increment, day=None):
+    """Statements adding `increment` votes on a report. The report's district and current status are read by
+    the statements themselves (INSERT ... SELECT), so vote paths don't need to load the report."""
+    day = day or datetime.datetime.utcnow().date()
+    source = reports.outerjoin(users, users.c.id == reports.c.user_id)
+    district = func.coalesce(users.c.district, "")
+    insert = _insert(dialect_name)
+
+    by_status = insert(rollups).from_select(
+        ["district", "status", "reports", "votes", "resolve_seconds"],
+        select(district, func.coalesce(reports.c.status, DEFAULT_STATUS), literal(0), literal(increment),
+               literal(0.0)).select_from(source).where(reports.c.id == report_id),
+    )
+    by_day = insert(daily).from_select(
+        ["day", "district", "created", "resolved", "resolve_seconds", "votes"],
+        select(literal(day, Date), district, literal(0), literal(0), literal(0.0), literal(increment))
+        .select_from(source).where(reports.c.id == report_id),
+    )
+    return [_upsert(by_status, rollups, ["district", "status"], ["votes"]),
+            _upsert(by_day, daily, ["day", "district"], ["votes"])]
+
+def _mean_hours(seconds, count):
+    return round(seconds / count / 3600, 2) if count else None
+
+def summary(db, district=None):
+    """Per-district (and overall) report counts by status, votes on open reports and mean time to resolve."""
+    query = select(rollups)
+    if district is not None:
+        query = query.where(rollups.c.district == district)
+    totals = defaultdict(lambda: {"by_status": defaultdict(int), "open_votes": 0, "resolve_seconds": 0.0})
+    for row in db.execute(query):
+        for key in (row.district, None):
+            entry = totals[key]
+            entry["by_status"][row.status] += row.reports
+            entry["resolve_seconds"] += row.resolve_seconds
+            if row.status != RESOLVED:
+                entry["open_votes"] += row.votes
+
+    def item(key, entry):
+        by_status = {status: count for status, count in entry["by_status"].items() if count}
+        return {
+            "district": key or None,
+            "total": sum(by_status.values()),
+            "pending": by_status.get(DEFAULT_STATUS, 0),
+            "resolved": by_status.get(RESOLVED, 0),
+            "by_status": by_status,
+            "open_votes": entry["open_votes"],
+            "mean_resolve_hours": _mean_hours(entry["resolve_seconds"], by_status.get(RESOLVED, 0)),
+        }
+
+    overall = totals.pop(None, {"by_status": {}, "open_votes": 0, "resolve_seconds": 0.0})
+    return {
+        "overall": item("all", overall),
+        "districts": sorted((item(key, entry) for key, entry in totals.items()), key=lambda i: -i["total"]),
+    }
+
+def bucket_start(day, bucket):
+    if bucket == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def series(db, district=None, bucket="day", days=30, today=None):
+    """Created/resolved/votes per day, week (from Monday) or month over the last `days` days, oldest first and
+    with empty buckets included, for charts."""
+    today = today or datetime.datetime.utcnow().date()
+    first = bucket_start(today - datetime.timedelta(days=days - 1), bucket)
+    query = (select(daily.c.day, func.sum(daily.c.created), func.sum(daily.c.resolved),
+                    func.sum(daily.c.resolve_seconds), func.sum(daily.c.votes))
+             .where(daily.c.day >= first, daily.c.day <= today)
+             .group_by(daily.c.day))
+    if district is not None:
+        query = query.where(daily.c.district == district)
+
+    buckets = {}
+    day = first
+    while day <= today:
+        buckets.setdefault(bucket_start(day, bucket), {"created": 0, "resolved": 0, "resolve_seconds": 0.0,
+                                                       "votes": 0})
+        day += datetime.timedelta(days=1)
+    for day, created, resolved, seconds, votes in db.execute(query):
+        entry = buckets[bucket_start(day, bucket)]
+        entry["created"] += created
+        entry["resolved"] += resolved
+        entry["resolve_seconds"] += seconds
+        entry["votes"] += votes
+    return [{
+        "start": start,
+        "created": entry["created"],
+        "resolved": entry["resolved"],
+        "votes": entry["votes"],
+        "mean_resolve_hours": _mean_hours(entry["resolve_seconds"], entry["resolved"]),
+    } for start, entry in buckets.items()]
+
+def rebuild(db):
+    """Recompute both rollup tables from reports and report_votes. Daily vote counts can only come from
+    per-user votes (report_votes.created_at); anonymous votes were never timestamped."""
+    by_status = defaultdict(lambda: defaultdict(float))
+    by_day = defaultdict(lambda: defaultdict(float))
+    rows = db.execute(select(reports.c.status, reports.c.votes, reports.c.created_at, reports.c.resolved_at,
+                             users.c.district).select_from(reports.outerjoin(users, users.c.id == reports.c.user_id)))
+    for row in rows:
+        district, status = row.district or "", _status(row.status)
+        counters = by_status[(district, status)]
+        counters["reports"] += 1
+        counters["votes"] += row.votes or 0
+        if row.created_at:
+            by_day[(row.created_at.date(), district)]["created"] += 1
+        if status == RESOLVED and row.resolved_at:
+            seconds = _resolve_seconds(row)
+            counters["resolve_seconds"] += seconds
+            by_day[(row.resolved_at.date(), district)]["resolved"] += 1
+            by_day[(row.resolved_at.date(), district)]["resolve_seconds"] += seconds
+    votes = models.ReportVote.__table__
+    rows = db.execute(select(votes.c.created_at, users.c.district)
+                      .select_from(votes.join(reports, reports.c.id == votes.c.report_id)
+                                   .outerjoin(users, users.c.id == reports.c.user_id)))
+    for created_at, district in rows:
+        if created_at:
+            by_day[(created_at.date(), district or "")]["votes"] += 1
+
+    db.execute(rollups.delete())
+    db.execute(daily.delete())
+    if by_status:
+        db.execute(rollups.insert(), [
+            {"district": district, "status": status, "reports": int(c["reports"]), "votes": int(c["votes"]),
+             "resolve_seconds": c["resolve_seconds"]} for (district, status), c in by_status.items()])
+    if by_day:
+        db.execute(daily.insert(), [
+            {"day": day, "district": district, "created": int(c["created"]), "resolved": int(c["resolved"]),
+             "resolve_seconds": c["resolve_seconds"], "votes": int(c["votes"])} for (day, district), c in by_day.items()])
+    db.commit()
+
+if __name__ == "__main__":
+    import database
+
+    with database.WriteSessionLocal() as session:
+        rebuild(session)
+    print("Rebuilt report_rollups and report_daily_rollups")
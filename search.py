@@ -0,0 +1,255 @@
+"""Full-text search over report titles, descriptions, locations and comments.
+
+The index lives next to the schema rather than in the models: on SQLite an FTS5 table report_search (rowid is
+the report id, one column per field plus all comments), on Postgres report_search(report_id, document tsvector)
+with a GIN index. Triggers on reports and comments keep it in sync, so none of the write paths call into this
+module. create() builds it with the rest of the schema (see models.py) and migration 0009 on existing databases.
+
+    python search.py    # rebuild the index of DATABASE_URL
+"""
+import base64
+import json
+import os
+import re
+
+from sqlalchemy import String, bindparam, column, func, literal_column, select, table, tuple_
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "50"))
+# Words of context around the matches in a snippet
+SEARCH_SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", "12"))
+SEARCH_MAX_TERMS = 16
+# Broad queries rank only this many of their newest matches (SQLite); 0 ranks every match
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "20000"))
+SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS = "<mark>", "</mark>", "…"
+# bm25 weights of title, description, location and comments (SQLite); Postgres weights them A, C, B and D
+SQLITE_WEIGHTS = (10.0, 2.0, 4.0, 1.0)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS report_search USING fts5("
+    "title, description, location, comments, tokenize = 'porter unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_insert AFTER INSERT ON reports BEGIN
+        INSERT INTO report_search (rowid, title, description, location, comments)
+        VALUES (new.id, new.title, new.description, new.location, '');
+    END""",
+    # Vote and status updates don't name these columns, so they don't rewrite the index
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_update AFTER UPDATE OF title, description, location
+    ON reports BEGIN
+        UPDATE report_search SET title = new.title, description = new.description, location = new.location
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_report_delete AFTER DELETE ON reports BEGIN
+        DELETE FROM report_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_insert AFTER INSERT ON comments BEGIN
+        UPDATE report_search SET comments = ltrim(comments || ' ' || coalesce(new.text, ''))
+        WHERE rowid = new.report_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_update AFTER UPDATE OF text, report_id ON comments BEGIN
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = old.report_id), '')
+        WHERE rowid = old.report_id;
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = new.report_id), '')
+        WHERE rowid = new.report_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS report_search_comment_delete AFTER DELETE ON comments BEGIN
+        UPDATE report_search SET comments = coalesce(
+            (SELECT group_concat(text, ' ') FROM comments WHERE report_id = old.report_id), '')
+        WHERE rowid = old.report_id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM report_search",
+    """INSERT INTO report_search (rowid, title, description, location, comments)
+    SELECT r.id, r.title, r.description, r.location,
+           coalesce((SELECT group_concat(c.text, ' ') FROM comments c WHERE c.report_id = r.id), '')
+    FROM reports r""",
+    "INSERT INTO report_search (report_search) VALUES ('optimize')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS report_search_report_insert",
+    "DROP TRIGGER IF EXISTS report_search_report_update",
+    "DROP TRIGGER IF EXISTS report_search_report_delete",
+    "DROP TRIGGER IF EXISTS report_search_comment_insert",
+    "DROP TRIGGER IF EXISTS report_search_comment_update",
+    "DROP TRIGGER IF EXISTS report_search_comment_delete",
+    "DROP TABLE IF EXISTS report_search",
+]
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS report_search (
+        report_id INTEGER PRIMARY KEY REFERENCES reports (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_report_search_document ON report_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION report_search_refresh(target INTEGER) RETURNS void AS $$
+    BEGIN
+        INSERT INTO report_search (report_id, document)
+        SELECT r.id,
+               setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+               setweight(to_tsvector('english', coalesce(r.location, '')), 'B') ||
+               setweight(to_tsvector('english', coalesce(r.description, '')), 'C') ||
+               setweight(to_tsvector('english', coalesce(
+                   (SELECT string_agg(c.text, ' ') FROM comments c WHERE c.report_id = r.id), '')), 'D')
+        FROM reports r WHERE r.id = target
+        ON CONFLICT (report_id) DO UPDATE SET document = excluded.document;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION report_search_report_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM report_search_refresh(NEW.id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION report_search_comment_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM report_search_refresh(OLD.report_id);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM report_search_refresh(NEW.report_id);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS report_search_report ON reports",
+    """CREATE TRIGGER report_search_report AFTER INSERT OR UPDATE OF title, description, location ON reports
+    FOR EACH ROW EXECUTE FUNCTION report_search_report_changed()""",
+    "DROP TRIGGER IF EXISTS report_search_comment ON comments",
+    """CREATE TRIGGER report_search_comment AFTER INSERT OR DELETE OR UPDATE OF text, report_id ON comments
+    FOR EACH ROW EXECUTE FUNCTION report_search_comment_changed()""",
+]
+
+POSTGRES_REBUILD = [
+    "TRUNCATE report_search",
+    "SELECT report_search_refresh(id) FROM reports",
+]
+
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS report_search_comment ON comments",
+    "DROP TRIGGER IF EXISTS report_search_report ON reports",
+    "DROP FUNCTION IF EXISTS report_search_comment_changed()",
+    "DROP FUNCTION IF EXISTS report_search_report_changed()",
+    "DROP FUNCTION IF EXISTS report_search_refresh(INTEGER)",
+    "DROP TABLE IF EXISTS report_search",
+]
+
+class InvalidQuery(ValueError):
+    pass
+
+def _postgres(dialect_name):
+    return dialect_name == "postgresql"
+
+def _run(conn, statements):
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+def create(conn):
+    """Create the index and its triggers (idempotent)."""
+    _run(conn, POSTGRES_DDL if _postgres(conn.dialect.name) else SQLITE_DDL)
+
+def drop(conn):
+    _run(conn, POSTGRES_DROP if _postgres(conn.dialect.name) else SQLITE_DROP)
+
+def rebuild(conn):
+    """Re-index every report, e.g. after bulk loads that bypassed the triggers."""
+    _run(conn, POSTGRES_REBUILD if _postgres(conn.dialect.name) else SQLITE_REBUILD)
+
+def is_index_table(name):
+    """report_search and the shadow tables FTS5 keeps for it (report_search_data, ...)."""
+    return name == "report_search" or name.startswith("report_search_")
+
+def terms(q):
+    """The words of a user's query; punctuation and query syntax are dropped rather than interpreted."""
+    words = re.findall(r"[^\W_]+", q.lower())[:SEARCH_MAX_TERMS]
+    if not words:
+        raise InvalidQuery("Search query has no words")
+    return words
+
+def match_expression(dialect_name, words, prefix=False):
+    """Every word must match; with `prefix` the last one may be incomplete (search as you type). Prefixes of
+    frequent words expand to many index terms, so they cost noticeably more than whole words."""
+    if _postgres(dialect_name):
+        return " & ".join(words) + (":*" if prefix else "")
+    return " ".join(f'"{word}"' for word in words) + ("*" if prefix else "")
+
+def encode_cursor(rank, report_id):
+    raw = json.dumps({"rank": rank, "id": report_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(data["rank"]), int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidQuery("Malformed cursor") from e
+
+def page_size(limit):
+    return max(1, min(limit or SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE))
+
+fts = table("report_search", column("rowid"))
+documents = table("report_search", column("report_id"), column("document"))
+reports = table("reports", column("id"), column("title"), column("description"), column("location"),
+                column("status"), column("user_id"))
+comments = table("comments", column("report_id"), column("text"))
+users = table("users", column("id"), column("district"))
+
+def _sqlite_match(q):
+    return literal_column("report_search").op("MATCH")(q)
+
+def _sqlite_search(q):
+    """(report id, rank, snippet, table, conditions) on SQLite."""
+    rank = func.bm25(literal_column("report_search"), *SQLITE_WEIGHTS)
+    # Evaluated only for the rows of the page, after sorting
+    snippet = func.snippet(literal_column("report_search"), -1, SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS,
+                           SEARCH_SNIPPET_WORDS)
+    conditions = [_sqlite_match(q)]
+    if SEARCH_MAX_CANDIDATES:
+        # bm25 has to be computed for every match before the best can be picked; for terms in a large share
+        # of the corpus, rank only the newest SEARCH_MAX_CANDIDATES matches. FTS5 walks rowids (ids) in
+        # descending order without sorting, so finding the cut-off is cheap.
+        cutoff = (select(fts.c.rowid).where(_sqlite_match(q)).order_by(fts.c.rowid.desc())
+                  .limit(1).offset(SEARCH_MAX_CANDIDATES - 1).correlate(None).scalar_subquery())
+        conditions.append(fts.c.rowid >= func.coalesce(cutoff, 0))
+    return fts.c.rowid, rank, snippet, fts, conditions
+
+def _postgres_search(q):
+    """(report id, rank, snippet, table, conditions) on Postgres."""
+    query = func.to_tsquery("english", q)
+    rank = -func.ts_rank_cd(documents.c.document, query)
+    # ts_headline is costly enough that the planner postpones it past ORDER BY ... LIMIT
+    content = func.concat_ws(" ", reports.c.title, reports.c.description, reports.c.location,
+                             select(func.string_agg(comments.c.text, " "))
+                             .where(comments.c.report_id == documents.c.report_id).scalar_subquery())
+    options = (f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, FragmentDelimiter={SNIPPET_ELLIPSIS}, "
+               f"MaxWords={2 * SEARCH_SNIPPET_WORDS}, MinWords={SEARCH_SNIPPET_WORDS // 2}, MaxFragments=2")
+    snippet = func.ts_headline("english", content, query, options)
+    source = documents.join(reports, reports.c.id == documents.c.report_id)
+    return documents.c.report_id, rank, snippet, source, [documents.c.document.op("@@")(query)]
+
+def search_query(dialect_name, q, cursor=None, limit=SEARCH_PAGE_SIZE, status=None, district=None, prefix=False):
+    """(id, score, snippet) of the best matches for `q`, best (lowest score) first, one row more than `limit`
+    so the caller can tell whether there is a next page."""
+    words = terms(q)
+    q = bindparam("q", match_expression(dialect_name, words, prefix), type_=String)
+    report_id, rank, snippet, source, conditions = (_postgres_search if _postgres(dialect_name)
+                                                    else _sqlite_search)(q)
+    query = select(report_id.label("id"), rank.label("score"), snippet.label("snippet")).select_from(source)
+    query = query.where(*conditions)
+    if status or district:
+        if not _postgres(dialect_name):
+            query = query.join(reports, reports.c.id == report_id)
+        if status:
+            query = query.where(reports.c.status == status)
+        if district:
+            query = query.join(users, users.c.id == reports.c.user_id).where(users.c.district == district)
+    if cursor:
+        query = query.where(tuple_(rank, report_id) > tuple_(*decode_cursor(cursor)))
+    return query.order_by(rank, report_id).limit(limit + 1)
+
+if __name__ == "__main__":
+    import database
+
+    with database.engine.begin() as conn:
+        rebuild(conn)
+    print("Rebuilt report_search")
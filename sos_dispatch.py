@@ -0,0 +1,242 @@
+"""Push SOS alerts to the authorities responsible for where they were raised.
+
+Authorities are indexed in memory two ways:
+
+- by region: every authority user under its (state, district, sub_district). An alert goes to the authorities
+  of its sub-district and to those covering the whole district or state.
+- by position: authorities whose client reports a latitude/longitude while connected (patrols, stations) are
+  put in a geohash cell of SOS_GEOHASH_PRECISION characters. An alert with coordinates also goes to everyone
+  in its cell and the eight cells around it.
+
+Connected authority clients (WebSocket or SSE, see main.py) each get a bounded queue. publish() runs on the
+event loop right after the alert is committed, serializes the alert once and puts it on the queue of every
+routed subscriber, so fan-out costs one dict lookup per region or cell plus one put per connection.
+Subscriptions live in this process: an alert reaches the clients connected to the worker that took it.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import select
+
+import models
+
+# 5 characters: cells of about 4.9 x 4.9 km, so alerts reach positions within roughly 5-10 km
+SOS_GEOHASH_PRECISION = int(os.getenv("SOS_GEOHASH_PRECISION", "5"))
+# Undelivered alerts kept per connection; beyond that the oldest is dropped
+SOS_QUEUE_SIZE = int(os.getenv("SOS_QUEUE_SIZE", "100"))
+# SSE comment sent when there has been no alert for this long, so proxies keep the stream open
+SOS_KEEPALIVE_SECONDS = float(os.getenv("SOS_KEEPALIVE_SECONDS", "15"))
+# Stored on each alert; any prefix of it is the alert's cell at a coarser precision
+STORED_GEOHASH_PRECISION = 9
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash(latitude, longitude, precision=SOS_GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (interval[0] + interval[1]) / 2
+        if coordinate >= mid:
+            value, interval[0] = value * 2 + 1, mid
+        else:
+            value, interval[1] = value * 2, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value, bits = 0, 0
+    return "".join(chars)
+
+def cell_size(precision=SOS_GEOHASH_PRECISION):
+    """(degrees of latitude, degrees of longitude) covered by one geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    return 180.0 / 2 ** (5 * precision - lon_bits), 360.0 / 2 ** lon_bits
+
+def neighborhood(latitude, longitude, precision=SOS_GEOHASH_PRECISION):
+    """The geohash cell of a point and the (up to) eight cells around it."""
+    dlat, dlon = cell_size(precision)
+    cells = set()
+    for i in (-1, 0, 1):
+        lat = latitude + i * dlat
+        if not -90 <= lat <= 90:
+            continue
+        for j in (-1, 0, 1):
+            lon = (longitude + j * dlon + 180) % 360 - 180
+            cells.add(geohash(lat, lon, precision))
+    return cells
+
+def region_key(state=None, district=None, sub_district=None):
+    """Normalized (state, district, sub_district) prefix, stopping at the first missing part."""
+    key = []
+    for part in (state, district, sub_district):
+        if not part or not part.strip():
+            break
+        key.append(part.strip().lower())
+    return tuple(key)
+
+class AuthorityIndex:
+    """Authority user ids by region and by geohash cell.
+
+    Signups update it from the threadpool while the event loop routes alerts, hence the lock.
+    """
+
+    def __init__(self, precision=SOS_GEOHASH_PRECISION):
+        self.precision = precision
+        self._owners = defaultdict(set)  # region -> authorities assigned exactly to it
+        self._members = defaultdict(set)  # region -> authorities assigned to it or anywhere inside it
+        self._regions = {}  # authority -> region
+        self._cells = defaultdict(set)  # geohash -> authorities located there
+        self._positions = {}  # authority -> geohash
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._regions)
+
+    def __contains__(self, user_id):
+        return user_id in self._regions
+
+    def add(self, user_id, state=None, district=None, sub_district=None):
+        key = region_key(state, district, sub_district)
+        with self._lock:
+            self._remove_region(user_id)
+            self._regions[user_id] = key
+            self._owners[key].add(user_id)
+            for depth in range(len(key) + 1):
+                self._members[key[:depth]].add(user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove_region(user_id)
+            self._forget_position(user_id)
+
+    def locate(self, user_id, latitude, longitude):
+        cell = geohash(latitude, longitude, self.precision)
+        with self._lock:
+            self._forget_position(user_id)
+            self._positions[user_id] = cell
+            self._cells[cell].add(user_id)
+
+    def forget_position(self, user_id):
+        with self._lock:
+            self._forget_position(user_id)
+
+    def load(self, db):
+        """(Re)build the region index from the authority users in the database."""
+        query = (select(models.User.id, models.User.state, models.User.district, models.User.sub_district)
+                 .where(models.User.role == "authority"))
+        rows = db.execute(query).all()
+        with self._lock:
+            for user_id in list(self._regions):
+                self._remove_region(user_id)
+        for user_id, state, district, sub_district in rows:
+            self.add(user_id, state, district, sub_district)
+
+    def route(self, state=None, district=None, sub_district=None, latitude=None, longitude=None):
+        """Ids of the authorities an alert raised here should reach."""
+        key = region_key(state, district, sub_district)
+        cells = ()
+        if latitude is not None and longitude is not None:
+            cells = neighborhood(latitude, longitude, self.precision)
+        with self._lock:
+            # Everyone inside the alert's region, and whoever covers one of the regions containing it; an alert
+            # with no region at all only goes by position
+            routed = set(self._members.get(key, ())) if key else set()
+            for depth in range(1, len(key)):
+                routed |= self._owners.get(key[:depth], set())
+            for cell in cells:
+                routed |= self._cells.get(cell, set())
+        return routed
+
+    def _remove_region(self, user_id):
+        key = self._regions.pop(user_id, None)
+        if key is not None:
+            self._owners[key].discard(user_id)
+            for depth in range(len(key) + 1):
+                self._members[key[:depth]].discard(user_id)
+
+    def _forget_position(self, user_id):
+        cell = self._positions.pop(user_id, None)
+        if cell is not None:
+            self._cells[cell].discard(user_id)
+
+def alert_message(alert, user=None):
+    return json.dumps({
+        "id": alert.id,
+        "user_id": alert.user_id,
+        "user_name": user.full_name if user else None,
+        "location": alert.location,
+        "latitude": alert.latitude,
+        "longitude": alert.longitude,
+        "state": alert.state,
+        "district": alert.district,
+        "sub_district": alert.sub_district,
+        "timestamp": alert.timestamp,
+    }, default=str)
+
+class Dispatcher:
+    """Queues of connected authority clients; must be used from the event loop."""
+
+    def __init__(self, index, queue_size=SOS_QUEUE_SIZE):
+        self.index = index
+        self.queue_size = queue_size
+        self._queues = defaultdict(set)  # authority -> one queue per open connection
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.unrouted = 0
+
+    def subscribe(self, user_id, latitude=None, longitude=None):
+        queue = asyncio.Queue(self.queue_size)
+        self._queues[user_id].add(queue)
+        if latitude is not None and longitude is not None:
+            self.index.locate(user_id, latitude, longitude)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._queues.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._queues[user_id]
+            self.index.forget_position(user_id)
+
+    def connections(self):
+        return sum(len(queues) for queues in self._queues.values())
+
+    def publish(self, message, **where):
+        """Queue a serialized alert for every connection of the authorities routed for `where` (see
+        AuthorityIndex.route); returns how many connections it was queued for."""
+        self.published += 1
+        routed = self.index.route(**where)
+        if not routed:
+            self.unrouted += 1
+        delivered = 0
+        for user_id in routed:
+            for queue in self._queues.get(user_id, ()):
+                if queue.full():
+                    # A client this far behind still gets the newest alerts
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(message)
+                delivered += 1
+        self.delivered += delivered
+        return delivered
+
+    def stats(self):
+        return {
+            "authorities": len(self.index),
+            "subscribed_authorities": len(self._queues),
+            "connections": self.connections(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "unrouted": self.unrouted,
+        }
+
+authorities = AuthorityIndex()
+dispatcher = Dispatcher(authorities)
@@ -0,0 +1,55 @@
+import datetime
+
+from sqlalchemy import func, select
+
+import models
+
+def normalize_tags(names):
+    """Strip blanks and duplicates, keeping the order the user gave."""
+    seen = []
+    for name in names or []:
+        name = name.strip()
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+def get_or_create_tags(db, names):
+    names = normalize_tags(names)
+    if not names:
+        return []
+    existing = {t.name: t for t in db.scalars(select(models.Tag).where(models.Tag.name.in_(names)))}
+    created = [models.Tag(name=name, report_count=0) for name in names if name not in existing]
+    if created:
+        db.add_all(created)
+        # Sessions don't autoflush, and the next lookup in this transaction must see them
+        db.flush()
+        existing.update((t.name, t) for t in created)
+    return [existing[name] for name in names]
+
+def tag_report(db, report, names):
+    """Attach tags to a new report and bump their report counts in the same transaction."""
+    report.tags = get_or_create_tags(db, names)
+    for tag in report.tags:
+        # Evaluated by the database at flush, so concurrent reports don't lose increments
+        tag.report_count = models.Tag.report_count + 1
+    return report.tags
+
+def trending_tags_query(limit=10, days=None):
+    if days is None:
+        return (select(models.Tag.name, models.Tag.report_count)
+                .where(models.Tag.report_count > 0)
+                .order_by(models.Tag.report_count.desc(), models.Tag.name)
+                .limit(limit))
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    count = func.count().label("count")
+    return (select(models.Tag.name, count)
+            .join(models.report_tags, models.report_tags.c.tag_id == models.Tag.id)
+            .join(models.Report, models.Report.id == models.report_tags.c.report_id)
+            .where(models.Report.created_at >= since)
+            .group_by(models.Tag.id)
+            .order_by(count.desc(), models.Tag.name)
+            .limit(limit))
+
+def trending_tags(db, limit=10, days=None):
+    """Most used tags, from the maintained counts or, with `days`, counted over recent reports only."""
+    return [{"name": name, "count": count} for name, count in db.execute(trending_tags_query(limit, days))]
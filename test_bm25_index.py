@@ -0,0 +1,73 @@
+import pytest
+
+from bm25_index import BM25Index, query_sections, section_keys
+from rag_chat import RAGEngine
+from rag_ingest import save_index
+from test_rag_engine import FakeEmbeddings, FakeModel
+from vector_index import build_vectorstore
+
+CHUNKS = [
+    "20. Protection in respect of conviction for offences.—No person shall be convicted of any offence",
+    "21. Protection of life and personal liberty.—No person shall be deprived of his life or personal liberty",
+    "1[21A. Right to education.—The State shall provide free and compulsory education to all children",
+    "THE CONSTITUTION OF INDIA\n(Seventh Schedule)\nList I—Union List: defence of India, naval, military",
+    "The Right to Information Act lets citizens request records from public authorities",
+]
+
+
+class NoEmbeddings(FakeEmbeddings):
+    def embed_query(self, text):
+        raise AssertionError("query should not be embedded")
+
+    async def aembed_query(self, text):
+        raise AssertionError("query should not be embedded")
+
+
+def build_hybrid_index(path):
+    embeddings = FakeEmbeddings()
+    ids = [f"id-{i}" for i in range(len(CHUNKS))]
+    metadatas = [{"source": "constitution.pdf", "document": "constitution.pdf", "page": i} for i in range(len(CHUNKS))]
+    vectorstore, params = build_vectorstore(embeddings, embeddings.embed_documents(CHUNKS), CHUNKS, metadatas, ids)
+    save_index(vectorstore, str(path), "flat", params)
+
+
+def test_section_keys_and_queries():
+    assert section_keys(CHUNKS[1]) == {"article:21"}
+    assert section_keys(CHUNKS[2]) == {"article:21A"}
+    assert section_keys(CHUNKS[3]) == {"schedule:7"}
+    assert query_sections("What does Article 21A say?") == ["article:21A"]
+    assert query_sections("explain schedule VII") == ["schedule:7"]
+    assert query_sections("right to information") == []
+
+
+def test_bm25_ranks_keyword_matches():
+    index = BM25Index.build(CHUNKS)
+    rows = [row for row, _ in index.search("right to information records", 2)]
+    assert rows[0] == 4
+    assert index.search("education", 5, allowed={0, 1}) == []
+
+
+def test_article_fast_path_skips_embedding(tmp_path):
+    build_hybrid_index(tmp_path / "faiss_index")
+    model = FakeModel()
+    engine = RAGEngine(str(tmp_path / "faiss_index"), embeddings=NoEmbeddings(), model=model)
+    engine.load()
+
+    assert engine.answer("What is Article 21?") == "answer"
+    assert "21. Protection of life" in model.prompts[0].split("Question:")[0]
+    docs = engine.retrieve("Seventh Schedule union list", k=1)
+    assert docs[0].metadata["page"] == 3
+    assert engine.stats()["fast_path_queries"] == 1
+
+    with pytest.raises(AssertionError):
+        engine.retrieve("freedom of the press")
+
+
+def test_hybrid_retrieval_fuses_keyword_hits(tmp_path):
+    build_hybrid_index(tmp_path / "faiss_index")
+    engine = RAGEngine(str(tmp_path / "faiss_index"), embeddings=FakeEmbeddings(), model=FakeModel())
+    engine.load()
+    assert engine.stats()["hybrid"]
+
+    docs = engine.retrieve("can citizens request records", k=2)
+    assert docs[0].metadata["page"] == 4
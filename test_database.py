@@ -0,0 +1,72 @@
+import threading
+
+from sqlalchemy import text
+
+import database
+import models
+
+
+def test_tuned_sqlite_pragmas(tmp_path):
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}", tuned=True)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    engine.dispose()
+
+
+def test_write_sessions_serialize_read_modify_write(tmp_path):
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'writes.db'}", tuned=True)
+    models.Base.metadata.create_all(bind=engine)
+    sessions = database.write_sessionmaker(engine)
+    with sessions() as db:
+        db.add(models.Report(title="Pothole", votes=0))
+        db.commit()
+
+    errors = []
+
+    def vote(times):
+        for _ in range(times):
+            with sessions() as db:
+                try:
+                    # Read then write, as vote_report does; a deferred transaction would lose updates or fail
+                    report = db.get(models.Report, 1)
+                    report.votes += 1
+                    db.commit()
+                except Exception as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=vote, args=(25,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with sessions() as db:
+        assert db.get(models.Report, 1).votes == 200
+    assert errors == []
+    engine.dispose()
+
+
+def test_async_url():
+    assert database.async_url("sqlite:///./citizen.db") == "sqlite+aiosqlite:///./citizen.db"
+    assert database.async_url("postgresql://u:p@db/citizen") == "postgresql+asyncpg://u:p@db/citizen"
+    assert database.async_url("postgresql+psycopg2://db/citizen") == "postgresql+asyncpg://db/citizen"
+
+
+def test_pool_metrics_record_checkout_waits(tmp_path):
+    metrics = database.PoolMetrics()
+    engine = database.create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}", metrics=metrics)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert metrics.stats(engine)["in_use"] == 1
+    stats = metrics.stats(engine)
+    assert stats["in_use"] == 0 and stats["checkouts"] == 1 and stats["wait_ms_max"] >= 0
+    engine.dispose()
+
+
+def test_db_stats_endpoint(client):
+    client.get("/api/reports")
+    stats = client.get("/api/db/stats").json()
+    assert stats["async"]["checkouts"] >= 1
+    assert set(stats) == {"sync", "async"}
@@ -0,0 +1,111 @@
+import datetime
+
+from sqlalchemy import event, select, text
+
+import database
+import duplicates
+import models
+
+
+def file_report(client, user_id, title, description, location):
+    return client.post("/api/reports", json={"title": title, "description": description, "location": location,
+                                             "tags": [], "user_id": user_id}).json()
+
+
+def test_shingles_tolerate_small_differences():
+    a = duplicates.text_shingles("Huge pothole near the bus stop", "Deep pothole, two bikes fell")
+    b = duplicates.text_shingles("Huge pot hole at bus stop", "deep potholes - two bikes fell!")
+    assert duplicates.jaccard(a, b) > 0.5
+    assert duplicates.jaccard(a, duplicates.text_shingles("Streetlight not working", "Dark all night")) < 0.1
+    keys = duplicates.bucket_keys("Huge pothole", "Deep", "FC Road")
+    assert len(keys) == duplicates.DUPLICATE_BANDS and keys == duplicates.bucket_keys("Huge pothole", "Deep", "FC Road")
+
+
+def test_new_reports_return_likely_duplicates(client, db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    first = file_report(client, user_id, "Huge pothole near the bus stop", "Deep pothole, two bikes fell today",
+                        "FC Road, Shivajinagar")
+    assert first["duplicates"] == []
+
+    again = file_report(client, user_id, "Huge pot hole at bus stop", "deep potholes - two bikes fell",
+                        "F.C. Road Shivajinagar")
+    assert [d["id"] for d in again["duplicates"]] == [first["id"]]
+    assert 0.5 <= again["duplicates"][0]["similarity"] < 1
+
+    # Same complaint elsewhere, or another complaint here, isn't a duplicate
+    assert file_report(client, user_id, "Huge pothole near the bus stop", "Deep pothole, two bikes fell today",
+                       "Baner Road, Aundh")["duplicates"] == []
+    assert file_report(client, user_id, "Streetlight not working", "Dark near the bus stop all night",
+                       "FC Road, Shivajinagar")["duplicates"] == []
+
+    check = {"title": "Huge pothole near bus stop", "description": "Deep pothole, bikes fell",
+             "location": "FC Road, Shivajinagar"}
+    assert {d["id"] for d in client.post("/api/reports/duplicates", json=check).json()} == {first["id"], again["id"]}
+
+    # Resolved and old reports drop out
+    client.put(f"/api/reports/{first['id']}/resolve", json={"resolution_desc": "Filled"})
+    db_session.rollback()
+    db_session.execute(text("UPDATE reports SET created_at = :old WHERE id = :id"),
+                       {"old": datetime.datetime.utcnow() - datetime.timedelta(days=60), "id": again["id"]})
+    db_session.commit()
+    assert client.post("/api/reports/duplicates", json=check).json() == []
+    assert db_session.scalar(select(models.ReportLSHBucket.report_id)
+                             .where(models.ReportLSHBucket.report_id == first["id"])) is None
+
+
+def test_rebuild_matches_incremental_buckets(client, db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    for title in ("Garbage not collected", "Sewage overflow", "Garbage pile near market"):
+        file_report(client, user_id, title, "For a week now", "Market Yard")
+    resolved = file_report(client, user_id, "Fallen tree", "Blocking the road", "Market Yard")["id"]
+    client.put(f"/api/reports/{resolved}/resolve", json={"resolution_desc": "Cleared"})
+
+    def rows():
+        db_session.rollback()
+        return sorted(db_session.execute(select(duplicates.buckets)).all())
+
+    incremental = rows()
+    assert len(incremental) == 3 * duplicates.DUPLICATE_BANDS
+    duplicates.rebuild(db_session)
+    assert rows() == incremental
+
+
+def test_duplicate_check_runs_before_the_write_transaction(client, make_user):
+    user_id = make_user("Asha", "Pune").id
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        file_report(client, user_id, "Huge pothole", "Near the bus stop", "FC Road")
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    # The candidate lookup reads before the write lock is taken
+    lookup = next(i for i, statement in enumerate(statements)
+                  if statement.lstrip().startswith("SELECT") and "report_lsh_buckets" in statement)
+    assert lookup < statements.index("BEGIN IMMEDIATE")
+
+
+def test_prune_drops_reports_older_than_the_window(client, db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    ids = [file_report(client, user_id, title, "For a week now", "Market Yard")["id"]
+           for title in ("Garbage not collected", "Sewage overflow", "Broken bench")]
+    db_session.rollback()
+    now = datetime.datetime.utcnow()
+    for report_id, days in ((ids[0], 45), (ids[1], 40)):
+        db_session.execute(text("UPDATE reports SET created_at = :old WHERE id = :id"),
+                           {"old": now - datetime.timedelta(days=days), "id": report_id})
+    db_session.commit()
+
+    def indexed():
+        db_session.rollback()
+        return set(db_session.scalars(select(duplicates.buckets.c.report_id).distinct()))
+
+    # Only reports created since `after` are looked at; the previous run covered the older ones
+    after = duplicates.prune(db_session, now=now, after=now - datetime.timedelta(days=42))
+    assert after == now - datetime.timedelta(days=duplicates.DUPLICATE_WINDOW_DAYS)
+    assert indexed() == {ids[0], ids[2]}
+    duplicates.prune(db_session, now=now, batch_size=1)
+    assert indexed() == {ids[2]}
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+
+import feed_updates
+import pubsub
+
+
+def test_broker_topics_and_backpressure():
+    async def scenario():
+        broker = pubsub.Broker(queue_size=3)
+        await broker.start()
+        pune = broker.subscribe(["district:pune"])
+        both = broker.subscribe(["district:pune", "reports"])
+        broker.publish(["reports", "district:pune"], {"n": 1})
+        assert json.loads(await pune.get()) == {"n": 1}
+        # Subscribed to both topics, delivered once
+        assert json.loads(await both.get()) == {"n": 1} and both.queue.empty()
+
+        # From the threadpool, as sync endpoints publish
+        thread = threading.Thread(target=broker.publish, args=(["reports"], {"n": 2}))
+        thread.start()
+        thread.join()
+        assert json.loads(await asyncio.wait_for(both.get(), 1)) == {"n": 2}
+
+        for n in range(5):
+            broker.publish(["district:pune"], {"n": n})
+        # Fell behind: the backlog is replaced by a resync marker, then new messages follow
+        assert await pune.get() == pubsub.RESYNC
+        assert json.loads(await pune.get()) == {"n": 4}
+        assert broker.stats()["overflows"] >= 1
+
+        broker.unsubscribe(pune)
+        broker.unsubscribe(both)
+        assert broker.stats()["subscriptions"] == 0
+        await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_vote_updates_are_coalesced(monkeypatch):
+    published = []
+    monkeypatch.setattr(feed_updates, "publish", lambda event, district=None: published.append(event))
+
+    async def scenario():
+        updates = feed_updates.VoteUpdates(interval=0.05)
+        for votes in range(1, 101):
+            updates.update(7, votes, "Pune")
+        updates.update(8, 1, "Pune")
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert published == [{"type": "report.voted", "id": 7, "votes": 100}, {"type": "report.voted", "id": 8, "votes": 1}]
+
+
+def test_feed_deltas_over_websocket(client, monkeypatch, make_user):
+    monkeypatch.setattr(feed_updates.votes, "interval", 0)
+    pune = make_user("Asha", "Pune").id
+    mumbai = make_user("Ravi", "Mumbai").id
+
+    with client.websocket_connect("/ws/reports?district=Pune") as local, client.websocket_connect("/ws/reports") as all_:
+        client.post("/api/reports", json={"title": "Flooding", "description": "d", "location": "Dadar",
+                                          "tags": [], "user_id": mumbai})
+        report_id = client.post("/api/reports", json={"title": "Pothole", "description": "d", "location": "FC Road",
+                                                      "tags": ["Road"], "user_id": pune}).json()["id"]
+
+        assert json.loads(all_.receive_text())["report"]["title"] == "Flooding"
+        created = json.loads(local.receive_text())
+        assert created["type"] == "report.created"
+        assert created["report"]["id"] == report_id and created["report"]["tags"] == ["Road"]
+        assert created["report"]["owner"] == "Asha"
+
+        client.post(f"/api/reports/{report_id}/vote")
+        assert json.loads(local.receive_text()) == {"type": "report.voted", "id": report_id, "votes": 1}
+
+        client.post(f"/api/reports/{report_id}/comments", json={"text": "Same here", "user_id": mumbai})
+        comment = json.loads(local.receive_text())
+        assert comment["type"] == "comment.added" and comment["comment"]["user_name"] == "Ravi"
+
+        client.put(f"/api/reports/{report_id}/resolve", json={"resolution_desc": "Filled"})
+        resolved = json.loads(local.receive_text())
+        assert resolved["type"] == "report.resolved" and resolved["resolution_desc"] == "Filled"
+
+        # The unfiltered subscriber saw everything, in order
+        assert [json.loads(all_.receive_text())["type"] for _ in range(4)] == [
+            "report.created", "report.voted", "comment.added", "report.resolved"]
+
+    assert client.get("/api/feed/stats").json()["subscriptions"] == 0
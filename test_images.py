@@ -0,0 +1,90 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+import images
+import uploads
+
+
+def photo_with_exif(width=3000, height=1500):
+    exif = Image.Exif()
+    exif[0x0110] = "Phone X"  # Model
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def variant_file(url):
+    return os.path.join(uploads.UPLOAD_DIR, url[len("/uploads/"):])
+
+
+def test_process_writes_oriented_webp_variants_without_exif():
+    url = uploads.save_stream(io.BytesIO(photo_with_exif()))
+    # Not processed yet: every variant is the original
+    assert images.variant_urls(url) == {variant: url for variant in images.IMAGE_VARIANTS}
+
+    assert images.process(url) is True
+    variants = images.variant_urls(url)
+    assert set(variants) == set(images.IMAGE_VARIANTS)
+    for variant, size in images.IMAGE_VARIANTS.items():
+        with Image.open(variant_file(variants[variant])) as image:
+            assert image.format == "WEBP"
+            # Portrait after applying the orientation, scaled down to fit
+            assert image.size == (size // 2, size)
+            assert not image.getexif()
+
+    # Same content again: already done
+    assert images.process(url) is False
+
+
+def test_process_skips_small_images_and_bad_files():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (40, 20), (0, 0, 0, 0)).save(buffer, "PNG")
+    url = uploads.save_stream(io.BytesIO(buffer.getvalue()))
+    assert images.process(url)
+    with Image.open(variant_file(images.variant_urls(url)["full"])) as image:
+        # Never enlarged, transparency kept
+        assert image.size == (40, 20) and image.mode == "RGBA"
+
+    # Uploads that don't decode are rejected; one saved before that was checked is logged and skipped
+    with open(os.path.join(uploads.UPLOAD_DIR, "broken.png"), "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+    broken = uploads.upload_url("broken.png")
+    assert images.process(broken) is False
+    assert images.variant_urls(broken)["thumb"] == broken
+    assert images.variant_urls(None) is None
+
+
+def test_readiness_is_cached_and_bounded(monkeypatch):
+    url = uploads.save_stream(io.BytesIO(photo_with_exif(40, 20)))
+    name = url.rsplit("/", 1)[1]
+    monkeypatch.setattr(images, "IMAGE_READINESS_CACHE_SIZE", 2)
+    monkeypatch.setattr(images, "IMAGE_PENDING_RECHECK_SECONDS", 60)
+    assert images.variant_urls(url)["thumb"] == url
+
+    # Processed by another worker: seen once the pending entry expires
+    images.process(url)
+    images._readiness[name] = time.monotonic()
+    assert images.variant_urls(url)["thumb"] == url
+    images._readiness[name] = time.monotonic() - 61
+    assert images.variant_urls(url)["thumb"].endswith("/thumb.webp")
+    for other in ("a.png", "b.png"):
+        images.is_processed(other)
+    assert list(images._readiness) == ["a.png", "b.png"]
+
+
+def test_report_upload_exposes_variants(client, make_user):
+    user = make_user()
+    response = client.post("/api/reports/form",
+                           data={"title": "Pothole", "description": "Deep", "location": "MG Road", "user_id": user.id},
+                           files={"image": ("photo.jpg", photo_with_exif(800, 600), "image/jpeg")})
+    assert response.status_code == 200
+
+    # TestClient runs background tasks before returning the response
+    report = client.get("/api/reports").json()[0]
+    assert report["image_variants"]["thumb"].endswith("/thumb.webp")
+    assert client.get(report["image_variants"]["medium"]).headers["content-type"] == "image/webp"
+    assert report["resolution_image_variants"] is None
@@ -0,0 +1,119 @@
+import datetime
+import sqlite3
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine
+
+import check_query_plans
+import duplicates
+import migrate
+import models
+
+
+def legacy_database(path):
+    """A database as the app created it before migrations: no location columns, comma separated tags."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, full_name VARCHAR, hashed_password VARCHAR,
+                            profile_image_path VARCHAR);
+        CREATE TABLE reports (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR, location VARCHAR,
+                              tags VARCHAR, status VARCHAR, created_at DATETIME, user_id INTEGER REFERENCES users (id),
+                              resolution_desc VARCHAR, resolution_image_path VARCHAR, resolved_at DATETIME,
+                              votes INTEGER);
+        CREATE TABLE comments (id INTEGER PRIMARY KEY, text VARCHAR, created_at DATETIME,
+                               user_id INTEGER REFERENCES users (id), report_id INTEGER REFERENCES reports (id));
+        CREATE TABLE sos_alerts (id INTEGER PRIMARY KEY, location VARCHAR, timestamp DATETIME,
+                                 user_id INTEGER REFERENCES users (id));
+        INSERT INTO users (id, email, full_name) VALUES (1, 'asha@example.com', 'Asha');
+        INSERT INTO reports (id, title, tags, user_id, votes) VALUES (1, 'a', 'Pothole,Road', 1, 0),
+                                                                     (2, 'b', 'Pothole, Pothole', 1, 0),
+                                                                     (3, 'c', NULL, 1, 0);
+    """)
+    conn.commit()
+    return conn
+
+
+def test_fresh_database_matches_models_and_uses_indexes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    migrate.upgrade(url=url)
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn, opts={"include_name": migrate.include_name})
+        assert context.get_current_revision() == migrate.head_revision()
+        assert compare_metadata(context, models.Base.metadata) == []
+
+    for name, (plan, scans) in check_query_plans.check(engine).items():
+        assert scans == [], f"{name}: {plan}"
+    engine.dispose()
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = legacy_database(path)
+    recent = {"title": "Huge pothole", "description": "Near the bus stop", "location": "FC Road",
+              "created_at": str(datetime.datetime.utcnow())}
+    conn.execute("UPDATE reports SET title = :title, description = :description, location = :location, "
+                 "created_at = :created_at WHERE id = 1", recent)
+    conn.commit()
+    migrate.upgrade(url=f"sqlite:///{path}")
+
+    assert conn.execute("SELECT role, state, district FROM users").fetchone() == ("citizen", "Maharashtra", "Pune")
+    assert dict(conn.execute("SELECT name, report_count FROM tags")) == {"Pothole": 2, "Road": 1}
+    assert conn.execute("SELECT COUNT(*) FROM report_tags").fetchone()[0] == 3
+    assert "tags" not in [row[1] for row in conn.execute("PRAGMA table_info(reports)")]
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(reports)")}
+    assert {"ix_reports_created_at_id", "ix_reports_votes_id"} <= indexes
+    assert conn.execute("SELECT district, status, reports FROM report_rollups").fetchall() == [("Pune", "Pending", 3)]
+    assert conn.execute("SELECT rowid FROM report_search WHERE report_search MATCH 'b'").fetchall() == [(2,)]
+    # Only the recent report gets buckets, the ones duplicates.py computes
+    assert set(conn.execute("SELECT bucket, report_id FROM report_lsh_buckets")) == {
+        (key, 1) for key in duplicates.bucket_keys(recent["title"], recent["description"], recent["location"])}
+
+    # Re-running is a no-op
+    migrate.upgrade(url=f"sqlite:///{path}")
+    conn.close()
+
+
+def test_tags_downgrade_restores_column(tmp_path):
+    from alembic import command
+
+    path = tmp_path / "legacy.db"
+    conn = legacy_database(path)
+    url = f"sqlite:///{path}"
+    migrate.upgrade(url=url)
+    command.downgrade(migrate.alembic_config(url), "0003")
+
+    assert dict(conn.execute("SELECT id, tags FROM reports")) == {1: "Pothole,Road", 2: "Pothole", 3: None}
+    conn.close()
+
+
+def test_location_backfill_leaves_authorities_alone(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = legacy_database(path)
+    migrate.upgrade("0002", url=f"sqlite:///{path}")
+    conn.execute("INSERT INTO users (id, full_name, role, department) VALUES (2, 'Officer', 'authority', 'Roads')")
+    conn.commit()
+    migrate.upgrade(url=f"sqlite:///{path}")
+
+    assert conn.execute("SELECT id, role, department, state FROM users ORDER BY id").fetchall() == [
+        (1, "citizen", None, "Maharashtra"), (2, "authority", "Roads", None)]
+    conn.close()
+
+
+def test_startup_refuses_an_out_of_date_schema(db_session):
+    migrate.stamp("0009")
+    with pytest.raises(RuntimeError, match="run python migrate.py"):
+        migrate.check_current()
+    migrate.stamp()
+    migrate.check_current()
+
+
+def test_plan_check_flags_index_walks_and_correlated_subqueries():
+    tables = {"reports", "tags"}
+    walk = "SCAN reports USING INDEX ix_reports_created_at_id"
+    plan = [walk, "CORRELATED SCALAR SUBQUERY 1", "SEARCH tags USING COVERING INDEX ix_tags_name (name=?)"]
+    assert check_query_plans.full_scans(plan, tables) == plan[:2]
+    assert check_query_plans.full_scans([walk, "SCAN anon_1"], tables, limited_walk=True) == []
+    assert check_query_plans.full_scans(["SCAN tags"], tables, limited_walk=True) == ["SCAN tags"]
@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+
+import news
+
+CIVIC_FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Civic</title>
+<item><title>Ward budget published</title><link>https://example.com/budget</link>
+<pubDate>Mon, 05 Oct 2026 09:00:00 GMT</pubDate><source url="https://example.com">City Times</source></item>
+<item><title>New RTI portal</title><link>https://example.com/rti</link>
+<pubDate>Wed, 07 Oct 2026 09:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+RIGHTS_FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Rights</title>
+<item><title>Court upholds right to protest</title><link>https://example.com/protest</link>
+<pubDate>Tue, 06 Oct 2026 09:00:00 GMT</pubDate></item>
+<item><title>New RTI portal</title><link>https://example.com/rti</link>
+<pubDate>Wed, 07 Oct 2026 09:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+
+class FeedServer:
+    """Local stand-in for the upstream feeds: serves fixed documents and honours If-None-Match."""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.requests = []
+        self.down = False
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.down:
+            raise httpx.ConnectError("upstream down", request=request)
+        body = self.feeds[request.url.path]
+        etag = f'"{hash(body)}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=body.encode(), headers={"ETag": etag})
+
+    def transport(self):
+        return httpx.MockTransport(self)
+
+
+def make_cache(server, **kwargs):
+    return news.NewsCache(feeds=["https://feeds.test/civic", "https://feeds.test/rights"],
+                          transport=server.transport(), **kwargs)
+
+
+def test_refresh_merges_feeds_newest_first():
+    cache = make_cache(FeedServer({"/civic": CIVIC_FEED, "/rights": RIGHTS_FEED}), limit=10)
+    asyncio.run(cache.refresh())
+    articles = cache.articles()
+    # Duplicates across feeds appear once
+    assert [a["title"] for a in articles] == ["New RTI portal", "Court upholds right to protest",
+                                              "Ward budget published"]
+    assert articles[2]["source"] == "City Times" and articles[1]["source"] == "Google News"
+
+
+def test_conditional_fetch_and_stale_while_revalidate():
+    server = FeedServer({"/civic": CIVIC_FEED, "/rights": RIGHTS_FEED})
+    cache = make_cache(server)
+    asyncio.run(cache.refresh())
+    first = cache.articles()
+
+    asyncio.run(cache.refresh())
+    assert all(r.headers.get("if-none-match") for r in server.requests[2:])
+    assert [feed.not_modified for feed in cache.feeds] == [1, 1]
+    assert cache.articles() == first
+
+    server.down = True
+    asyncio.run(cache.refresh())
+    # Upstream failures keep the last good articles
+    assert cache.articles() == first
+    assert all(feed["error"] for feed in cache.stats()["feeds"])
+
+
+def test_unexpected_errors_do_not_stop_the_refresher(monkeypatch):
+    server = FeedServer({"/civic": CIVIC_FEED, "/rights": RIGHTS_FEED})
+    cache = news.NewsCache(feeds=["https://feeds.test/civic", "https://feeds.test/missing"],
+                           transport=server.transport(), refresh_seconds=0)
+    asyncio.run(cache.refresh())
+    # The stand-in server raises KeyError for the unknown feed, not an httpx error; only that feed fails
+    assert [a["title"] for a in cache.articles()] == ["New RTI portal", "Ward budget published"]
+    assert cache.stats()["feeds"][1]["error"]
+
+    def broken_parser(content):
+        raise RuntimeError("parser bug")
+
+    monkeypatch.setattr(news, "parse_articles", broken_parser)
+    server.feeds["/civic"] = RIGHTS_FEED
+    asyncio.run(cache.refresh())
+    assert cache.stats()["feeds"][0]["error"] == "parser bug" and len(cache.articles()) == 2
+
+    calls = []
+
+    async def flaky_refresh():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(cache, "refresh", flaky_refresh)
+    try:
+        asyncio.run(cache.run())
+    except asyncio.CancelledError:
+        pass
+    assert len(calls) == 3
+
+
+def test_news_endpoint_serves_from_memory(client, monkeypatch):
+    server = FeedServer({"/civic": CIVIC_FEED, "/rights": RIGHTS_FEED})
+    cache = make_cache(server, limit=2)
+    asyncio.run(cache.refresh())
+    monkeypatch.setattr(news, "cache", cache)
+
+    fetched = len(server.requests)
+    for _ in range(5):
+        response = client.get("/api/news")
+    assert [a["link"] for a in response.json()] == ["https://example.com/rti", "https://example.com/protest"]
+    assert len(server.requests) == fetched
+    assert cache.stats()["refreshes"] == 1
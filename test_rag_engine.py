@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+from langchain.embeddings import Embeddings
+
+from answer_cache import AnswerCache
+import rag_chat
+from rag_chat import RAGEngine
+from vector_index import build_vectorstore, save_vectorstore
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings so tests never call Gemini."""
+
+    dim = 64
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            bucket = int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return FakeResponse("answer")
+
+
+TEXTS = [
+    "Article 21 protects life and personal liberty",
+    "Article 19 guarantees freedom of speech and expression",
+    "The Right to Information Act gives citizens access to records",
+]
+
+
+def build_index(path, texts=TEXTS):
+    embeddings = FakeEmbeddings()
+    ids = [f"id-{i}" for i in range(len(texts))]
+    vectorstore, params = build_vectorstore(embeddings, embeddings.embed_documents(texts), texts, [{}] * len(texts), ids)
+    save_vectorstore(vectorstore, str(path), "flat", params)
+
+
+def test_engine_loads_index_once(tmp_path, monkeypatch):
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=FakeModel())
+    assert engine.load()
+
+    loads = []
+    monkeypatch.setattr(rag_chat, "load_vectorstore", lambda *a, **kw: loads.append(a))
+    assert engine.answer("what is article 21") == "answer"
+    assert engine.answer("freedom of speech") == "answer"
+    assert loads == []
+
+    stats = engine.stats()
+    assert stats["index_size"] == 3
+    assert stats["queries"] == 2
+    assert stats["load_seconds"] is not None
+
+
+def test_engine_reload_swaps_index(tmp_path):
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path, TEXTS[:1])
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=FakeModel())
+    engine.load()
+    old_store = engine.vectorstore
+    assert engine.stats()["index_size"] == 1
+
+    build_index(index_path)
+    engine.reload()
+    assert engine.vectorstore is not old_store
+    assert engine.stats()["index_size"] == 3
+
+
+def test_engine_without_index(tmp_path):
+    engine = RAGEngine(str(tmp_path / "missing"), embeddings=FakeEmbeddings(), model=FakeModel())
+    assert not engine.load()
+    assert engine.answer("hello") == "System not initialized. Please run ingestion first."
+
+
+class SlowAsyncModel:
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return FakeResponse("slow answer")
+
+
+def test_chat_does_not_block_other_endpoints(tmp_path, monkeypatch, db_session):
+    import main
+
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=SlowAsyncModel(1.0), max_concurrency=2)
+    engine.load()
+    monkeypatch.setattr(rag_chat, "engine", engine)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            chats = [asyncio.create_task(client.post("/api/chat", json={"query": "article 21"})) for _ in range(4)]
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            reports = await client.get("/api/reports")
+            reports_latency = time.perf_counter() - start
+            replies = await asyncio.gather(*chats)
+        return reports, reports_latency, replies
+
+    reports, reports_latency, replies = asyncio.run(scenario())
+    assert reports.status_code == 200
+    assert reports_latency < 0.5
+    assert all(r.json() == {"reply": "slow answer"} for r in replies)
+    assert engine.model.peak == 2
+
+
+def test_chat_timeout(tmp_path, monkeypatch):
+
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=SlowAsyncModel(1.0))
+    engine.load()
+    monkeypatch.setattr(rag_chat, "engine", engine)
+
+    reply = asyncio.run(rag_chat.achat_with_rag("article 21", timeout=0.05))
+    assert reply.startswith("Error: The assistant took too long")
+
+
+class FakeStream:
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for part in self.parts:
+            yield FakeResponse(part)
+
+
+class StreamingModel:
+    async def generate_content_async(self, prompt, stream=False):
+        if stream:
+            return FakeStream(["Article 21 ", "protects ", "life."])
+        return FakeResponse("Article 21 protects life.")
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_sends_context_then_tokens(tmp_path, monkeypatch):
+    import main
+
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=StreamingModel())
+    engine.load()
+    monkeypatch.setattr(rag_chat, "engine", engine)
+
+    with TestClient(main.app) as client:
+        response = client.post("/api/chat/stream", json={"query": "article 21 liberty"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    assert events[0][0] == "context"
+    assert len(events[0][1]["sources"]) == 3
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert "".join(tokens) == "Article 21 protects life."
+    assert events[-1][0] == "done"
+
+
+def test_answer_cache_exact_and_semantic_hits(tmp_path):
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    model = FakeModel()
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=model,
+                       cache=AnswerCache(similarity_threshold=0.9))
+    engine.load()
+
+    engine.answer("What is  Article 21")
+    engine.answer("what is article 21")
+    engine.answer("what is article 21 ?!")
+    engine.answer("article 21 what is")  # same bag of words -> semantic hit
+    assert len(model.prompts) == 1
+
+    stats = engine.stats()["cache"]
+    assert stats["exact_hits"] == 2
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 1
+
+    engine.reload()
+    engine.answer("what is article 21")
+    assert len(model.prompts) == 2
+
+
+def test_answer_cache_eviction():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", [1.0, 0.0], "A")
+    cache.put("b", [0.0, 1.0], "B")
+    assert cache.get_exact("a") == "A"
+    cache.put("c", [1.0, 1.0], "C")
+    assert cache.get_exact("b") is None
+    assert cache.get_exact("a") == "A"
+
+    expired = AnswerCache(ttl_seconds=-1)
+    expired.put("a", [1.0, 0.0], "A")
+    assert expired.get_exact("a") is None
+    assert expired.get_similar([1.0, 0.0]) is None
+
+
+def test_answer_cache_drops_puts_from_before_a_reload(tmp_path):
+    index_path = tmp_path / "faiss_index"
+    build_index(index_path)
+    model = FakeModel()
+    engine = RAGEngine(str(index_path), embeddings=FakeEmbeddings(), model=model)
+    engine.load()
+
+    generate = model.generate_content
+    model.generate_content = lambda prompt: engine.reload() and generate(prompt)
+    engine.answer("what is article 21")
+    assert engine.stats()["cache"]["entries"] == 0
+
+    model.generate_content = generate
+    engine.answer("what is article 21")
+    assert engine.stats()["cache"]["entries"] == 1
+
+
+def test_answer_cache_appends_rows_and_expires_oldest_first(monkeypatch):
+    import answer_cache
+
+    def direction(i):
+        return [math.cos(i / 10), math.sin(i / 10)]
+
+    now = [0.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(max_entries=40, ttl_seconds=10, similarity_threshold=0.999)
+    for i in range(30):
+        now[0] = i
+        cache.put(f"q{i}", direction(i), i)
+    matrix = cache._matrix
+    cache.put("q30", direction(30), 30)
+    assert cache._matrix is matrix  # appended in place, not rebuilt
+
+    assert cache.get_exact("q20") == 20  # recently used, but put before q21..q29
+    now[0] = 30.5
+    assert cache.get_similar(direction(20)) is None
+    assert sorted(cache._rows) == sorted(f"q{i}" for i in range(21, 31))
+    assert cache.get_similar(direction(25)) == 25
+    cache.put("q29", direction(50), "new")
+    assert cache.get_similar(direction(29)) is None
+    assert cache.get_similar(direction(50)) == "new"
@@ -0,0 +1,180 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from chunk_store import ChunkStore
+from rag_chat import source_filter
+from rag_ingest import BatchEmbedder, ingest_data
+from vector_index import load_vectorstore
+from test_rag_engine import FakeEmbeddings
+
+
+class FakeEmbedFn:
+    """Local stand-in for the Gemini batch embedding call."""
+
+    def __init__(self, fail_on_call=None, rate_limit_on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+        self.rate_limit_on_call = rate_limit_on_call
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        call = len(self.calls)
+        if call == self.fail_on_call:
+            raise RuntimeError("connection dropped")
+        if call == self.rate_limit_on_call:
+            raise google_exceptions.ResourceExhausted("quota")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+TEXTS = [f"chunk number {i}" for i in range(25)]
+
+
+def test_embeds_in_batches_and_preserves_order():
+    embed_fn = FakeEmbedFn()
+    embedder = BatchEmbedder(embed_fn=embed_fn, batch_size=10, concurrency=3)
+    vectors = embedder.embed(TEXTS + TEXTS[:5])
+
+    assert sorted(len(call) for call in embed_fn.calls) == [5, 10, 10]
+    assert vectors == [[float(len(text)), 1.0] for text in TEXTS + TEXTS[:5]]
+    assert embedder.stats["embedded"] == 25
+    assert embedder.stats["chunks_per_sec"] > 0
+
+
+def test_retries_after_rate_limit():
+    embed_fn = FakeEmbedFn(rate_limit_on_call=1)
+    embedder = BatchEmbedder(embed_fn=embed_fn, batch_size=25, concurrency=1, backoff_seconds=0.01)
+    vectors = embedder.embed(TEXTS)
+
+    assert len(embed_fn.calls) == 2
+    assert len(vectors) == 25
+
+
+def test_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / "chunks.sqlite"
+    failing = FakeEmbedFn(fail_on_call=2)
+    embedder = BatchEmbedder(embed_fn=failing, batch_size=10, concurrency=1, checkpoint=ChunkStore(str(path)))
+    with pytest.raises(RuntimeError):
+        embedder.embed(TEXTS)
+
+    checkpoint = ChunkStore(str(path))
+    assert checkpoint.embedding_count() == 10
+
+    embed_fn = FakeEmbedFn()
+    embedder = BatchEmbedder(embed_fn=embed_fn, batch_size=10, concurrency=1, checkpoint=checkpoint)
+    vectors = embedder.embed(TEXTS)
+    assert sum(len(call) for call in embed_fn.calls) == 15
+    assert embedder.stats["resumed"] == 10
+    assert len(vectors) == 25
+
+
+def make_pdf(path, pages):
+    """Write a minimal text-only PDF with one page per string."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 10 Tf 20 800 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    path.write_bytes(out.encode("latin-1"))
+
+
+def test_incremental_ingestion(tmp_path):
+    pdf = tmp_path / "act.pdf"
+    index_path = str(tmp_path / "faiss_index")
+    store_path = str(tmp_path / "chunks.sqlite")
+    pages = ["Article 21 protects life", "Article 19 protects speech", "Article 14 ensures equality"]
+    make_pdf(pdf, pages)
+
+    embed_fn = FakeEmbedFn()
+    stats = ingest_data(str(pdf), index_path, embed_fn=embed_fn, store_path=store_path)
+    assert stats["added"] == 3 and stats["embedded"] == 3
+
+    embed_fn = FakeEmbedFn()
+    stats = ingest_data(str(pdf), index_path, embed_fn=embed_fn, store_path=store_path)
+    assert stats["added"] == 0 and stats["removed"] == 0
+    assert embed_fn.calls == []
+
+    make_pdf(pdf, [pages[0], pages[1], "Article 14A ensures equality before law"])
+    embed_fn = FakeEmbedFn()
+    stats = ingest_data(str(pdf), index_path, embed_fn=embed_fn, store_path=store_path)
+    assert stats["added"] == 1 and stats["removed"] == 1
+    assert embed_fn.calls == [["Article 14A ensures equality before law"]]
+
+    vectorstore, _, _ = load_vectorstore(index_path, FakeEmbeddings())
+    texts = sorted(vectorstore.docstore.search(i).page_content for i in vectorstore.index_to_docstore_id.values())
+    assert texts == sorted([pages[0], pages[1], "Article 14A ensures equality before law"])
+
+
+def test_ingests_directory_with_source_metadata(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    make_pdf(corpus / "constitution.pdf", ["Article 21 protects life", "Article 19 protects speech"])
+    make_pdf(corpus / "rti_rules.pdf", ["Information must be supplied within thirty days"])
+    index_path = str(tmp_path / "faiss_index")
+    store_path = str(tmp_path / "chunks.sqlite")
+
+    stats = ingest_data(str(corpus), index_path, embed_fn=FakeEmbedFn(), store_path=store_path, workers=2)
+    assert stats["pages"] == 3 and stats["added"] == 3
+    assert set(stats["timings"]) == {"load", "split", "embed", "index"}
+
+    vectorstore, _, _ = load_vectorstore(index_path, FakeEmbeddings())
+    docs = vectorstore.similarity_search_by_vector([40.0, 1.0], k=3, filter=source_filter(["rti_rules.pdf"]))
+    assert [doc.metadata["document"] for doc in docs] == ["rti_rules.pdf"]
+    assert docs[0].metadata["page"] == 0
+
+    (corpus / "rti_rules.pdf").unlink()
+    stats = ingest_data(str(corpus), index_path, embed_fn=FakeEmbedFn(), store_path=store_path, workers=2)
+    assert stats["removed"] == 1 and stats["added"] == 0
+
+
+def test_hnsw_index_rebuilds_on_removal(tmp_path):
+    pdf = tmp_path / "act.pdf"
+    index_path = str(tmp_path / "faiss_index")
+    store_path = str(tmp_path / "chunks.sqlite")
+    make_pdf(pdf, ["Article 21 protects life", "Article 19 protects speech"])
+    ingest_data(str(pdf), index_path, embed_fn=FakeEmbedFn(), store_path=store_path, index_kind="hnsw")
+
+    make_pdf(pdf, ["Article 21 protects life"])
+    stats = ingest_data(str(pdf), index_path, embed_fn=FakeEmbedFn(), store_path=store_path, index_kind="hnsw")
+    assert stats["removed"] == 1
+
+    vectorstore, kind, _ = load_vectorstore(index_path, FakeEmbeddings())
+    assert kind == "hnsw"
+    assert vectorstore.index.ntotal == 1
+
+
+def test_emptied_corpus_removes_the_index(tmp_path):
+    from rag_chat import RAGEngine
+    from test_rag_engine import FakeModel
+
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    make_pdf(corpus / "constitution.pdf", ["Article 21 protects life", "Article 19 protects speech"])
+    index_path = str(tmp_path / "faiss_index")
+    store_path = str(tmp_path / "chunks.sqlite")
+    ingest_data(str(corpus), index_path, embed_fn=FakeEmbedFn(), store_path=store_path)
+    engine = RAGEngine(index_path, embeddings=FakeEmbeddings(), model=FakeModel())
+    assert engine.load()
+
+    (corpus / "constitution.pdf").unlink()
+    stats = ingest_data(str(corpus), index_path, engine=engine, embed_fn=FakeEmbedFn(), store_path=store_path)
+    assert stats["removed"] == 2
+    assert not (tmp_path / "faiss_index").exists()
+    store = ChunkStore(store_path)
+    assert store.chunk_ids() == set()
+    store.close()
+    assert not engine.ready
+    assert engine.answer("article 21") == "System not initialized. Please run ingestion first."
@@ -0,0 +1,194 @@
+import contextlib
+import datetime
+
+from sqlalchemy import event
+
+import database
+import models
+import tags
+
+
+def add_reports(db, user, count, start=None, **fields):
+    start = start or datetime.datetime(2026, 1, 1)
+    reports = []
+    for i in range(count):
+        report = models.Report(
+            title=f"Report {i}",
+            description="Pothole near the bus stand",
+            location="MG Road",
+            user_id=user.id,
+            created_at=start + datetime.timedelta(minutes=i),
+            votes=i % 5,
+            **fields,
+        )
+        db.add(report)
+        tags.tag_report(db, report, ["Pothole", "Road"])
+        reports.append(report)
+    db.commit()
+    return reports
+
+
+def add_comments(db, reports, users, per_report):
+    for report in reports:
+        for i in range(per_report):
+            db.add(models.Comment(text=f"Comment {i}", report_id=report.id, user_id=users[i % len(users)].id,
+                                  created_at=report.created_at + datetime.timedelta(seconds=i)))
+    db.commit()
+
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if not statement.startswith("BEGIN"):
+            statements.append(statement)
+
+    engines = [database.engine, database.async_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
+
+def fetch_all(client, **params):
+    ids, cursor = [], None
+    while True:
+        response = client.get("/api/reports", params=dict(params, cursor=cursor) if cursor else params)
+        assert response.status_code == 200
+        ids.extend(r["id"] for r in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+def test_recent_feed_pages_with_cursor(client, db_session, make_user):
+    user = make_user()
+    reports = add_reports(db_session, user, 25)
+
+    first = client.get("/api/reports", params={"limit": 10})
+    assert [r["id"] for r in first.json()] == [r.id for r in reversed(reports)][:10]
+    assert first.headers["X-Next-Cursor"]
+
+    assert fetch_all(client, limit=10) == [r.id for r in reversed(reports)]
+
+
+def test_votes_sort_and_filters(client, db_session, make_user):
+    pune = make_user()
+    nashik = make_user("Ravi", district="Nashik")
+    add_reports(db_session, pune, 12)
+    add_reports(db_session, nashik, 3, status="Resolved")
+
+    ids = fetch_all(client, sort="votes", limit=4)
+    votes = {r.id: r.votes for r in db_session.query(models.Report)}
+    assert [votes[i] for i in ids] == sorted(votes.values(), reverse=True)
+    assert len(ids) == 15
+
+    assert len(fetch_all(client, district="Nashik")) == 3
+    assert len(fetch_all(client, status="Pending", owner_id=pune.id)) == 12
+    assert len(fetch_all(client, tag="Road")) == 15
+    assert fetch_all(client, tag="Roa") == []
+    assert len(fetch_all(client, location="mg road")) == 15
+
+
+def test_tag_filter_reads_the_tag_index(client, db_session, monkeypatch, make_user):
+    import check_query_plans
+    import feed
+
+    user = make_user()
+    reports = add_reports(db_session, user, 6)
+    lamp = models.Report(title="Streetlight out", description="Dark", location="MG Road", user_id=user.id,
+                         created_at=datetime.datetime(2025, 1, 1))
+    db_session.add(lamp)
+    tags.tag_report(db_session, lamp, ["Streetlight"])
+    db_session.commit()
+    with database.engine.connect() as conn:
+        plan = check_query_plans.explain(conn, feed.feed_query(tag="Streetlight", tag_reports=1))
+    assert any("ix_report_tags_tag_id_report_id (tag_id=?)" in line for line in plan), plan
+    assert not any("CORRELATED" in line for line in plan), plan
+
+    assert fetch_all(client, tag="Streetlight") == [lamp.id]
+    # Common tags walk the feed order instead, with the same results
+    expected = fetch_all(client, tag="Road", limit=4)
+    monkeypatch.setattr(feed, "FEED_COMMON_TAG_REPORTS", 1)
+    assert fetch_all(client, tag="Road", limit=4) == expected == [r.id for r in reversed(reports)]
+    assert fetch_all(client, tag="Streetlight") == [lamp.id]
+
+
+def test_page_size_is_capped_and_bad_cursor_rejected(client, db_session, monkeypatch, make_user):
+    import feed
+
+    monkeypatch.setattr(feed, "FEED_MAX_PAGE_SIZE", 5)
+    add_reports(db_session, make_user(), 8)
+    assert len(client.get("/api/reports", params={"limit": 50}).json()) == 5
+    assert client.get("/api/reports", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_feed_query_count_does_not_grow_with_data(client, db_session, make_user):
+    users = [make_user(f"User{i}") for i in range(4)]
+    counts = {}
+    for mode in ("all", "top", "count"):
+        counts[mode] = []
+        for reports, per_report in ((2, 1), (20, 6)):
+            add_comments(db_session, add_reports(db_session, users[0], reports), users, per_report)
+            with count_queries() as statements:
+                response = client.get("/api/reports", params={"limit": 50, "comments": mode})
+            assert response.status_code == 200
+            counts[mode].append(len(statements))
+        assert counts[mode][0] == counts[mode][1]
+    assert 0 < counts["all"][0] <= 4
+
+
+def test_comment_modes(client, db_session, make_user):
+    users = [make_user(f"User{i}") for i in range(2)]
+    report = add_reports(db_session, users[0], 1)[0]
+    add_comments(db_session, [report], users, 5)
+
+    full = client.get("/api/reports").json()[0]
+    assert [c["text"] for c in full["comments"]] == [f"Comment {i}" for i in range(5)]
+    assert full["comments"][1]["user_name"] == "User1"
+    assert full["comment_count"] == 5
+
+    top = client.get("/api/reports", params={"comments": "top"}).json()[0]
+    assert [c["text"] for c in top["comments"]] == ["Comment 2", "Comment 3", "Comment 4"]
+    assert top["comment_count"] == 5
+
+    counted = client.get("/api/reports", params={"comments": "count"}).json()[0]
+    assert counted["comments"] == [] and counted["comment_count"] == 5
+
+
+def test_create_report_tags_and_trending(client, make_user):
+    user = make_user()
+    for tag_list in (["Pothole", "Road"], ["Pothole", " Pothole ", ""], ["Streetlight"]):
+        response = client.post("/api/reports", json={"title": "t", "description": "d", "location": "MG Road",
+                                                     "tags": tag_list, "user_id": user.id})
+        assert response.status_code == 200
+
+    feed_tags = [r["tags"] for r in client.get("/api/reports").json()]
+    assert feed_tags == [["Streetlight"], ["Pothole"], ["Pothole", "Road"]]
+    assert len(fetch_all(client, tag="Pothole")) == 2
+    assert client.get("/api/tags/trending", params={"limit": 2}).json() == [
+        {"name": "Pothole", "count": 2},
+        {"name": "Road", "count": 1},
+    ]
+    assert client.get("/api/tags/trending", params={"days": 1}).json()[0] == {"name": "Pothole", "count": 2}
+
+
+
+def test_vote_and_comment(client, db_session, make_user):
+    user = make_user()
+    report = add_reports(db_session, user, 1)[0]
+
+    assert client.post(f"/api/reports/{report.id}/vote").json() == {"votes": 1, "counted": True}
+    assert client.post(f"/api/reports/{report.id}/vote").json() == {"votes": 2, "counted": True}
+    assert client.post("/api/reports/999/vote").status_code == 404
+
+    comment = client.post(f"/api/reports/{report.id}/comments", json={"text": "Same here", "user_id": user.id}).json()
+    assert comment["text"] == "Same here" and comment["user_name"] == "Asha"
+    assert client.post("/api/reports/999/comments", json={"text": "x", "user_id": user.id}).status_code == 404
+
+    item = client.get("/api/reports").json()[0]
+    assert item["votes"] == 2 and item["comment_count"] == 1
@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+
+from sqlalchemy import select
+
+import database
+import models
+import rollups
+import voting
+
+
+def rollup_rows(db):
+    db.rollback()
+    return (sorted(tuple(row) for row in db.execute(select(rollups.rollups))),
+            sorted(tuple(row) for row in db.execute(select(rollups.daily))))
+
+
+def test_rollups_follow_creates_votes_and_resolutions(client, db_session, make_user):
+    pune = make_user("Asha", "Pune").id
+    mumbai = make_user("Ravi", "Mumbai").id
+    report = {"description": "d", "location": "l", "tags": []}
+    ids = [client.post("/api/reports", json=dict(report, title=f"Pothole {i}", user_id=pune)).json()["id"]
+           for i in range(3)]
+    client.post("/api/reports", json=dict(report, title="Flooding", user_id=mumbai))
+
+    for _ in range(4):
+        client.post(f"/api/reports/{ids[0]}/vote")
+    client.post(f"/api/reports/{ids[1]}/vote", json={"user_id": mumbai})
+    client.post(f"/api/reports/{ids[1]}/vote", json={"user_id": mumbai})  # not counted twice
+    client.put(f"/api/reports/{ids[1]}/resolve", json={"resolution_desc": "Filled"})
+    client.put(f"/api/reports/{ids[1]}/resolve", json={"resolution_desc": "Filled again"})
+
+    summary = client.get("/api/stats/summary").json()
+    assert summary["overall"]["total"] == 4 and summary["overall"]["resolved"] == 1
+    pune_stats = summary["districts"][0]
+    assert pune_stats["district"] == "Pune"
+    assert (pune_stats["pending"], pune_stats["resolved"], pune_stats["open_votes"]) == (2, 1, 4)
+    assert pune_stats["mean_resolve_hours"] is not None
+    assert client.get("/api/stats/summary?district=Mumbai").json()["overall"]["pending"] == 1
+
+    top = client.get("/api/stats/top-open?district=Pune&limit=1").json()
+    assert [r["id"] for r in top] == [ids[0]] and top[0]["votes"] == 4
+
+    today = client.get("/api/stats/series?days=7").json()[-1]
+    assert (today["created"], today["resolved"], today["votes"]) == (4, 1, 5)
+
+    # Incremental maintenance counts what a recount does. Resolve times differ (re-resolving moved resolved_at,
+    # the rollup keeps the first resolution) and so do daily votes (a recount only sees per-user votes).
+    incremental = rollup_rows(db_session)
+    rollups.rebuild(db_session)
+    rebuilt = rollup_rows(db_session)
+    assert [row[:4] for row in incremental[0]] == [row[:4] for row in rebuilt[0]]
+    assert [row[:4] for row in incremental[1]] == [row[:4] for row in rebuilt[1]]
+
+
+def test_buffered_vote_flush_updates_rollups(db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    report = models.Report(title="t", description="d", location="l", status="Pending", votes=0, user_id=user_id)
+    db_session.add(report)
+    db_session.commit()
+    buffer = voting.VoteBuffer(interval=1)
+
+    async def scenario():
+        for _ in range(3):
+            async with database.AsyncWriteSessionLocal() as db:
+                await voting.cast_vote(db, report.id, buffer=buffer)
+        await buffer.flush(database.AsyncWriteSessionLocal)
+
+    asyncio.run(scenario())
+    db_session.rollback()
+    assert db_session.get(models.ReportRollup, ("Pune", "Pending")).votes == 3
+
+
+def test_series_buckets():
+    assert rollups.bucket_start(datetime.date(2026, 10, 18), "week") == datetime.date(2026, 10, 12)
+    assert rollups.bucket_start(datetime.date(2026, 10, 18), "month") == datetime.date(2026, 10, 1)
+
+
+def test_series_by_week_includes_empty_buckets(db_session):
+    db_session.add_all([
+        models.DailyReportRollup(day=datetime.date(2026, 10, 13), district="Pune", created=2, resolved=1,
+                                 resolve_seconds=7200, votes=5),
+        models.DailyReportRollup(day=datetime.date(2026, 10, 15), district="Pune", created=1, resolved=1,
+                                 resolve_seconds=3600, votes=0),
+        models.DailyReportRollup(day=datetime.date(2026, 10, 15), district="Mumbai", created=4, resolved=0,
+                                 resolve_seconds=0, votes=1),
+    ])
+    db_session.commit()
+    series = rollups.series(db_session, "Pune", "week", days=14, today=datetime.date(2026, 10, 18))
+    assert [item["start"] for item in series] == [datetime.date(2026, 10, 5), datetime.date(2026, 10, 12)]
+    assert series[0]["created"] == 0
+    assert (series[1]["created"], series[1]["resolved"], series[1]["votes"]) == (3, 2, 5)
+    assert series[1]["mean_resolve_hours"] == 1.5
@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import text
+
+import models
+import search
+
+
+def create_report(client, user_id, title, description, location="Shivajinagar"):
+    return client.post("/api/reports", json={"title": title, "description": description, "location": location,
+                                             "tags": [], "user_id": user_id}).json()["id"]
+
+
+def test_query_terms():
+    assert search.terms('streetlight NEAR "bus"-stand*') == ["streetlight", "near", "bus", "stand"]
+    assert search.match_expression("sqlite", ["bus", "stan"]) == '"bus" "stan"'
+    assert search.match_expression("sqlite", ["bus", "stan"], prefix=True) == '"bus" "stan"*'
+    assert search.match_expression("postgresql", ["bus", "stan"], prefix=True) == "bus & stan:*"
+    with pytest.raises(search.InvalidQuery):
+        search.terms("*** ()")
+
+
+def test_search_ranks_snippets_and_pages(client, monkeypatch, make_user):
+    pune = make_user("Asha", "Pune").id
+    mumbai = make_user("Ravi", "Mumbai").id
+    in_title = create_report(client, pune, "Broken streetlight near bus stand", "Dark at night")
+    in_description = create_report(client, pune, "Dark road", "The streetlights near the bus stand are off")
+    other = create_report(client, mumbai, "Streetlight flickering by bus stand", "Flickers all evening",
+                          location="Dadar")
+    pothole = create_report(client, pune, "Pothole", "Deep pothole on the main road")
+
+    results = client.get("/api/search", params={"q": "streetlight bus stand"}).json()
+    # Stemming matches "streetlights"; a title match outranks a description match
+    assert {r["id"] for r in results} == {in_title, in_description, other}
+    assert results.index(next(r for r in results if r["id"] == in_title)) < \
+        results.index(next(r for r in results if r["id"] == in_description))
+    first = results[0]
+    assert "<mark>" in first["snippet"] and first["score"] > 0 and first["owner"] in ("Asha", "Ravi")
+
+    assert [r["id"] for r in client.get("/api/search", params={"q": "streetlight", "district": "Mumbai"}).json()] \
+        == [other]
+    # Search as you type: the last word may be a prefix
+    assert client.get("/api/search", params={"q": "potho"}).json() == []
+    assert [r["id"] for r in client.get("/api/search", params={"q": "potho", "prefix": True}).json()] == [pothole]
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "streetlight", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/search", params=params)
+        seen += [r["id"] for r in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [r["id"] for r in client.get("/api/search", params={"q": "streetlight"}).json()]
+
+    # Broad queries only rank their newest matches
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 2)
+    assert {r["id"] for r in client.get("/api/search", params={"q": "streetlight"}).json()} == {in_description, other}
+
+    assert client.get("/api/search", params={"q": "!!"}).status_code == 400
+    assert client.get("/api/search", params={"q": "road", "cursor": "junk"}).status_code == 400
+
+
+def test_index_follows_comments_and_edits(client, db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    report_id = create_report(client, user_id, "Garbage pile", "Not collected for a week")
+
+    def found(q):
+        return [r["id"] for r in client.get("/api/search", params={"q": q}).json()]
+
+    assert found("mosquitoes") == []
+    client.post(f"/api/reports/{report_id}/comments", json={"text": "Mosquitoes everywhere", "user_id": user_id})
+    client.post(f"/api/reports/{report_id}/comments", json={"text": "Smells too", "user_id": user_id})
+    assert found("mosquitoes") == [report_id] and found("smells") == [report_id]
+
+    # Status changes and votes leave the index alone; edits and deletes go through the triggers
+    client.put(f"/api/reports/{report_id}/resolve", json={"resolution_desc": "Cleared"})
+    assert found("garbage") == [report_id]
+    db_session.execute(text("DELETE FROM comments WHERE text = 'Smells too'"))
+    db_session.execute(text("UPDATE reports SET title = 'Waste dump' WHERE id = :id"), {"id": report_id})
+    db_session.commit()
+    assert found("smells") == [] and found("garbage") == [] and found("waste dump") == [report_id]
+    assert found("mosquitoes") == [report_id]
+
+    db_session.execute(text("DELETE FROM comments"))
+    db_session.execute(text("DELETE FROM reports"))
+    db_session.commit()
+    assert db_session.execute(text("SELECT COUNT(*) FROM report_search")).scalar() == 0
+
+
+def test_rebuild_indexes_existing_rows(db_session, make_user):
+    user_id = make_user("Asha", "Pune").id
+    report = models.Report(title="Water logging", description="Knee deep", location="Station road",
+                           user_id=user_id)
+    db_session.add(report)
+    db_session.flush()
+    db_session.add(models.Comment(text="Since Monday", report_id=report.id, user_id=user_id))
+    db_session.commit()
+    db_session.execute(text("DELETE FROM report_search"))
+    db_session.commit()
+
+    search.rebuild(db_session.connection())
+    db_session.commit()
+    row = db_session.execute(text("SELECT rowid, comments FROM report_search WHERE report_search MATCH 'monday'"))
+    assert row.all() == [(report.id, "Since Monday")]
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import models
+import sos_dispatch
+
+
+def signup(client, email, role="citizen", **region):
+    response = client.post("/api/auth/signup", json={"full_name": email.split("@")[0], "email": email,
+                                                     "password": "pw", "role": role, **region})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_geohash_and_neighborhood():
+    assert sos_dispatch.geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    cells = sos_dispatch.neighborhood(18.5204, 73.8567, 5)
+    assert len(cells) == 9 and sos_dispatch.geohash(18.5204, 73.8567, 5) in cells
+    # A point just across a cell edge is still in the neighborhood
+    dlat, _ = sos_dispatch.cell_size(5)
+    assert sos_dispatch.geohash(18.5204 + dlat * 0.9, 73.8567, 5) in cells
+
+
+def test_route_by_region_and_position():
+    index = sos_dispatch.AuthorityIndex()
+    index.add(1, "Maharashtra", "Pune", "Haveli")
+    index.add(2, "Maharashtra", "Pune")
+    index.add(3, "Maharashtra")
+    index.add(4, "Maharashtra", "Mumbai")
+    index.add(5, "Maharashtra", "Pune", "Mulshi")
+
+    assert index.route("maharashtra", "pune", "haveli") == {1, 2, 3}
+    # No sub-district known: everyone in the district
+    assert index.route("Maharashtra", "Pune") == {1, 2, 3, 5}
+    assert index.route() == set()
+
+    index.locate(4, 18.5204, 73.8567)
+    assert index.route("Maharashtra", "Pune", "Haveli", latitude=18.521, longitude=73.857) == {1, 2, 3, 4}
+    assert 4 not in index.route("Maharashtra", "Pune", "Haveli", latitude=19.07, longitude=72.87)
+    index.remove(4)
+    assert 4 not in index and index.route(latitude=18.521, longitude=73.857) == set()
+
+
+def test_sos_is_pushed_to_routed_authorities(client, db_session):
+    police = signup(client, "police@example.com", "authority", state="Maharashtra", district="Pune",
+                    sub_district="Haveli")
+    other = signup(client, "mumbai@example.com", "authority", state="Maharashtra", district="Mumbai")
+    citizen = signup(client, "asha@example.com", state="Maharashtra", district="Pune", sub_district="Haveli")
+
+    with client.websocket_connect(f"/ws/sos?user_id={police}") as pune, \
+            client.websocket_connect(f"/ws/sos?user_id={other}&latitude=18.52&longitude=73.85") as nearby:
+        response = client.post("/api/sos", json={"location": "FC Road", "user_id": citizen,
+                                                 "latitude": 18.5204, "longitude": 73.8567})
+        assert response.json()["notified"] == 2
+        alert = json.loads(pune.receive_text())
+        assert alert["id"] == response.json()["id"] and alert["user_name"] == "asha"
+        assert alert["district"] == "Pune" and alert["latitude"] == 18.5204
+        # Outside Mumbai, but near where that client said it is
+        assert json.loads(nearby.receive_text())["id"] == alert["id"]
+
+        stored = db_session.get(models.SOSAlert, alert["id"])
+        assert stored.geohash.startswith(sos_dispatch.geohash(18.5204, 73.8567, 5))
+        assert client.get("/api/sos/stats").json()["connections"] == 2
+
+    assert client.get("/api/sos/stats").json()["connections"] == 0
+    # Nobody connected: stored, not delivered
+    assert client.post("/api/sos", json={"location": "FC Road", "user_id": citizen}).json()["notified"] == 0
+
+
+def test_only_authorities_can_subscribe(client, db_session):
+    citizen = signup(client, "asha@example.com")
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws/sos?user_id={citizen}") as ws:
+            ws.receive_text()
+    assert client.get(f"/api/sos/stream?user_id={citizen}").status_code == 403
+
+
+def test_slow_subscriber_keeps_newest_alerts():
+    index = sos_dispatch.AuthorityIndex()
+    index.add(1, "Maharashtra", "Pune")
+    dispatcher = sos_dispatch.Dispatcher(index, queue_size=2)
+    queue = dispatcher.subscribe(1)
+    for n in range(5):
+        dispatcher.publish(str(n), state="Maharashtra", district="Pune")
+    assert [queue.get_nowait(), queue.get_nowait()] == ["3", "4"]
+    assert dispatcher.stats()["dropped"] == 3
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+import uploads
+
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==")
+
+
+def jpeg(**options):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 2), (200, 30, 30)).save(buffer, "JPEG", **options)
+    return buffer.getvalue()
+
+
+JPEG = jpeg()
+
+
+def uploaded_file(url):
+    return os.path.join(uploads.UPLOAD_DIR, url.rsplit("/", 1)[1])
+
+
+def test_sniff_image():
+    assert uploads.sniff_image(PNG) == "png"
+    assert uploads.sniff_image(JPEG) == "jpg"
+    assert uploads.sniff_image(b"GIF89a...") == "gif"
+    assert uploads.sniff_image(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert uploads.sniff_image(b"<svg") is None
+
+
+def test_save_stream_in_chunks_and_size_limit(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_BYTES", 16)
+    data = PNG + b"\x00" * 100
+    url = uploads.save_stream(io.BytesIO(data))
+    assert url == f"/uploads/{hashlib.sha256(data).hexdigest()}.png"
+    with open(uploaded_file(url), "rb") as f:
+        assert f.read() == data
+
+    before = set(os.listdir(uploads.UPLOAD_DIR))
+    try:
+        uploads.save_stream(io.BytesIO(data), max_bytes=64)
+        assert False, "expected UploadTooLarge"
+    except uploads.UploadTooLarge:
+        pass
+    # The partial file is cleaned up
+    assert set(os.listdir(uploads.UPLOAD_DIR)) == before
+
+
+def test_create_report_multipart(client, make_user):
+    user = make_user()
+    response = client.post(
+        "/api/reports/form",
+        data={"title": "Pothole", "description": "Deep", "location": "MG Road", "user_id": user.id,
+              "tags": ["Pothole", "Road"]},
+        # Named and labelled as PNG but really a JPEG; the stored extension follows the content
+        files={"image": ("photo.png", JPEG, "image/png")},
+    )
+    assert response.status_code == 200
+    report = client.get("/api/reports").json()[0]
+    assert report["tags"] == ["Pothole", "Road"]
+    assert report["image_path"] == f"/uploads/{hashlib.sha256(JPEG).hexdigest()}.jpg"
+    assert client.get(report["image_path"]).content == JPEG
+
+
+def test_multipart_rejects_non_images_and_oversized_bodies(client, monkeypatch, make_user):
+    user = make_user()
+    fields = {"title": "t", "description": "d", "location": "l", "user_id": user.id}
+    response = client.post("/api/reports/form", data=fields, files={"image": ("x.png", b"<svg/>", "image/png")})
+    assert response.status_code == 415
+
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 1024)
+    response = client.post("/api/reports/form", data=fields, files={"image": ("x.png", PNG * 2000, "image/png")})
+    assert response.status_code == 413
+    assert client.get("/api/reports").json() == []
+
+
+def test_multipart_without_content_length_is_refused(client):
+    body = (b"--b\r\nContent-Disposition: form-data; name=\"title\"\r\n\r\nt\r\n--b--\r\n")
+    response = client.post("/api/reports/form", content=iter([body]),
+                           headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 411
+
+
+def test_signup_update_and_resolve_multipart(client, db_session):
+    response = client.post("/api/auth/signup/form",
+                           data={"full_name": "Ravi", "email": "ravi@example.com", "password": "pw", "district": "Pune"},
+                           files={"profile_image": ("me.png", PNG, "image/png")})
+    assert response.status_code == 200
+    user = response.json()
+    assert user["district"] == "Pune" and user["profile_image_path"].endswith(".png")
+
+    response = client.put(f"/api/users/{user['id']}/form", data={"full_name": "Ravi K"},
+                          files={"profile_image": ("me.jpg", JPEG, "image/jpeg")})
+    assert response.json()["full_name"] == "Ravi K"
+    assert response.json()["profile_image_path"].endswith(".jpg")
+
+    report_id = client.post("/api/reports/form", data={"title": "t", "description": "d", "location": "l",
+                                                       "user_id": user["id"]}).json()["id"]
+    response = client.put(f"/api/reports/{report_id}/resolve/form", data={"resolution_desc": "Fixed"},
+                          files={"resolution_image": ("after.png", PNG, "image/png")})
+    assert response.json() == {"status": "Resolved"}
+    report = client.get("/api/reports").json()[0]
+    assert report["status"] == "Resolved" and report["resolution_image_path"].endswith(".png")
+
+
+def test_base64_json_path_still_works(client, make_user):
+    user = make_user()
+    payload = {"title": "t", "description": "d", "location": "l", "tags": [], "user_id": user.id,
+               "image": "data:image/png;base64," + base64.b64encode(PNG).decode()}
+    assert client.post("/api/reports", json=payload).status_code == 200
+    # A broken image is skipped, as before, rather than failing the report
+    assert client.post("/api/reports", json=dict(payload, image="not base64!")).status_code == 200
+
+    images = [r["image_path"] for r in client.get("/api/reports").json()]
+    assert images[0] is None and images[1].endswith(".png")
+
+
+def test_identical_uploads_are_stored_once():
+    before = set(os.listdir(uploads.UPLOAD_DIR))
+    first = uploads.save_stream(io.BytesIO(PNG))
+    second = uploads.save_base64(base64.b64encode(PNG).decode())
+    assert first == second
+    assert set(os.listdir(uploads.UPLOAD_DIR)) - before <= {first.rsplit("/", 1)[1]}
+
+
+def test_stored_originals_have_no_metadata(client):
+    exif = Image.Exif()
+    exif[0x0110] = "Phone X"  # Model
+    exif.get_ifd(0x8825)[2] = (18.0, 31.0, 12.5)  # GPS latitude
+    url = uploads.save_stream(io.BytesIO(jpeg(exif=exif)))
+    with Image.open(io.BytesIO(client.get(url).content)) as image:
+        assert not image.getexif() and image.size == (4, 2)
+
+    # Nothing to strip: stored byte for byte
+    assert client.get(uploads.save_stream(io.BytesIO(JPEG))).content == JPEG
+    before = set(os.listdir(uploads.UPLOAD_DIR))
+    try:
+        uploads.save_stream(io.BytesIO(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + b"\x00" * 64))
+        assert False, "expected UnsupportedImage"
+    except uploads.UnsupportedImage:
+        pass
+    assert set(os.listdir(uploads.UPLOAD_DIR)) == before
+
+
+def test_resolution_image_is_saved_before_the_write_lock(client, make_user, monkeypatch):
+    import database
+    from sqlalchemy import event
+
+    user = make_user()
+    report_id = client.post("/api/reports", json={"title": "t", "description": "d", "location": "l", "tags": [],
+                                                  "user_id": user.id}).json()["id"]
+    events = []
+    save_stream = uploads.save_stream
+    monkeypatch.setattr(uploads, "save_stream", lambda *args: events.append("saved") or save_stream(*args))
+
+    def record(conn, cursor, statement, *args):
+        events.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        response = client.put(f"/api/reports/{report_id}/resolve/form", data={"resolution_desc": "Fixed"},
+                              files={"resolution_image": ("after.png", PNG, "image/png")})
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert events.index("saved") < events.index("BEGIN IMMEDIATE")
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from docstore import MmapDocstore
+from test_rag_engine import FakeEmbeddings
+from vector_index import (
+    INDEX_KINDS,
+    LegacyIndexError,
+    build_vectorstore,
+    convert_legacy_index,
+    load_vectorstore,
+    save_vectorstore,
+)
+
+
+def random_corpus(n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    texts = [f"chunk {i}" for i in range(n)]
+    return vectors, texts, [{"position": i} for i in range(n)], [f"id-{i}" for i in range(n)]
+
+
+@pytest.mark.parametrize("kind", INDEX_KINDS)
+def test_round_trip_and_search(tmp_path, kind):
+    vectors, texts, metadatas, ids = random_corpus()
+    params = {"nprobe": 16} if kind == "ivf" else None
+    vectorstore, params = build_vectorstore(FakeEmbeddings(), vectors, texts, metadatas, ids, kind, params)
+    save_vectorstore(vectorstore, str(tmp_path), kind, params)
+
+    loaded, loaded_kind, loaded_params = load_vectorstore(str(tmp_path), FakeEmbeddings())
+    assert loaded_kind == kind
+    assert loaded_params == params
+    assert loaded.index.ntotal == len(vectors)
+
+    docs = loaded.similarity_search_by_vector(vectors[42].tolist(), k=1)
+    assert docs[0].metadata["position"] == 42
+
+
+def test_numpy_index_matches_flat():
+    vectors, texts, metadatas, ids = random_corpus()
+    flat, _ = build_vectorstore(FakeEmbeddings(), vectors, texts, metadatas, ids, "flat")
+    brute, _ = build_vectorstore(FakeEmbeddings(), vectors, texts, metadatas, ids, "numpy")
+    queries = np.random.default_rng(1).normal(size=(10, vectors.shape[1])).astype(np.float32)
+
+    flat_distances, flat_labels = flat.index.search(queries, 5)
+    distances, labels = brute.index.search(queries, 5)
+    assert (labels == flat_labels).all()
+    assert np.allclose(distances, flat_distances, atol=1e-3)
+
+    brute.delete(["id-0", "id-1"])
+    assert brute.index.ntotal == len(vectors) - 2
+    docs = brute.similarity_search_by_vector(vectors[5].tolist(), k=1)
+    assert docs[0].metadata["position"] == 5
+
+
+def test_convert_legacy_index(tmp_path):
+    vectors, texts, metadatas, ids = random_corpus(n=20)
+    legacy = FAISS.from_embeddings(zip(texts, vectors.tolist()), FakeEmbeddings(), metadatas=metadatas, ids=ids)
+    legacy.save_local(str(tmp_path))
+
+    with pytest.raises(LegacyIndexError):
+        load_vectorstore(str(tmp_path), FakeEmbeddings())
+
+    convert_legacy_index(str(tmp_path))
+    assert not (tmp_path / "index.pkl").exists()
+
+    loaded, kind, _ = load_vectorstore(str(tmp_path), FakeEmbeddings())
+    assert kind == "flat"
+    assert isinstance(loaded.docstore, MmapDocstore)
+    docs = loaded.similarity_search_by_vector(vectors[7].tolist(), k=1)
+    assert docs[0].page_content == "chunk 7"
+    assert docs[0].metadata == {"position": 7}
+    assert docs[0].id == "id-7"
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import database
+import models
+import voting
+
+# Every vote runs these statements; a warning (e.g. a cartesian product) would repeat on each one
+pytestmark = pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+
+
+def make_report(db, votes=0):
+    user = models.User(full_name="Asha")
+    report = models.Report(title="Pothole", votes=votes, owner=user)
+    db.add(report)
+    db.commit()
+    return report.id
+
+
+async def post_votes(count, report_id, user_ids=None, concurrency=200):
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def vote(i):
+            async with semaphore:
+                body = {"user_id": user_ids[i]} if user_ids else None
+                return (await client.post(f"/api/reports/{report_id}/vote", json=body)).json()
+
+        return await asyncio.gather(*(vote(i) for i in range(count)))
+
+
+def test_concurrent_votes_are_not_lost(db_session):
+    report_id = make_report(db_session)
+    start = time.perf_counter()
+    replies = asyncio.run(post_votes(1000, report_id))
+    elapsed = time.perf_counter() - start
+
+    assert all(r["counted"] for r in replies)
+    # Each reply is the count right after that vote's own increment
+    assert sorted(r["votes"] for r in replies) == list(range(1, 1001))
+    db_session.rollback()
+    assert db_session.get(models.Report, report_id).votes == 1000
+    print(f"1000 concurrent votes in {elapsed:.2f}s")
+
+
+def test_second_vote_by_same_user_is_not_counted(db_session, make_user):
+    report_id = make_report(db_session, votes=None)
+    for i in range(3):
+        make_user(f"User{i}")
+    replies = asyncio.run(post_votes(40, report_id, user_ids=[i % 4 + 1 for i in range(40)]))
+
+    assert sum(r["counted"] for r in replies) == 4
+    db_session.rollback()
+    assert db_session.get(models.Report, report_id).votes == 4
+    assert db_session.query(models.ReportVote).count() == 4
+
+
+def test_vote_for_missing_report_or_user_leaves_no_voter_row(client, db_session):
+    assert client.post("/api/reports/42/vote", json={"user_id": 1}).status_code == 404
+    report_id = make_report(db_session)
+    response = client.post(f"/api/reports/{report_id}/vote", json={"user_id": 42})
+    assert response.status_code == 404 and response.json()["detail"] == "User 42 not found"
+    db_session.rollback()
+    assert db_session.query(models.ReportVote).count() == 0
+    assert db_session.get(models.Report, report_id).votes == 0
+
+
+def test_buffered_votes_are_flushed_in_one_batch(db_session):
+    first, second = make_report(db_session, votes=5), make_report(db_session)
+    buffer = voting.VoteBuffer(interval=60)
+
+    async def scenario():
+        async with database.AsyncWriteSessionLocal() as db:
+            replies = [await voting.cast_vote(db, first, buffer=buffer) for _ in range(3)]
+            replies.append(await voting.cast_vote(db, second, buffer=buffer))
+            assert await voting.cast_vote(db, 999, buffer=buffer) is None
+        flushed = await buffer.flush(database.AsyncWriteSessionLocal)
+        return replies, flushed
+
+    replies, flushed = asyncio.run(scenario())
+    assert replies == [(6, True), (7, True), (8, True), (1, True)]
+    assert flushed == 4 and buffer.flushes == 1 and buffer.pending(first) == 0
+    db_session.rollback()
+    assert db_session.get(models.Report, first).votes == 8
+    assert db_session.get(models.Report, second).votes == 1
+
+
+def test_buffered_votes_survive_concurrent_flushes(db_session):
+    report_id = make_report(db_session)
+    buffer = voting.VoteBuffer(interval=0.01)
+
+    async def scenario():
+        flusher = asyncio.create_task(buffer.run(database.AsyncWriteSessionLocal))
+        semaphore = asyncio.Semaphore(50)
+
+        async def vote():
+            async with semaphore:
+                async with database.AsyncWriteSessionLocal() as db:
+                    return await voting.cast_vote(db, report_id, buffer=buffer)
+
+        start = time.perf_counter()
+        replies = await asyncio.gather(*(vote() for _ in range(5000)))
+        elapsed = time.perf_counter() - start
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        return replies, elapsed
+
+    replies, elapsed = asyncio.run(scenario())
+    assert all(counted for _, counted in replies)
+    assert buffer.flushes > 1
+    db_session.rollback()
+    assert db_session.get(models.Report, report_id).votes == 5000
+    print(f"5000 buffered votes in {elapsed:.2f}s")
@@ -0,0 +1,152 @@
+import base64
+import binascii
+import hashlib
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+class UploadError(ValueError):
+    status_code = 400
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+class UnsupportedImage(UploadError):
+    status_code = 415
+
+def sniff_image(head: bytes):
+    """File extension for the image format in the first bytes of a file, from its magic number, or None."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+# Image.info keys that carry metadata: camera details and GPS position (EXIF), XMP, IPTC and comments
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "photoshop", "comment")
+ORIENTATION = 0x0112  # EXIF tag
+PIL_FORMATS = {"png": "PNG", "jpg": "JPEG", "gif": "GIF", "webp": "WEBP"}
+
+def has_metadata(image):
+    # PNG text chunks (tEXt, iTXt, zTXt) are in image.text
+    return bool(image.getexif() or any(key in image.info for key in METADATA_KEYS) or getattr(image, "text", None))
+
+def strip_metadata(path, extension):
+    """Re-encode an image file in place without its metadata, applying the EXIF orientation first so it
+    still displays upright. Files without metadata are left alone, so this is cheap to repeat. Returns
+    whether the file was rewritten; raises UnsupportedImage for files Pillow can't decode."""
+    try:
+        with Image.open(path) as image:
+            if not has_metadata(image):
+                return False
+            # An empty comment overrides the one GIF copies from image.info
+            options = {"icc_profile": image.info.get("icc_profile"), "comment": b""}
+            if getattr(image, "n_frames", 1) > 1:
+                # Animated GIF or WebP: keep every frame and the timing
+                clean, options["save_all"] = image, True
+                options.update((key, image.info[key]) for key in ("duration", "loop") if key in image.info)
+            elif image.getexif().get(ORIENTATION, 1) != 1:
+                clean = ImageOps.exif_transpose(image)
+            else:
+                clean = image
+            if extension == "jpg" and clean is image:
+                # Reuse the original's quantization tables, so re-encoding loses next to nothing
+                options.update(quality="keep", subsampling="keep")
+            elif extension in ("jpg", "webp"):
+                options["quality"] = 95
+            clean.save(path + ".clean", PIL_FORMATS[extension], **options)
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        if os.path.exists(path + ".clean"):
+            os.remove(path + ".clean")
+        raise UnsupportedImage("The image could not be decoded") from e
+    os.replace(path + ".clean", path)
+    return True
+
+def upload_url(filename):
+    return f"/uploads/{filename}"
+
+def _store(partial, digest, extension):
+    """Move a fully written upload to its content-addressed name, <sha256 of the upload>.<ext>, without its
+    metadata (everything under /uploads is public); a file with the same content is already there when the
+    same image was uploaded before, and is kept instead."""
+    filename = f"{digest}.{extension}"
+    path = os.path.join(UPLOAD_DIR, filename)
+    if os.path.exists(path):
+        os.remove(partial)
+        return upload_url(filename)
+    try:
+        strip_metadata(partial, extension)
+    except UploadError:
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return upload_url(filename)
+
+def save_stream(fileobj, max_bytes=None):
+    """Copy an uploaded image to UPLOAD_DIR in chunks, never holding more than one chunk in memory.
+
+    The extension comes from the content, not the client's filename or content type. Returns the
+    file's /uploads URL.
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    chunk = fileobj.read(UPLOAD_CHUNK_BYTES)
+    extension = sniff_image(chunk)
+    if extension is None:
+        raise UnsupportedImage("Only PNG, JPEG, GIF and WebP images can be uploaded")
+
+    partial = os.path.join(UPLOAD_DIR, f".{uuid.uuid4()}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(partial, "wb") as f:
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Images are limited to {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                f.write(chunk)
+                chunk = fileobj.read(UPLOAD_CHUNK_BYTES)
+        return _store(partial, digest.hexdigest(), extension)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+def save_base64(data: str, max_bytes=None):
+    """Save a base64 (or data: URL) encoded image, as the JSON endpoints accept; returns its /uploads URL."""
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    # Expecting "data:image/png;base64,....." or just base64
+    encoded = data.split(",", 1)[1] if "," in data else data
+    if len(encoded) * 3 // 4 > max_bytes:
+        raise UploadTooLarge(f"Images are limited to {max_bytes // (1024 * 1024)} MB")
+    try:
+        image_data = base64.b64decode(encoded)
+    except (binascii.Error, ValueError) as e:
+        raise UploadError("Invalid base64 image") from e
+    extension = sniff_image(image_data[:16])
+    if extension is None:
+        raise UnsupportedImage("Only PNG, JPEG, GIF and WebP images can be uploaded")
+
+    partial = os.path.join(UPLOAD_DIR, f".{uuid.uuid4()}.part")
+    with open(partial, "wb") as f:
+        f.write(image_data)
+    return _store(partial, hashlib.sha256(image_data).hexdigest(), extension)
+
+def try_save_base64(data: str):
+    """save_base64, returning None instead of failing the request (how the JSON endpoints always behaved)."""
+    try:
+        return save_base64(data)
+    except (UploadError, OSError) as e:
+        print(f"Error saving image: {e}")
+        return None
@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import pickle
+import sys
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from docstore import DOCSTORE_TABLE, MmapDocstore, write_docstore
+
+# flat: exact FAISS search (the default); ivf / hnsw: approximate FAISS indexes;
+# numpy: brute-force NumPy baseline with no FAISS index at all
+INDEX_KINDS = ("flat", "ivf", "hnsw", "numpy")
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "flat")
+PARAMS_FILE = "index_params.json"
+
+# Kinds whose remove_ids compacts positions the way langchain's FAISS.delete expects.
+# IVF keeps the original ids and HNSW cannot remove at all, so those are rebuilt instead.
+REMOVABLE_KINDS = ("flat", "numpy")
+
+class LegacyIndexError(ValueError):
+    """Raised for index directories that still hold a pickled docstore (index.pkl)."""
+
+class NumpyIndex:
+    """Brute-force L2 index implementing the subset of the faiss.Index API langchain uses."""
+
+    is_trained = True
+
+    def __init__(self, d):
+        self.d = d
+        self.vectors = np.empty((0, d), dtype=np.float32)
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def train(self, x):
+        pass
+
+    def add(self, x):
+        self.vectors = np.vstack([self.vectors, np.asarray(x, dtype=np.float32)])
+
+    def search(self, x, k):
+        x = np.asarray(x, dtype=np.float32)
+        k_found = min(k, self.ntotal)
+        distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        labels = np.full((len(x), k), -1, dtype=np.int64)
+        if k_found == 0:
+            return distances, labels
+        # Squared L2 distances, matching faiss.IndexFlatL2
+        scores = (
+            (x * x).sum(axis=1)[:, None]
+            - 2 * x @ self.vectors.T
+            + (self.vectors * self.vectors).sum(axis=1)[None, :]
+        )
+        top = np.argpartition(scores, k_found - 1, axis=1)[:, :k_found]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(top_scores, axis=1)
+        labels[:, :k_found] = np.take_along_axis(top, order, axis=1)
+        distances[:, :k_found] = np.take_along_axis(top_scores, order, axis=1)
+        return distances, labels
+
+    def remove_ids(self, ids):
+        keep = np.ones(self.ntotal, dtype=bool)
+        keep[np.asarray(ids, dtype=np.int64)] = False
+        removed = self.ntotal - int(keep.sum())
+        self.vectors = self.vectors[keep]
+        return removed
+
+def default_params(kind, n=None):
+    if kind == "ivf":
+        # ~4*sqrt(n) lists, but FAISS wants ~39 training points per list
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39)) if n else 100
+        return {"nlist": nlist, "nprobe": max(1, nlist // 8)}
+    if kind == "hnsw":
+        return {"M": 32, "ef_construction": 200, "ef_search": 64}
+    return {}
+
+def apply_search_params(index, kind, params):
+    if kind == "ivf":
+        index.nprobe = params["nprobe"]
+    elif kind == "hnsw":
+        index.hnsw.efSearch = params["ef_search"]
+
+def create_index(kind, dim, training_vectors=None, **params):
+    """Create an empty (trained, if needed) index; returns (index, params actually used)."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown vector index kind '{kind}', expected one of {INDEX_KINDS}")
+    n = len(training_vectors) if training_vectors is not None else None
+    params = {**default_params(kind, n), **params}
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "numpy":
+        index = NumpyIndex(dim)
+    elif kind == "ivf":
+        if n is not None:
+            # IVF training needs at least one vector per list
+            params["nlist"] = max(1, min(params["nlist"], n))
+            params["nprobe"] = min(params["nprobe"], params["nlist"])
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, params["nlist"])
+        if training_vectors is not None:
+            index.train(np.asarray(training_vectors, dtype=np.float32))
+    else:
+        index = faiss.IndexHNSWFlat(dim, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    apply_search_params(index, kind, params)
+    return index, params
+
+def read_params(path):
+    params_path = os.path.join(path, PARAMS_FILE)
+    if not os.path.exists(params_path):
+        # Indexes written before backends were configurable are flat FAISS indexes
+        return {"kind": "flat", "params": {}}
+    with open(params_path) as f:
+        return json.load(f)
+
+def write_params(path, kind, params, index):
+    with open(os.path.join(path, PARAMS_FILE), "w") as f:
+        json.dump({"kind": kind, "params": params, "dim": index.d, "ntotal": index.ntotal}, f)
+
+def write_index(index, path, kind, params):
+    if kind == "numpy":
+        np.save(os.path.join(path, "index.npy"), index.vectors)
+    else:
+        faiss.write_index(index, os.path.join(path, "index.faiss"))
+    write_params(path, kind, params, index)
+
+def read_index(path, read_only=False):
+    """Read an index; read-only indexes are memory-mapped instead of copied into the heap."""
+    meta = read_params(path)
+    kind, params = meta["kind"], meta["params"]
+    if kind == "numpy":
+        vectors = np.load(os.path.join(path, "index.npy"), mmap_mode="r" if read_only else None)
+        index = NumpyIndex(vectors.shape[1])
+        index.vectors = vectors
+    else:
+        flags = 0
+        if read_only:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(path, "index.faiss"), flags)
+        apply_search_params(index, kind, params)
+    return index, kind, params
+
+def build_vectorstore(embeddings, vectors, texts, metadatas, ids, kind=VECTOR_INDEX_KIND, params=None):
+    """Build a langchain FAISS store backed by the requested index kind; returns (vectorstore, params)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index, params = create_index(kind, vectors.shape[1], training_vectors=vectors, **(params or {}))
+    vectorstore = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vectorstore.add_embeddings(zip(texts, vectors.tolist()), metadatas=metadatas, ids=ids)
+    return vectorstore, params
+
+def save_vectorstore(vectorstore, path, kind, params):
+    """Write the raw index, its parameters and the docstore files; nothing is pickled."""
+    os.makedirs(path, exist_ok=True)
+    write_index(vectorstore.index, path, kind, params)
+    write_docstore(path, vectorstore.docstore, vectorstore.index_to_docstore_id)
+
+def load_vectorstore(path, embeddings, writable=False):
+    """Load a store written by save_vectorstore; returns (vectorstore, kind, params).
+
+    By default the index and docstore are memory-mapped read-only, which is all
+    the chat engine needs. Ingestion passes writable=True to add and delete.
+    """
+    if not os.path.exists(os.path.join(path, DOCSTORE_TABLE)) and os.path.exists(os.path.join(path, "index.pkl")):
+        raise LegacyIndexError(
+            f"'{path}' uses the old pickled docstore. Convert it with: python vector_index.py {path}"
+        )
+    index, kind, params = read_index(path, read_only=not writable)
+    docstore = MmapDocstore(path)
+    index_to_docstore_id = docstore.index_to_docstore_id()
+    if writable:
+        docstore = InMemoryDocstore({doc_id: docstore.search(doc_id) for doc_id in docstore.ids})
+    return FAISS(embeddings, index, docstore, index_to_docstore_id), kind, params
+
+def convert_legacy_index(path):
+    """Convert a FAISS.save_local directory in place to the native docstore format.
+
+    This is the only place index.pkl is unpickled; run it once on an index
+    produced by our own earlier ingestion.
+    """
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    index, kind, params = read_index(path)
+    write_docstore(path, docstore, index_to_docstore_id)
+    write_params(path, kind, params, index)
+    os.remove(os.path.join(path, "index.pkl"))
+    print(f"Converted '{path}' ({index.ntotal} vectors) to the native docstore format.")
+
+if __name__ == "__main__":
+    convert_legacy_index(sys.argv[1] if len(sys.argv) > 1 else "faiss_index")
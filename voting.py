@@ -0,0 +1,161 @@
+import asyncio
+import os
+from collections import Counter
+
+from sqlalchemy import func, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import models
+import rollups
+
+# Hot reports: add votes to an in-memory counter and write them every VOTE_BUFFER_SECONDS instead of one
+# UPDATE per vote. 0 (the default) writes every vote straight through. Buffered votes are per process and
+# up to one interval of them is lost if the process dies.
+VOTE_BUFFER_SECONDS = float(os.getenv("VOTE_BUFFER_SECONDS", "0"))
+
+reports = models.Report.__table__
+
+class UnknownUser(ValueError):
+    pass
+
+def increment_votes(report_id, increment=1):
+    """Atomic `UPDATE ... SET votes = votes + n RETURNING votes`; no read-modify-write in Python."""
+    return (update(reports)
+            .where(reports.c.id == report_id)
+            .values(votes=func.coalesce(reports.c.votes, 0) + increment)
+            .returning(reports.c.votes))
+
+def record_voter(dialect_name, report_id, user_id):
+    """Insert the (report, user) vote row, doing nothing if it exists; returns a row only when inserted.
+
+    Selecting the ids from reports and users inserts nothing for an unknown report or user, rather than
+    violating the foreign keys (a 500 on Postgres).
+    """
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    users = models.User.__table__
+    # An explicit cross join of the two single rows
+    existing = (select(reports.c.id, users.c.id)
+                .select_from(reports.join(users, true()))
+                .where(reports.c.id == report_id, users.c.id == user_id))
+    return (insert(models.ReportVote.__table__)
+            .from_select(["report_id", "user_id"], existing)
+            .on_conflict_do_nothing()
+            .returning(models.ReportVote.__table__.c.report_id))
+
+async def user_exists(db, user_id):
+    return (await db.execute(select(models.User.id).where(models.User.id == user_id))).first() is not None
+
+async def current_votes(db, report_id):
+    row = (await db.execute(select(func.coalesce(reports.c.votes, 0)).where(reports.c.id == report_id))).first()
+    return row[0] if row else None
+
+async def cast_vote(db, report_id, user_id=None, buffer=None):
+    """Count one vote. Returns (votes, counted), or None if there is no such report.
+
+    With a user_id, a second vote by the same user is not counted, and an unknown user raises UnknownUser.
+    With a buffer, the increment is queued for the next flush and the returned total includes the queued
+    votes.
+    """
+    if user_id is not None:
+        inserted = (await db.execute(record_voter(db.bind.dialect.name, report_id, user_id))).first()
+        if inserted is None:
+            await db.rollback()
+            # Nothing inserted: the user already voted, or the report or user doesn't exist
+            votes = await current_votes(db, report_id)
+            if votes is None:
+                return None
+            if not await user_exists(db, user_id):
+                raise UnknownUser(f"User {user_id} not found")
+            if buffer is not None and buffer.tracks(report_id):
+                return buffer.total(report_id), False
+            return votes, False
+
+    if buffer is None:
+        row = (await db.execute(increment_votes(report_id))).first()
+        votes = row[0] if row else None
+        if votes is not None:
+            for statement in rollups.votes_added(db.bind.dialect.name, report_id, 1):
+                await db.execute(statement)
+    else:
+        if not buffer.tracks(report_id):
+            stored = await current_votes(db, report_id)
+            # A flush during the read may have started tracking it with a newer count
+            if stored is not None and not buffer.tracks(report_id):
+                buffer.track(report_id, stored)
+        votes = buffer.add(report_id) if buffer.tracks(report_id) else None
+    if votes is None:
+        # Also drops the voter row recorded above
+        await db.rollback()
+        return None
+    await db.commit()
+    return votes, True
+
+class VoteBuffer:
+    """Vote increments for hot reports, written in one transaction per interval.
+
+    Reports being voted on are tracked with their stored count, so after the first vote on a report
+    its votes are counted without touching the database. Lives on the event loop, so needs no lock.
+    """
+
+    def __init__(self, interval=VOTE_BUFFER_SECONDS):
+        self.interval = interval
+        self._stored = {}  # report id -> votes in the database as of the last read or flush
+        self._pending = Counter()
+        self.flushes = 0
+
+    def tracks(self, report_id):
+        return report_id in self._stored
+
+    def track(self, report_id, stored_votes):
+        self._stored[report_id] = stored_votes
+
+    def add(self, report_id):
+        self._pending[report_id] += 1
+        return self.total(report_id)
+
+    def pending(self, report_id):
+        return self._pending.get(report_id, 0)
+
+    def total(self, report_id):
+        return self._stored[report_id] + self.pending(report_id)
+
+    async def flush(self, session_factory):
+        if not self._pending:
+            # Nothing voted on for a whole interval; stop tracking (and caching counts for) those reports
+            self._stored.clear()
+            return 0
+        batch, self._pending = self._pending, Counter()
+        try:
+            stored = {}
+            async with session_factory() as db:
+                for report_id, increment in batch.items():
+                    stored[report_id] = (await db.execute(increment_votes(report_id, increment))).scalar()
+                    for statement in rollups.votes_added(db.bind.dialect.name, report_id, increment):
+                        await db.execute(statement)
+                await db.commit()
+        except Exception:
+            # Keep the votes for the next attempt
+            self._pending.update(batch)
+            raise
+        # Reports not voted on this interval are dropped; their next vote re-reads the stored count
+        self._stored = {report_id: votes for report_id, votes in stored.items() if votes is not None}
+        self.flushes += 1
+        return sum(batch.values())
+
+    async def run(self, session_factory):
+        flushing = None
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                # Shielded: cancelling mid-flush would roll back a batch already taken off _pending
+                flushing = asyncio.ensure_future(self.flush(session_factory))
+                try:
+                    await asyncio.shield(flushing)
+                except Exception as e:
+                    print(f"Error flushing buffered votes: {e}")
+        finally:
+            if flushing is not None:
+                await asyncio.gather(flushing, return_exceptions=True)
+            await self.flush(session_factory)
+
+buffer = VoteBuffer() if VOTE_BUFFER_SECONDS > 0 else None